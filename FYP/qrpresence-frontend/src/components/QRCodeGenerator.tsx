@@ -35,12 +35,15 @@ const QRCodeGenerator = () => {
         success: boolean;
       }
 
+      // Upload the PNG as a file part rather than base64 inside JSON
+      const image = await (await fetch(imageData)).blob();
+      const form = new FormData();
+      form.append('session_id', sessionId.trim());
+      form.append('qr_image', image, 'qr.png');
+
       const response = await axios.post<ApiResponse>(
         'http://127.0.0.1:8000/api/generate-and-save-qr/',
-        {
-          session_id: sessionId.trim(),
-          qr_image: imageData,
-        },
+        form,
         {
           headers: {
             Authorization: `Bearer ${token}`,
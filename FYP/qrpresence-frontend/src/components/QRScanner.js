@@ -117,7 +117,7 @@ const QRScanner = () => {
                 autoClose: 2000
             });
             try {
-                if (!/^[a-zA-Z0-9-_]+$/.test(sessionId)) {
+                if (!/^[a-zA-Z0-9-_.]+$/.test(sessionId)) {
                     throw new Error('Invalid session ID format');
                 }
                 const position = await new Promise((resolve, reject) => {
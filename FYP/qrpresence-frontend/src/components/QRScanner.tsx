@@ -130,7 +130,7 @@ const QRScanner: React.FC = () => {
       });
 
       try {
-        if (!/^[a-zA-Z0-9-_]+$/.test(sessionId)) {
+        if (!/^[a-zA-Z0-9-_.]+$/.test(sessionId)) {
           throw new Error('Invalid session ID format');
         }
 
@@ -9,4 +9,5 @@ export const SCANNER_CONFIG = {
     MAX_SCAN_ATTEMPTS: 5,
     TOAST_DURATION: 5000
 };
-export const QR_CODE_PATTERN = /^attendance:[a-zA-Z0-9-_]+$/;
+// The reference is a session ID or a signed token (base64url parts joined by '.')
+export const QR_CODE_PATTERN = /^attendance:[a-zA-Z0-9-_.]+$/;
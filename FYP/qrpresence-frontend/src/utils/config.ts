@@ -12,4 +12,5 @@ export const SCANNER_CONFIG = {
   TOAST_DURATION: 5000
 };
 
-export const QR_CODE_PATTERN = /^attendance:[a-zA-Z0-9-_]+$/;
\ No newline at end of file
+// The reference is a session ID or a signed token (base64url parts joined by '.')
+export const QR_CODE_PATTERN = /^attendance:[a-zA-Z0-9-_.]+$/;
\ No newline at end of file
@@ -7,6 +7,8 @@ from .models import (
     Student,
     Course,
     StudentCourseEnrollment,
+    SessionRoster,
+    Venue,
 )
 
 # QRCode Admin
@@ -67,8 +69,28 @@ class AttendanceAdmin(admin.ModelAdmin):
 class SessionAdmin(admin.ModelAdmin):
     list_display = ('session_id', 'class_name', 'course', 'lecturer', 'timestamp')
     search_fields = ('class_name', 'session_id', 'course__title')
-    list_filter = ('course', 'lecturer', 'timestamp')
+    list_filter = ('course', 'lecturer', 'venue', 'timestamp')
     ordering = ('-timestamp',)
+    actions = ['pregenerate_qr_codes']
+
+    def pregenerate_qr_codes(self, request, queryset):
+        from .qr_pregeneration import pregenerate_qr_codes, sessions_without_qr
+
+        selected = queryset.count()
+        created = pregenerate_qr_codes(sessions_without_qr(queryset))
+        self.message_user(
+            request,
+            f"Generated {created} QR code(s); {selected - created} selected session(s) already had one."
+        )
+
+    pregenerate_qr_codes.short_description = "Pre-generate QR codes for selected sessions"
+
+
+# Venue Admin
+@admin.register(Venue)
+class VenueAdmin(admin.ModelAdmin):
+    list_display = ('name', 'updated_at')
+    search_fields = ('name',)
 
 
 # Course Admin
@@ -87,3 +109,11 @@ class StudentCourseEnrollmentAdmin(admin.ModelAdmin):
     search_fields = ('student__student_id', 'course__code', 'student__name')
     list_filter = ('course', 'enrolled_by')
     ordering = ('-enrolled_at',)
+
+
+# Session Roster Admin
+@admin.register(SessionRoster)
+class SessionRosterAdmin(admin.ModelAdmin):
+    list_display = ('session', 'created_at', 'updated_at')
+    search_fields = ('session__session_id', 'session__class_name')
+    readonly_fields = ('session', 'student_ids', 'created_at', 'updated_at')
@@ -0,0 +1,360 @@
+"""
+Seeding and load-generation helpers behind the seed_checkins, bench_checkins
+and checkin_storm management commands, and the QR render-mode comparison
+behind bench_qr_render.
+
+Benchmark data is namespaced by a prefix (usernames, student IDs, course
+codes and session IDs all start with it), so it can live next to real data
+in a development database and be removed with clear_benchmark_data().
+"""
+import asyncio
+import collections
+import gzip
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from django.utils.timezone import now
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Attendance, Course, Lecturer, Session, Student, StudentCourseEnrollment
+from .qr_render import RENDER_MODES, encode_qr
+from .roster import snapshot_roster
+from .session_cache import invalidate_open_session
+
+# Every seeded session sits here; scans are sent from a few metres away
+BENCH_LATITUDE = 10.0
+BENCH_LONGITUDE = 20.0
+
+
+@dataclass
+class Scan:
+    token: str
+    session_id: str
+    latitude: float = BENCH_LATITUDE + 0.0001
+    longitude: float = BENCH_LONGITUDE + 0.0001
+
+    @property
+    def payload(self):
+        return {'session_id': self.session_id, 'latitude': self.latitude, 'longitude': self.longitude}
+
+
+@dataclass
+class Sample:
+    latency: float
+    status: int
+    queries: int = None
+
+
+def clear_benchmark_data(prefix):
+    """Deletes everything seed_benchmark_data() created for prefix."""
+    Course.objects.filter(code__startswith=f'{prefix.upper()}-').delete()
+    # Cascades to students, lecturers, enrollments, sessions and attendance
+    get_user_model().objects.filter(username__startswith=f'{prefix}-').delete()
+
+
+def seed_benchmark_data(prefix, courses, students, sessions_per_course=1, courses_per_student=1):
+    """
+    Creates one lecturer, `courses` courses with `sessions_per_course` open
+    sessions each, and `students` students enrolled round-robin in
+    `courses_per_student` courses. Returns the created sessions.
+    """
+    User = get_user_model()
+    lecturer_user = User.objects.create_user(
+        username=f'{prefix}-lecturer', email=f'{prefix}-lecturer@example.com', role='lecturer'
+    )
+    lecturer = Lecturer.objects.create(user=lecturer_user, name=f'{prefix} lecturer')
+
+    Course.objects.bulk_create([
+        Course(
+            title=f'Benchmark course {c}', code=f'{prefix.upper()}-{c}', description='',
+            credit_hours=1, created_by=lecturer_user,
+        )
+        for c in range(courses)
+    ])
+    course_list = list(Course.objects.filter(code__startswith=f'{prefix.upper()}-').order_by('code'))
+
+    sessions = [
+        Session.objects.create(
+            session_id=f'{prefix}-{course.code}-{s}', class_name=course.title, lecturer=lecturer,
+            course=course, gps_latitude=BENCH_LATITUDE, gps_longitude=BENCH_LONGITUDE, allowed_radius=100,
+        )
+        for course in course_list
+        for s in range(sessions_per_course)
+    ]
+
+    User.objects.bulk_create([
+        User(username=f'{prefix}-student-{i}', email=f'{prefix}-student-{i}@example.com',
+             role='student', password='!')
+        for i in range(students)
+    ], batch_size=1000)
+    users = User.objects.filter(username__startswith=f'{prefix}-student-').order_by('id')
+    Student.objects.bulk_create([
+        Student(student_id=f'{prefix}{user.pk}', user=user, name=user.username, program='Benchmark')
+        for user in users
+    ], batch_size=1000)
+
+    courses_per_student = min(courses_per_student, len(course_list))
+    StudentCourseEnrollment.objects.bulk_create([
+        StudentCourseEnrollment(
+            student_id=f'{prefix}{user.pk}',
+            course=course_list[(i + k) % len(course_list)],
+            enrolled_by=lecturer_user,
+        )
+        for i, user in enumerate(users)
+        for k in range(courses_per_student)
+    ], batch_size=1000)
+
+    # bulk_create skips the signals that keep rosters current
+    for session in sessions:
+        snapshot_roster(session)
+    return sessions
+
+
+def reset_sessions(prefix):
+    """
+    Reopens the prefix's sessions and deletes their attendance, so every run
+    measures first-time check-ins rather than "already marked" replies.
+    """
+    sessions = Session.objects.filter(session_id__startswith=f'{prefix}-')
+    Attendance.objects.filter(session__in=sessions).delete()
+    sessions.update(timestamp=now())
+    for session_id in sessions.values_list('session_id', flat=True):
+        invalidate_open_session(session_id)
+
+
+def build_scans(prefix):
+    """One scan per enrolled student per seeded session, with freshly issued tokens."""
+    tokens = {}
+    scans = []
+    enrollments = (
+        StudentCourseEnrollment.objects
+        .filter(student__student_id__startswith=prefix, course__code__startswith=f'{prefix.upper()}-')
+        .select_related('student__user')
+    )
+    sessions_by_course = {}
+    for session_id, course_id in Session.objects.filter(
+        session_id__startswith=f'{prefix}-'
+    ).values_list('session_id', 'course_id'):
+        sessions_by_course.setdefault(course_id, []).append(session_id)
+
+    for enrollment in enrollments:
+        user = enrollment.student.user
+        if user.pk not in tokens:
+            tokens[user.pk] = str(RefreshToken.for_user(user).access_token)
+        for session_id in sessions_by_course.get(enrollment.course_id, []):
+            scans.append(Scan(token=tokens[user.pk], session_id=session_id))
+    return scans
+
+
+def arrival_offsets(count, ramp, seed=0):
+    """Sorted send times, uniformly spread over `ramp` seconds (all at once for 0)."""
+    if not ramp:
+        return [0.0] * count
+    rng = random.Random(seed)
+    return sorted(rng.uniform(0, ramp) for _ in range(count))
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _wait_until(start, offset):
+    delay = start + offset - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def _run_threaded(scans, offsets, concurrency, send, count_queries):
+    """
+    Runs send(scan) -> status for every scan on `concurrency` threads, each
+    scan no earlier than its arrival offset. Latency is measured from the
+    scheduled arrival, so time spent queueing behind busy workers counts.
+    """
+    queue = collections.deque(zip(scans, offsets))
+    lock = threading.Lock()
+    samples = []
+    start = time.perf_counter()
+
+    def worker():
+        counter = _QueryCounter()
+        try:
+            with connection.execute_wrapper(counter):
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        scan, offset = queue.popleft()
+                    _wait_until(start, offset)
+                    before = counter.count
+                    code = send(scan)
+                    sample = Sample(
+                        latency=time.perf_counter() - (start + offset),
+                        status=code,
+                        queries=counter.count - before if count_queries else None,
+                    )
+                    with lock:
+                        samples.append(sample)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - start
+
+
+def run_wsgi_storm(scans, concurrency, ramp=0):
+    """Replays scans through mark_attendance with the in-process test client."""
+    url = reverse('mark_attendance')
+    clients = threading.local()
+
+    def send(scan):
+        if not hasattr(clients, 'client'):
+            clients.client = Client()
+        response = clients.client.post(
+            url, scan.payload, content_type='application/json',
+            headers={'Authorization': f'Bearer {scan.token}'}
+        )
+        return response.status_code
+
+    return _run_threaded(scans, arrival_offsets(len(scans), ramp), concurrency, send, count_queries=True)
+
+
+def run_asgi_storm(scans, concurrency, ramp=0):
+    """
+    Replays scans through mark_attendance_async on one event loop. The async
+    ORM runs every query on a single thread here, so queries are counted
+    for the whole run and attributed evenly rather than per request.
+    """
+    url = reverse('mark_attendance_async')
+    offsets = arrival_offsets(len(scans), ramp)
+    counter = _QueryCounter()
+
+    # Called through sync_to_async so they act on the async ORM thread's connection
+    def install():
+        connection.execute_wrappers.append(counter)
+
+    def uninstall():
+        connection.execute_wrappers.remove(counter)
+        connection.close()
+
+    async def storm():
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        await sync_to_async(install)()
+        start = time.perf_counter()
+
+        async def scan_at(scan, offset):
+            await asyncio.sleep(offset)
+            async with semaphore:
+                response = await client.post(
+                    url, scan.payload, content_type='application/json',
+                    headers={'Authorization': f'Bearer {scan.token}'}
+                )
+                return Sample(latency=time.perf_counter() - (start + offset), status=response.status_code)
+
+        try:
+            samples = await asyncio.gather(*(scan_at(s, o) for s, o in zip(scans, offsets)))
+        finally:
+            await sync_to_async(uninstall)()
+        return list(samples), time.perf_counter() - start
+
+    samples, elapsed = asyncio.run(storm())
+    per_request = counter.count / len(samples) if samples else 0
+    for sample in samples:
+        sample.queries = per_request
+    return samples, elapsed
+
+
+def run_http_storm(base_url, scans, concurrency, ramp=0, timeout=30):
+    """
+    Replays scans against a running server, e.g. http://127.0.0.1:8000.
+    Tokens are signed with this process's settings, which must match the
+    server's. Queries per request cannot be observed from here.
+    """
+    url = base_url.rstrip('/') + reverse('mark_attendance')
+
+    def send(scan):
+        request = urllib.request.Request(
+            url, data=json.dumps(scan.payload).encode(), method='POST',
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {scan.token}'},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except (urllib.error.URLError, TimeoutError):
+            # Reported as a status so failures show up in the counts
+            return 0
+
+    return _run_threaded(scans, arrival_offsets(len(scans), ramp), concurrency, send, count_queries=False)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarise(samples, elapsed):
+    """Latency percentiles (ms), throughput, queries per request and status counts."""
+    latencies = sorted(sample.latency * 1000 for sample in samples)
+    queries = [sample.queries for sample in samples if sample.queries is not None]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+    return {
+        'requests': len(samples),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50), 2),
+            'p95': round(_percentile(latencies, 95), 2),
+            'p99': round(_percentile(latencies, 99), 2),
+            'mean': round(statistics.fmean(latencies), 2) if latencies else 0,
+            'max': round(latencies[-1], 2) if latencies else 0,
+        },
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'statuses': statuses,
+    }
+
+
+def bench_qr_render_modes(payload, repeats=100, modes=RENDER_MODES):
+    """
+    Uncached render time (ms, mean and p95 over `repeats` renders), size and
+    gzipped size in bytes of payload's QR code in each mode.
+    """
+    results = {}
+    for mode in modes:
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            rendered = encode_qr(payload, mode)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[mode] = {
+            'render_ms': round(statistics.fmean(timings), 3),
+            'render_ms_p95': round(_percentile(timings, 95), 3),
+            'bytes': len(rendered),
+            'gzip_bytes': len(gzip.compress(rendered)),
+        }
+    return results
@@ -0,0 +1,392 @@
+from dataclasses import dataclass, replace
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, router
+from django.db.models import Exists, JSONField, OuterRef, Subquery
+from django.utils.timezone import now
+
+from . import write_behind
+from .models import Session, SessionRoster, Attendance, Student
+from .roster import acache_roster, aget_roster, cache_roster, get_roster, get_rosters, snapshot_roster
+from .session_cache import (
+    DEFAULT_CHECKIN_WINDOW, OpenSession, acache_open_session, aget_cached_open_session,
+    cache_open_session, get_cached_open_session, get_open_sessions,
+    open_session_from_model, snapshot_queryset,
+)
+from .geofence import haversine_many, session_geofence
+from .utils import MAX_SCAN_DISTANCE, is_qr_valid
+from .venues import avenue_geofence, venue_geofence
+
+# Tolerance for phone clocks running ahead when scans are replayed later
+SCAN_CLOCK_SKEW = timedelta(minutes=2)
+
+
+class CheckInError(Exception):
+    """
+    Raised when a scan is rejected. Carries the message and HTTP status
+    that mark_attendance returns to the client.
+    """
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@dataclass
+class CheckInContext:
+    session: OpenSession
+    student_id: str = None
+    is_enrolled: bool = False
+    already_marked: bool = False
+
+
+def _student_state_query(snapshot, user):
+    """Per-user part of the check-in state when the session is already cached."""
+    return (
+        Student.objects
+        .filter(user=user)
+        .annotate(
+            already_marked=Exists(
+                Attendance.objects.filter(student=OuterRef('pk'), session_id=snapshot.pk)
+            ),
+        )
+        .values_list('student_id', 'already_marked')
+    )
+
+
+def _context_from_student_state(snapshot, row, roster):
+    if row is None:
+        return CheckInContext(session=snapshot)
+    student_id, already_marked = row
+    return CheckInContext(
+        session=snapshot,
+        student_id=student_id,
+        is_enrolled=student_id in roster,
+        already_marked=already_marked,
+    )
+
+
+def _full_context_query(session_id, user):
+    """Session, QR state, roster and the user's student/attendance state together."""
+    return (
+        snapshot_queryset()
+        .annotate(
+            student_pk=Subquery(
+                Student.objects.filter(user=user).values('student_id')[:1]
+            ),
+            roster_ids=Subquery(
+                SessionRoster.objects.filter(session=OuterRef('pk')).values('student_ids')[:1],
+                output_field=JSONField(),
+            ),
+            already_marked=Exists(
+                Attendance.objects.filter(student__user=user, session=OuterRef('pk'))
+            ),
+        )
+        .filter(session_id=session_id)
+    )
+
+
+def _context_from_session(session, roster):
+    return CheckInContext(
+        session=open_session_from_model(session),
+        student_id=session.student_pk,
+        is_enrolled=session.student_pk in roster,
+        already_marked=session.already_marked,
+    )
+
+
+def _needs_pending_check(context):
+    return write_behind.is_enabled() and context.student_id is not None and not context.already_marked
+
+
+def load_checkin_context(session_id, user):
+    """
+    Loads everything needed to validate a scan in a single query. Session
+    metadata and the roster come from the cache when available, otherwise
+    they are read together with the user's student/attendance state and
+    cached for the next scan. Returns None if the session does not exist.
+    In write-behind mode, journaled check-ins count as already marked.
+    """
+    context = _load_checkin_context(session_id, user)
+    if context is not None and _needs_pending_check(context):
+        context.already_marked = write_behind.is_pending(context.student_id, context.session.pk)
+    return context
+
+
+def _load_checkin_context(session_id, user):
+    snapshot = get_cached_open_session(session_id)
+    if snapshot is not None:
+        row = _student_state_query(snapshot, user).first()
+        return _context_from_student_state(snapshot, row, get_roster(snapshot))
+
+    session = _full_context_query(session_id, user).first()
+    if session is None:
+        return None
+
+    snapshot = open_session_from_model(session)
+    cache_open_session(snapshot)
+    if session.roster_ids is None:
+        roster = snapshot_roster(snapshot)
+    else:
+        roster = cache_roster(snapshot.pk, session.roster_ids)
+    return _context_from_session(session, roster)
+
+
+async def aload_checkin_context(session_id, user):
+    """Async variant of load_checkin_context() using the async ORM and cache APIs."""
+    context = await _aload_checkin_context(session_id, user)
+    if context is not None and _needs_pending_check(context):
+        context.already_marked = await write_behind.ais_pending(context.student_id, context.session.pk)
+    if context is not None and context.session.venue_id:
+        # Loaded here so validate_check_in() finds it in memory
+        await avenue_geofence(context.session.venue_id, context.session.venue_version)
+    return context
+
+
+async def _aload_checkin_context(session_id, user):
+    snapshot = await aget_cached_open_session(session_id)
+    if snapshot is not None:
+        row = await _student_state_query(snapshot, user).afirst()
+        return _context_from_student_state(snapshot, row, await aget_roster(snapshot))
+
+    session = await _full_context_query(session_id, user).afirst()
+    if session is None:
+        return None
+
+    snapshot = open_session_from_model(session)
+    await acache_open_session(snapshot)
+    if session.roster_ids is None:
+        roster = await sync_to_async(snapshot_roster)(snapshot)
+    else:
+        roster = await acache_roster(snapshot.pk, session.roster_ids)
+    return _context_from_session(session, roster)
+
+
+def validate_check_in(context, scan_time, latitude, longitude, qr_token=None, distance=None):
+    """
+    Runs the check-in rules against an already loaded context, in the same
+    order mark_attendance has always applied them. Raises CheckInError on
+    rejection and returns the distance from the session location otherwise.
+    A scan that was already recorded is not an error; callers check
+    context.already_marked after this returns.
+
+    qr_token is a QRToken already checked by verify_qr_token(); its expiry
+    takes the place of the QR code row and attendance window checks.
+    distance may be passed in when it was computed for a batch of scans.
+    For a session held at a Venue, the venue boundary replaces both
+    distance limits.
+    """
+    session = context.session
+
+    if context.student_id is None:
+        raise CheckInError(
+            'Student profile not found. Please complete your student registration.', 404
+        )
+
+    if not context.is_enrolled:
+        raise CheckInError(
+            'You are not enrolled in this course. Please contact your administrator.', 403
+        )
+
+    window_session = replace(session, attendance_window=None) if qr_token else session
+    # Time rules only; the location is measured once below for both distance limits
+    is_valid, message = is_qr_valid(window_session, scan_time, None, None)
+    if not is_valid:
+        raise CheckInError(message, 400)
+
+    venue = venue_geofence(session.venue_id, session.venue_version) if session.venue_id else None
+    if distance is None:
+        try:
+            distance = session_geofence(session).distance(
+                float(latitude), float(longitude),
+                # With a venue, the distance is only reported, so the estimate always does
+                within=float('inf') if venue else min(MAX_SCAN_DISTANCE, session.allowed_radius)
+            )
+        except (ValueError, TypeError):
+            raise CheckInError('Invalid coordinates provided', 400)
+
+    if venue is not None:
+        if context.already_marked:
+            return None
+        if not venue.contains(float(latitude), float(longitude)):
+            raise CheckInError(
+                f'You are outside {venue.name}. Please move into the venue to mark attendance.', 403
+            )
+        return _checked_qr_expiry(session, scan_time, qr_token, distance)
+
+    if distance > MAX_SCAN_DISTANCE:
+        raise CheckInError(
+            f"You are {distance:.2f}m away from class. Maximum allowed: {MAX_SCAN_DISTANCE}m.", 400
+        )
+
+    if context.already_marked:
+        return None
+
+    if distance > session.allowed_radius:
+        raise CheckInError(
+            f'You are too far from the session location ({distance:.2f} meters). '
+            f'Allowed radius: {session.allowed_radius}m. Please move closer to the classroom.',
+            403
+        )
+
+    return _checked_qr_expiry(session, scan_time, qr_token, distance)
+
+
+def _checked_qr_expiry(session, scan_time, qr_token, distance):
+    # A signed token's own expiry was checked when it was verified
+    if qr_token is None:
+        if session.has_qr:
+            if session.qr_expires_at and scan_time > session.qr_expires_at:
+                raise CheckInError('QR code has expired. Attendance window closed.', 403)
+        elif scan_time > session.timestamp + DEFAULT_CHECKIN_WINDOW:
+            raise CheckInError('Attendance window has closed.', 403)
+
+    return distance
+
+
+def insert_attendance_once(student_id, session_pk, latitude, longitude, check_in_time=None):
+    """
+    Inserts the attendance row with bulk_create(ignore_conflicts=True) (INSERT
+    IGNORE on MySQL, INSERT ... ON CONFLICT DO NOTHING elsewhere) so the
+    unique_together constraint settles concurrent duplicate scans without
+    raising, then reads the stored row back by its key. Returns (attendance,
+    created); when the row already existed the stored one is returned
+    instead. Like bulk_create(), no save signals fire.
+    """
+    attendance = Attendance(
+        student_id=student_id,
+        session_id=session_pk,
+        latitude=latitude,
+        longitude=longitude,
+    )
+    if check_in_time is not None:
+        attendance.check_in_time = check_in_time
+
+    db = router.db_for_write(Attendance)
+    Attendance.objects.using(db).bulk_create([attendance], ignore_conflicts=True)
+    try:
+        stored = Attendance.objects.using(db).get(student_id=student_id, session_id=session_pk)
+    except Attendance.DoesNotExist:
+        # MySQL's INSERT IGNORE also swallows other errors, e.g. a missing student row
+        raise IntegrityError(f"Attendance for student {student_id} in session {session_pk} was not inserted")
+    # ignore_conflicts leaves the pk unset; a row from a concurrent scan carries its own check-in time
+    return stored, stored.check_in_time == attendance.check_in_time
+
+
+def check_in_batch(student_id, records):
+    """
+    Validates and stores a batch of queued scans for one student with a fixed
+    number of queries: one for the sessions missing from the cache, one for
+    rosters missing from the cache, one for existing attendance, a single
+    bulk insert and, after it, one re-read of the inserted rows. Each record is a dict with session_id, latitude, longitude
+    and scanned_at, and optionally the verified QRToken the scan was dated
+    by as qr_token. Records are validated at their scan time rather than
+    upload time. Returns one result dict per record, in order.
+    """
+    sessions = get_open_sessions({record['session_id'] for record in records})
+    rosters = get_rosters(sessions.values())
+    latest_scan_time = now() + SCAN_CLOCK_SKEW
+    marked = set(
+        Attendance.objects
+        .filter(student_id=student_id, session_id__in=[s.pk for s in sessions.values()])
+        .values_list('session_id', flat=True)
+    )
+    if write_behind.is_enabled():
+        marked |= write_behind.pending_session_pks(student_id, [s.pk for s in sessions.values()])
+
+    # Every record's distance in one vectorised pass, by position in records
+    located = [i for i, record in enumerate(records) if record['session_id'] in sessions]
+    distances = dict(zip(located, haversine_many(
+        [records[i]['latitude'] for i in located],
+        [records[i]['longitude'] for i in located],
+        [sessions[records[i]['session_id']].gps_latitude for i in located],
+        [sessions[records[i]['session_id']].gps_longitude for i in located],
+    ))) if located else {}
+
+    results = []
+    to_create = []
+    created = {}
+    for index, record in enumerate(records):
+        result = {'session_id': record['session_id']}
+        results.append(result)
+
+        session = sessions.get(record['session_id'])
+        if session is None:
+            result.update(status='rejected', status_code=404, error='Session not found')
+            continue
+
+        scan_time = record['scanned_at']
+        if scan_time > latest_scan_time:
+            result.update(status='rejected', status_code=400, error='Scan time is in the future.')
+            continue
+        if scan_time < session.timestamp:
+            result.update(status='rejected', status_code=400, error='Scan time is before the session started.')
+            continue
+
+        context = CheckInContext(
+            session=session,
+            student_id=student_id,
+            is_enrolled=student_id in rosters[session.pk],
+            already_marked=session.pk in marked,
+        )
+        try:
+            validate_check_in(
+                context, scan_time, record['latitude'], record['longitude'],
+                qr_token=record.get('qr_token'), distance=float(distances[index])
+            )
+        except CheckInError as e:
+            result.update(status='rejected', status_code=e.status_code, error=e.message)
+            continue
+
+        if context.already_marked:
+            result.update(status='already_marked', status_code=200)
+            continue
+
+        # Later duplicates in the same batch see this one as already marked
+        marked.add(session.pk)
+        to_create.append(Attendance(
+            student_id=student_id,
+            session_id=session.pk,
+            latitude=record['latitude'],
+            longitude=record['longitude'],
+            check_in_time=scan_time,
+        ))
+        created[session.pk] = result
+        result.update(status='created', status_code=201)
+
+    if to_create:
+        # ignore_conflicts keeps a race with a live scan from failing the batch
+        Attendance.objects.bulk_create(to_create, ignore_conflicts=True)
+        # The rows that lost the race were dropped without an error; the row
+        # in their place carries the other scan's check-in time
+        stored = dict(
+            Attendance.objects
+            .filter(student_id=student_id, session_id__in=list(created))
+            .values_list('session_id', 'check_in_time')
+        )
+        for attendance in to_create:
+            if stored.get(attendance.session_id) != attendance.check_in_time:
+                created[attendance.session_id].update(status='duplicate', status_code=200)
+    return results
+
+
+async def ainsert_attendance_once(student_id, session_pk, latitude, longitude):
+    """
+    Async variant of insert_attendance_once(). Relies on the unique_together
+    constraint instead of INSERT ... IGNORE: in autocommit mode a rejected
+    acreate() leaves the connection usable, so the existing row can be read.
+    """
+    try:
+        attendance = await Attendance.objects.acreate(
+            student_id=student_id,
+            session_id=session_pk,
+            latitude=latitude,
+            longitude=longitude,
+        )
+        return attendance, True
+    except IntegrityError:
+        existing = await Attendance.objects.filter(student_id=student_id, session_id=session_pk).afirst()
+        if existing is None:
+            raise
+        return existing, False
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Session snapshots and rosters are invalidated through the cache, which
+    only reaches other workers when the cache is shared between processes.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend.endswith(('.LocMemCache', '.DummyCache')):
+        return [Warning(
+            'The default cache is per-process, so session and roster changes made in one '
+            'worker are not seen by the others.',
+            hint='Set CACHE_REDIS_URL, or another shared backend in CACHES, when running more than one worker.',
+            id='attendance.W001',
+        )]
+    return []
@@ -0,0 +1,92 @@
+"""
+Serving stored files (QR code images) with conditional GET support.
+
+Responses carry an ETag and Last-Modified taken from the stored file, so
+repeat fetches from lecturer screens and projectors get a 304 without the
+file being read. Content-addressed names (see content_addressed_name) never
+change content and are sent as immutable.
+
+With FILE_SERVING_MODE set to 'x-accel-redirect' (nginx) or 'x-sendfile'
+(Apache, lighttpd), Django only sends the headers and the front server
+streams the bytes. For nginx, FILE_SERVING_ACCEL_PREFIX must map to an
+internal location aliased to MEDIA_ROOT, e.g.
+
+    location /protected-media/ { internal; alias /srv/qrpresence/media/; }
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+# "<stem>.<16+ hex digits of the content hash>.<ext>", as content_addressed_name() builds
+CONTENT_ADDRESSED_NAME = re.compile(r'\.(?P<digest>[0-9a-f]{16,64})\.[A-Za-z0-9]+$')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def content_addressed_name(name, content):
+    """'qr_codes/qr_X.png' -> 'qr_codes/qr_X.<sha256[:16]>.png' for the given bytes."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:16]}{ext}"
+
+
+def _file_etag(name, stat):
+    match = CONTENT_ADDRESSED_NAME.search(name)
+    if match:
+        return quote_etag(match['digest'])
+    # Same scheme as nginx: changes whenever the file is replaced
+    return quote_etag(f"{int(stat.st_mtime):x}-{stat.st_size:x}")
+
+
+def _offloaded_response(field_file, path, mode):
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FILE_SERVING_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + field_file.name.lstrip('/'))
+    else:
+        response['X-Sendfile'] = path
+    # Let the front server fill these in from the file itself
+    del response['Content-Type']
+    content_type, _ = mimetypes.guess_type(path)
+    if content_type:
+        response['Content-Type'] = content_type
+    return response
+
+
+def serve_stored_file(request, field_file, as_attachment=False, filename=None):
+    """
+    Response for a FieldFile on local storage, honouring If-None-Match and
+    If-Modified-Since. Raises FileNotFoundError if the file is missing.
+    """
+    path = field_file.path
+    stat = os.stat(path)
+    etag = _file_etag(field_file.name, stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        mode = getattr(settings, 'FILE_SERVING_MODE', None)
+        if mode in ('x-accel-redirect', 'x-sendfile'):
+            response = _offloaded_response(field_file, path, mode)
+            disposition = content_disposition_header(as_attachment, filename or os.path.basename(path))
+            if disposition:
+                response['Content-Disposition'] = disposition
+        else:
+            response = FileResponse(
+                open(path, 'rb'), as_attachment=as_attachment, filename=filename or os.path.basename(path)
+            )
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if CONTENT_ADDRESSED_NAME.search(field_file.name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        # Cacheable, but revalidated so a regenerated code shows up at once
+        patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,241 @@
+"""
+Distance checks against a session's location.
+
+A Geofence precomputes the centre's radians and cos(latitude) once per
+session location. distance() first takes an equirectangular estimate (no
+trigonometry per scan); the estimate is returned when the point is clearly
+inside the limit the caller cares about, and exact haversine is used near
+the boundary and beyond it, so comparisons against the limit and the
+distances shown in rejection messages match utils.haversine().
+
+haversine_many() is the batch variant for bulk check-in and analytics. It
+uses NumPy when installed and falls back to a Python loop otherwise.
+
+PolygonGeofence is the boundary of a Venue. Coordinates are treated as
+planar, which is accurate at campus scale.
+
+Session locations are also indexed by geohash; geohash_cover() lists the
+cells to look in for sessions within some distance of a point.
+"""
+import math
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy is optional
+    np = None
+
+EARTH_RADIUS_M = 6371000
+
+# The estimate is trusted up to this fraction below the limit. The
+# equirectangular error within a few km is far smaller than this.
+BOUNDARY_MARGIN = 0.02
+
+
+@dataclass(frozen=True)
+class Geofence:
+    latitude: float
+    longitude: float
+    _lat_rad: float = field(init=False, repr=False)
+    _lon_rad: float = field(init=False, repr=False)
+    _cos_lat: float = field(init=False, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, '_lat_rad', math.radians(self.latitude))
+        object.__setattr__(self, '_lon_rad', math.radians(self.longitude))
+        object.__setattr__(self, '_cos_lat', math.cos(self._lat_rad))
+
+    def estimate(self, latitude, longitude):
+        """Equirectangular distance in metres; accurate for short distances."""
+        x = math.radians(longitude - self.longitude) * self._cos_lat
+        y = math.radians(latitude - self.latitude)
+        return EARTH_RADIUS_M * math.hypot(x, y)
+
+    def exact(self, latitude, longitude):
+        """Haversine distance in metres, as utils.haversine()."""
+        phi = math.radians(latitude)
+        a = (
+            math.sin((phi - self._lat_rad) / 2.0) ** 2
+            + math.cos(phi) * self._cos_lat * math.sin((math.radians(longitude) - self._lon_rad) / 2.0) ** 2
+        )
+        return EARTH_RADIUS_M * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    def distance(self, latitude, longitude, within=None):
+        """
+        Distance in metres. With `within`, a point clearly inside that many
+        metres gets the cheap estimate; everything else is exact.
+        """
+        if within is not None:
+            estimate = self.estimate(latitude, longitude)
+            if estimate < within * (1 - BOUNDARY_MARGIN):
+                return estimate
+        return self.exact(latitude, longitude)
+
+    def distances(self, latitudes, longitudes):
+        """Exact distances in metres from the centre to many points."""
+        return haversine_many(latitudes, longitudes, self.latitude, self.longitude)
+
+
+@lru_cache(maxsize=1024)
+def geofence(latitude, longitude):
+    return Geofence(latitude, longitude)
+
+
+def session_geofence(session):
+    """The Geofence of a Session or OpenSession, computed once per location."""
+    return geofence(float(session.gps_latitude), float(session.gps_longitude))
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Stored on Session: cells of about 5m x 5m
+GEOHASH_PRECISION = 9
+
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, longitude first
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(degrees of latitude, degrees of longitude) spanned by one cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_cover(latitude, longitude, radius):
+    """
+    Geohash prefixes whose cells together cover every point within
+    `radius` metres. The precision is the finest at which a cell is at
+    least `radius` across, so there are at most 9 (3 x 3) of them.
+    """
+    dlat = radius / METRES_PER_DEGREE
+    dlon = radius / (METRES_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+    precision = 1
+    while precision < GEOHASH_PRECISION:
+        cell_lat, cell_lon = geohash_cell_size(precision + 1)
+        if cell_lat < dlat or cell_lon < dlon:
+            break
+        precision += 1
+
+    # Sampling at the box edges and no further apart than a cell hits every cell
+    cell_lat, cell_lon = geohash_cell_size(precision)
+
+    def samples(low, high, step):
+        points = [low]
+        while points[-1] + step < high:
+            points.append(points[-1] + step)
+        return points + [high]
+
+    return sorted({
+        geohash(max(-90.0, min(90.0, lat)), (lon + 180.0) % 360.0 - 180.0, precision)
+        for lat in samples(latitude - dlat, latitude + dlat, cell_lat)
+        for lon in samples(longitude - dlon, longitude + dlon, cell_lon)
+    })
+
+
+def validate_polygon(vertices):
+    """Raises ValueError unless vertices is a list of at least 3 [latitude, longitude] pairs."""
+    if not isinstance(vertices, (list, tuple)) or len(vertices) < 3:
+        raise ValueError('A polygon needs at least 3 [latitude, longitude] points.')
+    for point in vertices:
+        if not isinstance(point, (list, tuple)) or len(point) != 2:
+            raise ValueError('Polygon points must be [latitude, longitude] pairs.')
+        latitude, longitude = (float(value) for value in point)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f'Polygon point {list(point)} is out of range.')
+
+
+class PolygonGeofence:
+    """
+    Point-in-polygon test by ray casting, with two shortcuts: points outside
+    the bounding box are rejected at once, and the edges are indexed into
+    latitude bands so a point is only tested against the edges that span
+    its own latitude.
+    """
+
+    def __init__(self, vertices, name='', bands=None):
+        validate_polygon(vertices)
+        points = [(float(lat), float(lon)) for lat, lon in vertices]
+        if points[0] == points[-1]:
+            points.pop()
+        self.name = name
+        self.min_lat = min(lat for lat, _ in points)
+        self.max_lat = max(lat for lat, _ in points)
+        self.min_lon = min(lon for _, lon in points)
+        self.max_lon = max(lon for _, lon in points)
+        self.centroid = (sum(lat for lat, _ in points) / len(points), sum(lon for _, lon in points) / len(points))
+
+        # (low_lat, high_lat, lon_at_low, dlon_per_dlat); horizontal edges never cross a ray along longitude
+        edges = []
+        for (lat1, lon1), (lat2, lon2) in zip(points, points[1:] + points[:1]):
+            if lat1 == lat2:
+                continue
+            if lat1 > lat2:
+                lat1, lon1, lat2, lon2 = lat2, lon2, lat1, lon1
+            edges.append((lat1, lat2, lon1, (lon2 - lon1) / (lat2 - lat1)))
+
+        self._bands = max(1, min(bands or len(edges), 256))
+        self._band_height = (self.max_lat - self.min_lat) / self._bands or 1.0
+        self._index = [[] for _ in range(self._bands)]
+        for edge in edges:
+            for band in range(self._band(edge[0]), self._band(edge[1]) + 1):
+                self._index[band].append(edge)
+
+    def _band(self, latitude):
+        return min(self._bands - 1, max(0, int((latitude - self.min_lat) / self._band_height)))
+
+    def contains(self, latitude, longitude):
+        if not (self.min_lat <= latitude <= self.max_lat and self.min_lon <= longitude <= self.max_lon):
+            return False
+        inside = False
+        for low, high, lon_at_low, slope in self._index[self._band(latitude)]:
+            # Half-open in latitude, so a ray through a vertex counts once
+            if low <= latitude < high and longitude < lon_at_low + (latitude - low) * slope:
+                inside = not inside
+        return inside
+
+
+def haversine_many(lat1, lon1, lat2, lon2):
+    """
+    Haversine distances in metres between paired points. Each argument is a
+    sequence or a single value broadcast against the others. Returns a
+    NumPy array when NumPy is available, otherwise a list.
+    """
+    if np is not None:
+        phi1 = np.radians(np.asarray(lat1, dtype=float))
+        phi2 = np.radians(np.asarray(lat2, dtype=float))
+        delta_lambda = np.radians(np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float))
+        a = np.sin((phi2 - phi1) / 2.0) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2.0) ** 2
+        return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    columns = [value if isinstance(value, (list, tuple)) else None for value in (lat1, lon1, lat2, lon2)]
+    count = max((len(c) for c in columns if c is not None), default=1)
+    rows = zip(*(
+        column if column is not None else [value] * count
+        for column, value in zip(columns, (lat1, lon1, lat2, lon2))
+    ))
+    return [Geofence(float(b_lat), float(b_lon)).exact(float(a_lat), float(a_lon)) for a_lat, a_lon, b_lat, b_lon in rows]
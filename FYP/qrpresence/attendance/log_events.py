@@ -0,0 +1,137 @@
+"""
+Structured, sampled request events for the attendance app.
+
+A request builds one Event, adds fields to it as it goes, and emits it once
+at the end. Nothing is formatted on the request thread: emit() returns
+early when the logger would drop the record, fields are only rendered when
+a handler formats the record, and BackgroundHandler hands records to a
+QueueListener thread so the file handlers in settings.LOGGING never block
+a request.
+
+Successful events are sampled with EVENT_LOG_SAMPLE_RATES (event name to
+rate, 0.0 - 1.0, default 1.0); failures (status 400 and up, or an
+exception) are always logged.
+"""
+import json
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('attendance.events')
+
+
+class _Fields:
+    """Renders an event's fields as key=value only when the message is formatted."""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{key}={value}' for key, value in self.fields.items() if value is not None)
+
+
+def sample_rate(name):
+    return getattr(settings, 'EVENT_LOG_SAMPLE_RATES', {}).get(name, 1.0)
+
+
+class Event:
+    """One structured log record for a unit of work, emitted once."""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.exc_info = None
+        self._start = time.perf_counter()
+
+    def add(self, **fields):
+        self.fields.update(fields)
+
+    def fail(self):
+        """Attaches the exception being handled to the event."""
+        self.exc_info = sys.exc_info()
+
+    def emit(self, status_code, **fields):
+        failed = status_code >= 400 or self.exc_info is not None
+        if status_code >= 500 or self.exc_info is not None:
+            level = logging.ERROR
+        elif failed:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+        if not failed:
+            rate = sample_rate(self.name)
+            if rate < 1.0 and random.random() >= rate:
+                return
+
+        self.fields.update(fields)
+        self.fields['status'] = status_code
+        self.fields['duration_ms'] = round((time.perf_counter() - self._start) * 1000, 2)
+        logger.log(
+            level, '%s %s', self.name, _Fields(self.fields),
+            exc_info=self.exc_info, extra={'event': self.name, 'event_fields': self.fields},
+        )
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; event fields are merged in at the top level."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if hasattr(record, 'event'):
+            data['event'] = record.event
+            data.update((key, value) for key, value in record.event_fields.items() if value is not None)
+        else:
+            data['message'] = record.getMessage()
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    """
+    Puts records on an in-process queue for a QueueListener thread that
+    passes them to `handler`. Records are not pre-formatted here, so
+    message and JSON rendering also happen on the listener thread.
+    """
+
+    def __init__(self, handler):
+        super().__init__(queue.SimpleQueue())
+        self.handler = handler
+        self.listener = QueueListener(self.queue, handler, respect_handler_level=True)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.handler.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Same process, so the record can cross the queue as it is
+        return record
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.handler.close()
+        super().close()
+
+
+def background_handler(handler_class='logging.FileHandler', **kwargs):
+    """
+    dictConfig factory for a BackgroundHandler around any handler class:
+
+        'file': {'()': 'attendance.log_events.background_handler',
+                 'handler_class': 'logging.FileHandler', 'filename': ...}
+    """
+    return BackgroundHandler(import_string(handler_class)(**kwargs))
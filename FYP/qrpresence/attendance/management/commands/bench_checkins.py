@@ -0,0 +1,97 @@
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils.timezone import now
+
+from attendance.benchmark import (
+    build_scans, reset_sessions, run_asgi_storm, run_http_storm, run_wsgi_storm, summarise,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays one check-in per enrolled student and seeded session (see "
+        "seed_checkins) and reports latency percentiles, throughput and queries "
+        "per request, optionally writing them to a JSON file for comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument(
+            '--target', default='wsgi',
+            help="'wsgi' or 'asgi' for the in-process test client, or a server URL such as http://127.0.0.1:8000"
+        )
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument(
+            '--ramp', type=float, default=0,
+            help='Spread arrivals uniformly over this many seconds, e.g. 90 for a realistic lecture start'
+        )
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a previous --output file')
+        parser.add_argument('--label', help='Stored with the results; defaults to the current git commit')
+
+    def handle(self, *args, **options):
+        reset_sessions(options['prefix'])
+        scans = build_scans(options['prefix'])
+        if not scans:
+            raise CommandError(f"No benchmark data for prefix '{options['prefix']}'. Run seed_checkins first.")
+
+        target = options['target']
+        if target in ('wsgi', 'asgi'):
+            run = run_wsgi_storm if target == 'wsgi' else run_asgi_storm
+            # Lets the test clients through ALLOWED_HOSTS as 'testserver'
+            setup_test_environment()
+            try:
+                samples, elapsed = run(scans, options['concurrency'], options['ramp'])
+            finally:
+                teardown_test_environment()
+        elif target.startswith(('http://', 'https://')):
+            samples, elapsed = run_http_storm(target, scans, options['concurrency'], options['ramp'])
+        else:
+            raise CommandError("--target must be 'wsgi', 'asgi' or an http(s) URL")
+
+        succeeded = sum(1 for sample in samples if sample.status in (200, 201))
+        if not succeeded:
+            summary = summarise(samples, elapsed)
+            raise CommandError(f"No check-in succeeded (statuses {summary['statuses']}); nothing was measured.")
+
+        results = {
+            'label': options['label'] or self._git_commit(),
+            'recorded_at': now().isoformat(),
+            'target': target,
+            'concurrency': options['concurrency'],
+            'ramp_s': options['ramp'],
+            'success_rate': round(succeeded / len(samples), 3),
+            **summarise(samples, elapsed),
+        }
+
+        self.stdout.write(json.dumps(results, indent=2))
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                self._compare(json.load(f), results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+    def _git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, baseline, results):
+        self.stdout.write(f"\nCompared with {baseline.get('label') or 'baseline'}:")
+        rows = [('throughput_rps', baseline['throughput_rps'], results['throughput_rps'])]
+        rows += [
+            (f'latency {key}', baseline['latency_ms'][key], results['latency_ms'][key])
+            for key in ('p50', 'p95', 'p99')
+        ]
+        if baseline.get('queries_per_request') is not None and results['queries_per_request'] is not None:
+            rows.append(('queries_per_request', baseline['queries_per_request'], results['queries_per_request']))
+        for name, before, after in rows:
+            change = f"{(after - before) / before * 100:+.1f}%" if before else 'n/a'
+            self.stdout.write(f"  {name:<20}{before:>10}{after:>10}  {change}")
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from attendance.benchmark import bench_qr_render_modes
+from attendance.qr_render import RENDER_MODES
+from attendance.qr_tokens import QR_PAYLOAD_PREFIX
+
+# A signed token is the longest payload the lecturer screen encodes
+SAMPLE_PAYLOAD = f"{QR_PAYLOAD_PREFIX}WyJDU0M0MDAxLTIwMjYtMTAtMTciLDE3NjA3MDAwMDAsMTc2MDcwMDkwMF0.abcdefghijklmnopqrstuvwxyz0123456789ABCDEFG"
+
+
+class Command(BaseCommand):
+    help = "Compares QR render modes: uncached render time and bytes sent (raw and gzipped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payload', default=SAMPLE_PAYLOAD)
+        parser.add_argument('--repeats', type=int, default=100)
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = bench_qr_render_modes(options['payload'], options['repeats'])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(f"{'mode':<12} {'mean ms':>8} {'p95 ms':>8} {'bytes':>7} {'gzip':>7}")
+        for mode in RENDER_MODES:
+            r = results[mode]
+            self.stdout.write(
+                f"{mode:<12} {r['render_ms']:>8.3f} {r['render_ms_p95']:>8.3f} {r['bytes']:>7} {r['gzip_bytes']:>7}"
+            )
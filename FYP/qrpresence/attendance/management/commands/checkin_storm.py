@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from attendance.benchmark import build_scans, run_asgi_storm, run_wsgi_storm, seed_benchmark_data, summarise
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays a synthetic check-in storm against a throwaway test database, "
+        "through mark_attendance (WSGI, one thread per in-flight request) and "
+        "mark_attendance_async (ASGI, one event loop), and compares throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=300, help='Students scanning in the storm')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--transport', choices=['wsgi', 'asgi', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        # Lets the test clients through ALLOWED_HOSTS as 'testserver'
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            transports = ['wsgi', 'asgi'] if options['transport'] == 'both' else [options['transport']]
+            results = []
+            for transport in transports:
+                # A separate session per transport so both start from no attendance
+                seed_benchmark_data(f'storm{transport}', courses=1, students=options['students'])
+                scans = build_scans(f'storm{transport}')
+                run = run_wsgi_storm if transport == 'wsgi' else run_asgi_storm
+                results.append((transport, summarise(*run(scans, options['concurrency']))))
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{'transport':<10}{'requests':>10}{'seconds':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}  statuses"
+        )
+        for transport, r in results:
+            self.stdout.write(
+                f"{transport:<10}{r['requests']:>10}{r['elapsed_s']:>10.2f}{r['throughput_rps']:>10.1f}"
+                f"{r['latency_ms']['p50']:>10.1f}{r['latency_ms']['p99']:>10.1f}  {r['statuses']}"
+            )
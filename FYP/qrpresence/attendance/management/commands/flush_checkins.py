@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from attendance import write_behind
+
+
+class Command(BaseCommand):
+    help = (
+        "Loads journaled write-behind check-ins into Attendance. Segments left by "
+        "workers that are no longer running on this host are recovered first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Also load segments of running workers. Only use while the web workers are stopped.'
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        directory = write_behind.journal_dir()
+        recovered = write_behind.recover_orphans(directory, force=options['force'])
+        loaded = write_behind.flush_journal(directory, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {loaded} check-in(s) from {directory} ({recovered} orphaned segment(s) recovered)"
+        ))
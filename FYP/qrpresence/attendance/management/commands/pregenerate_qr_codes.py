@@ -0,0 +1,54 @@
+from datetime import date, datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import make_aware
+
+from attendance.models import Session
+from attendance.qr_pregeneration import pregenerate_qr_codes, sessions_without_qr
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-generates QR codes for every session in a date range (by session "
+        "timestamp), rendering across CPU cores. Sessions that already have a "
+        "QR code are skipped unless --force is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='end', help='Last day, YYYY-MM-DD')
+        parser.add_argument('--course', help='Only sessions of this course code')
+        parser.add_argument('--workers', type=int, help='Render processes (default: CPU count)')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Also add a QR code to sessions that have one')
+
+    def _day(self, value, end=False):
+        try:
+            day = date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return make_aware(datetime.combine(day, time.max if end else time.min))
+
+    def handle(self, *args, **options):
+        sessions = Session.objects.all()
+        if options['start']:
+            sessions = sessions.filter(timestamp__gte=self._day(options['start']))
+        if options['end']:
+            sessions = sessions.filter(timestamp__lte=self._day(options['end'], end=True))
+        if options['course']:
+            sessions = sessions.filter(course__code=options['course'])
+        if not options['force']:
+            sessions = sessions_without_qr(sessions)
+
+        step = [0]
+
+        def progress(done, total):
+            # Roughly every 5%, and always at the end
+            if done == total or done * 20 // total > step[0]:
+                step[0] = done * 20 // total
+                self.stdout.write(f"  {done}/{total} sessions")
+
+        created = pregenerate_qr_codes(
+            sessions, workers=options['workers'], batch_size=options['batch_size'], progress=progress
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} QR code(s)"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from attendance.benchmark import clear_benchmark_data, seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds benchmark courses, students, enrollments and open sessions for "
+        "bench_checkins. Everything created is namespaced by --prefix."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='bench')
+        parser.add_argument('--courses', type=int, default=5)
+        parser.add_argument('--students', type=int, default=500)
+        parser.add_argument('--sessions-per-course', type=int, default=1)
+        parser.add_argument('--courses-per-student', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help='Delete existing data for the prefix first')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['clear']:
+                clear_benchmark_data(options['prefix'])
+            sessions = seed_benchmark_data(
+                options['prefix'],
+                courses=options['courses'],
+                students=options['students'],
+                sessions_per_course=options['sessions_per_course'],
+                courses_per_student=options['courses_per_student'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['students']} students across {len(sessions)} session(s) "
+            f"with prefix '{options['prefix']}'"
+        ))
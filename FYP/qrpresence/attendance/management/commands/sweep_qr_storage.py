@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from attendance.qr_sweeper import prune_render_cache, sweep_qr_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes QR code images that no QRCode references, or whose QR codes "
+        "expired, trims the QR render store to its age and size limits, and "
+        "reports the space reclaimed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Files checked per database query.')
+        parser.add_argument(
+            '--min-age-minutes', type=int,
+            help='Leave files younger than this (default QR_SWEEP_MIN_AGE).'
+        )
+        parser.add_argument(
+            '--interval', type=int,
+            help='Keep running, sweeping every INTERVAL seconds, instead of sweeping once.'
+        )
+
+    def handle(self, *args, **options):
+        min_age = timedelta(minutes=options['min_age_minutes']) if options['min_age_minutes'] is not None else None
+        while True:
+            result = sweep_qr_storage(
+                chunk_size=options['chunk_size'], min_age=min_age, dry_run=options['dry_run']
+            )
+            verb = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {result.deleted} of {result.scanned} QR image(s) "
+                f"({result.orphaned} orphaned, {result.expired} expired), "
+                f"{result.bytes_reclaimed / 1024:.1f} KB reclaimed"
+            ))
+            renders = prune_render_cache(dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {renders.deleted} of {renders.scanned} cached QR render(s) "
+                f"({renders.expired} expired, {renders.evicted} over the size limit), "
+                f"{renders.bytes_reclaimed / 1024:.1f} KB reclaimed"
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -1,16 +1,265 @@
+import json
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.http import JsonResponse
-from attendance.models import Session
+from django.urls import reverse
+from django.utils.timezone import now
+
+from .checkin import CheckInError
+from .geofence import session_geofence
+from .network import check_campus_network
+from .qr_tokens import read_qr_token
+from .session_cache import (
+    aget_cached_closed_session, aget_cached_open_session, get_cached_closed_session, get_cached_open_session,
+)
+from .utils import MAX_SCAN_DISTANCE
+
+
+class _QueryTracker:
+    """execute_wrapper that counts, times and de-duplicates one request's queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.duplicates = 0
+        self.db_time = 0.0
+        self._seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.count += 1
+            # Same statement text with any parameters: the usual N+1 shape
+            if sql in self._seen:
+                self.duplicates += 1
+            else:
+                self._seen.add(sql)
+
+
+class RequestMetrics:
+    """Per-view aggregates for this process, fed by QueryMetricsMiddleware."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, tracker, total_time):
+        with self._lock:
+            stats = self._views.get(view_name)
+            if stats is None:
+                stats = self._views[view_name] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'duplicate_queries': 0,
+                    'db_time': 0.0, 'total_time': 0.0, 'max_total_time': 0.0,
+                }
+            stats['requests'] += 1
+            stats['queries'] += tracker.count
+            stats['max_queries'] = max(stats['max_queries'], tracker.count)
+            stats['duplicate_queries'] += tracker.duplicates
+            stats['db_time'] += tracker.db_time
+            stats['total_time'] += total_time
+            stats['max_total_time'] = max(stats['max_total_time'], total_time)
+
+    def snapshot(self):
+        """Aggregates with per-request averages, busiest views (by DB time) first."""
+        with self._lock:
+            views = {name: dict(stats) for name, stats in self._views.items()}
+        rows = []
+        for name, stats in views.items():
+            n = stats['requests']
+            rows.append({
+                'view': name,
+                'requests': n,
+                'avg_queries': round(stats['queries'] / n, 2),
+                'max_queries': stats['max_queries'],
+                'avg_duplicate_queries': round(stats['duplicate_queries'] / n, 2),
+                'avg_db_ms': round(stats['db_time'] / n * 1000, 2),
+                'avg_total_ms': round(stats['total_time'] / n * 1000, 2),
+                'max_total_ms': round(stats['max_total_time'] * 1000, 2),
+                'total_db_ms': round(stats['db_time'] * 1000, 2),
+            })
+        return sorted(rows, key=lambda row: row['total_db_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+class QueryMetricsMiddleware:
+    """
+    Records query count, duplicate queries, DB time and total time for every
+    request, keyed by the resolved view name, into request_metrics. With
+    REQUEST_METRICS_HEADERS set the request's own numbers are also returned
+    as X-Query-Count, X-Duplicate-Queries, X-DB-Time-Ms and X-Total-Time-Ms.
+    Removed from the stack entirely unless REQUEST_METRICS_ENABLED is set.
+
+    Under ASGI the async ORM runs queries on the request's thread-sensitive
+    worker thread, which has its own connections, so the query tracker is
+    installed and removed there: two hops to that thread per request, and
+    none when metrics are off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.add_headers = getattr(settings, 'REQUEST_METRICS_HEADERS', False)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _track(stack, tracker):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(tracker))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        tracker = _QueryTracker()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            self._track(stack, tracker)
+            response = self.get_response(request)
+        return self._finish(request, response, tracker, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        tracker = _QueryTracker()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(self._track)(stack, tracker)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self._finish(request, response, tracker, time.perf_counter() - start)
+
+    def _finish(self, request, response, tracker, total_time):
+        match = request.resolver_match
+        request_metrics.record(match.view_name if match else 'unresolved', tracker, total_time)
+
+        if self.add_headers:
+            response['X-Query-Count'] = str(tracker.count)
+            response['X-Duplicate-Queries'] = str(tracker.duplicates)
+            response['X-DB-Time-Ms'] = f'{tracker.db_time * 1000:.2f}'
+            response['X-Total-Time-Ms'] = f'{total_time * 1000:.2f}'
+        return response
+
+
+def check_in_payload(request):
+    """
+    The JSON body of a check-in request as a dict, parsed once and kept on
+    the request for the scan limiter and the views. None if the body is not
+    a JSON object.
+    """
+    if not hasattr(request, '_check_in_payload'):
+        data = None
+        if request.content_type not in ('application/x-www-form-urlencoded', 'multipart/form-data'):
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                pass
+        request._check_in_payload = data if isinstance(data, dict) else None
+    return request._check_in_payload
+
+
+class CheckInGateMiddleware:
+    """
+    Turns away check-ins that cannot succeed before authentication and view
+    dispatch run: scans from outside CAMPUS_NETWORKS, bad or expired signed
+    QR tokens, scans after the session's attendance window and scans more
+    than MAX_SCAN_DISTANCE from the session. Sessions are only read from
+    the open- and closed-session caches, so the gate never queries the
+    database; on a miss, or when the body is incomplete, the request goes
+    on to the view, which applies the full rules. Venue sessions are only
+    checked for time. Runs natively under both WSGI and ASGI. Removed from
+    the stack unless CHECK_IN_GATE_ENABLED is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CHECK_IN_GATE_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self._paths = None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            scan = self._scan(request)
+            if scan is not None:
+                session_id = scan[0]
+                snapshot = get_cached_open_session(session_id) or get_cached_closed_session(session_id)
+                self._check(snapshot, *scan[1:])
+        except CheckInError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        try:
+            scan = self._scan(request)
+            if scan is not None:
+                session_id = scan[0]
+                snapshot = (
+                    await aget_cached_open_session(session_id) or await aget_cached_closed_session(session_id)
+                )
+                self._check(snapshot, *scan[1:])
+        except CheckInError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
+        return await self.get_response(request)
+
+    def _scan(self, request):
+        """
+        Checks what needs no session and returns (session_id, data, qr_token)
+        for a check-in scan worth looking up, or None.
+        """
+        if self._paths is None:
+            self._paths = {reverse('mark_attendance'), reverse('mark_attendance_async')}
+        if request.method != 'POST' or request.path_info not in self._paths:
+            return None
+        check_campus_network(request.META)
 
-def geolocation_verification_middleware(get_response):
-    def middleware(request):
-        if request.path == '/api/attendance/mark/':
-            student_lat = float(request.data.get('latitude', 0))
-            student_long = float(request.data.get('longitude', 0))
-            session = Session.objects.get(id=request.data.get('session_id'))
+        data = check_in_payload(request)
+        if data is None:
+            return None
+        qr_token = read_qr_token(data)
+        session_id = qr_token.session_id if qr_token else data.get('session_id')
+        if not isinstance(session_id, str) or not session_id:
+            return None
+        return session_id, data, qr_token
 
-            distance = ((student_lat - session.gps_latitude) ** 2 + (student_long - session.gps_longitude) ** 2) ** 0.5
-            if distance > session.allowed_radius:
-                return JsonResponse({'error': 'Outside allowed location'}, status=403)
+    def _check(self, snapshot, data, qr_token):
+        if snapshot is None:
+            return
 
-        return get_response(request)
-    return middleware
\ No newline at end of file
+        # The same rules validate_check_in() applies before looking at the student
+        if qr_token is None and snapshot.window_ends_at and now() > snapshot.window_ends_at:
+            raise CheckInError('Attendance window has closed. QR code expired.', 400)
+        if snapshot.venue_id:
+            return
+        try:
+            latitude, longitude = float(data['latitude']), float(data['longitude'])
+        except (KeyError, ValueError, TypeError):
+            return
+        distance = session_geofence(snapshot).distance(latitude, longitude, within=MAX_SCAN_DISTANCE)
+        if distance > MAX_SCAN_DISTANCE:
+            raise CheckInError(
+                f"You are {distance:.2f}m away from class. Maximum allowed: {MAX_SCAN_DISTANCE}m.", 400
+            )
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-17 17:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_alter_course_options_alter_lecturer_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionRoster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('student_ids', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='roster', to='attendance.session')),
+            ],
+        ),
+    ]
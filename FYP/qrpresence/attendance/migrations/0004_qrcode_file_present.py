@@ -0,0 +1,30 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:05
+
+from django.db import migrations, models
+
+
+def mark_missing_files(apps, schema_editor):
+    QRCode = apps.get_model('attendance', 'QRCode')
+    storage = QRCode._meta.get_field('qr_image').storage
+    missing = [
+        pk for pk, name in QRCode.objects.values_list('pk', 'qr_image').iterator(chunk_size=1000)
+        if not name or not storage.exists(name)
+    ]
+    for start in range(0, len(missing), 1000):
+        QRCode.objects.filter(pk__in=missing[start:start + 1000]).update(file_present=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_sessionroster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrcode',
+            name='file_present',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(mark_missing_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_qrcode_file_present'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='qrcode',
+            name='qr_image',
+            field=models.ImageField(db_index=True, upload_to='qr_codes/'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+from attendance.geofence import geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    Session = apps.get_model('attendance', 'Session')
+    batch = []
+    for session in Session.objects.only('pk', 'gps_latitude', 'gps_longitude').iterator(chunk_size=1000):
+        session.geohash = geohash(session.gps_latitude, session.gps_longitude)
+        batch.append(session)
+        if len(batch) == 1000:
+            Session.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Session.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0006_venue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='geohash',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,9 @@ from django.utils.timezone import now
 from django.conf import settings
 from datetime import timedelta
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+
+from .geofence import geohash, validate_polygon
 
 class Student(models.Model):
     student_id = models.CharField(max_length=20, primary_key=True)  # Keep manually assigned ID
@@ -92,6 +95,26 @@ class StudentCourseEnrollment(models.Model):
         return f"{self.student} in {self.course} (by {self.enrolled_by})"
         
 
+class Venue(models.Model):
+    """A named campus location whose boundary replaces a session's radius check."""
+    name = models.CharField(max_length=255, unique=True)
+    # Boundary as [[latitude, longitude], ...]; the last point joins the first
+    polygon = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def clean(self):
+        try:
+            validate_polygon(self.polygon)
+        except (ValueError, TypeError) as e:
+            raise ValidationError({'polygon': str(e)})
+
+    def __str__(self):
+        return self.name
+
+
 class Session(models.Model):
     session_id = models.CharField(max_length=100, unique=True)  # <-- manually entered ID
     class_name = models.CharField(max_length=255)
@@ -102,19 +125,32 @@ class Session(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     course = models.ForeignKey('Course', on_delete=models.CASCADE, related_name='sessions')
     attendance_window = models.DurationField(default=timedelta(minutes=15)) 
+    # When set, scans must fall inside the venue instead of the radius
+    venue = models.ForeignKey(Venue, null=True, blank=True, on_delete=models.SET_NULL, related_name='sessions')
+    # Geohash of the GPS location, for finding sessions near a point
+    geohash = models.CharField(max_length=12, db_index=True, editable=False, default='')
     
     class Meta:
         ordering = ['-timestamp']  # Order by most recent sessions first
 
+    def save(self, *args, **kwargs):
+        self.geohash = geohash(self.gps_latitude, self.gps_longitude) if self.gps_latitude is not None else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'gps_latitude', 'gps_longitude'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'geohash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.class_name} ({self.session_id}) - {self.timestamp}"
 
 
 class QRCode(models.Model):
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
-    qr_image = models.ImageField(upload_to="qr_codes/")
+    qr_image = models.ImageField(upload_to="qr_codes/", db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(null=True, blank=True)
+    # Whether qr_image exists in storage, so listings don't stat every file
+    file_present = models.BooleanField(default=True)
 
     class Meta:
         ordering = ['-created_at']  # Order by most recent QR codes first
@@ -144,4 +180,18 @@ class Attendance(models.Model):
         unique_together = ('student', 'session')
 
     def __str__(self):
-        return f"{self.student} - {self.session}"
\ No newline at end of file
+        return f"{self.student} - {self.session}"
+
+class SessionRoster(models.Model):
+    """
+    Student IDs enrolled in the session's course, captured when the session
+    opens. Check-in and absentee lists work from this instead of re-querying
+    StudentCourseEnrollment.
+    """
+    session = models.OneToOneField(Session, on_delete=models.CASCADE, related_name='roster')
+    student_ids = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Roster for {self.session} ({len(self.student_ids)} students)"
@@ -0,0 +1,73 @@
+"""
+"Sessions open near me": the open sessions a student is enrolled in and
+could check in to from where they stand.
+
+Candidates come from one query restricted to the geohash cells around the
+student (an indexed prefix match on Session.geohash), to sessions whose
+attendance window is open and to the student's courses. Only those few
+are measured, with the same rules validate_check_in() applies.
+"""
+from django.conf import settings
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, F, OuterRef, Q
+from django.utils.timezone import now
+
+from .geofence import geohash_cover, session_geofence
+from .models import Session, StudentCourseEnrollment
+from .session_cache import get_open_sessions
+from .utils import MAX_SCAN_DISTANCE
+from .venues import venue_geofence
+
+# How far from the student to look for session locations; venues can extend
+# well beyond a session's point, so this is wider than any radius
+DEFAULT_SEARCH_RADIUS = 1000
+
+
+def nearby_candidates(user, latitude, longitude, radius, at):
+    """Open sessions for the user's courses located in the cells around the point."""
+    cells = Q()
+    for cell in geohash_cover(latitude, longitude, radius):
+        cells |= Q(geohash__startswith=cell)
+    return (
+        Session.objects
+        .filter(cells, timestamp__lte=at)
+        .alias(window_ends_at=ExpressionWrapper(F('timestamp') + F('attendance_window'), output_field=DateTimeField()))
+        .filter(window_ends_at__gte=at)
+        .filter(Exists(StudentCourseEnrollment.objects.filter(student__user=user, course=OuterRef('course'))))
+        .select_related('course', 'venue')
+    )
+
+
+def find_open_sessions_near(user, latitude, longitude, at=None):
+    """
+    Sessions the user could check in to at (latitude, longitude), nearest
+    first, as dicts ready for the API.
+    """
+    at = at or now()
+    radius = getattr(settings, 'NEARBY_SESSIONS_RADIUS', DEFAULT_SEARCH_RADIUS)
+    candidates = list(nearby_candidates(user, latitude, longitude, radius, at))
+    # Snapshots apply the QR expiry and default window on top of attendance_window
+    snapshots = get_open_sessions(session.session_id for session in candidates)
+
+    found = []
+    for session in candidates:
+        snapshot = snapshots.get(session.session_id)
+        if snapshot is None or (snapshot.closes_at is not None and snapshot.closes_at < at):
+            continue
+
+        distance = session_geofence(snapshot).distance(latitude, longitude)
+        if snapshot.venue_id:
+            venue = venue_geofence(snapshot.venue_id, snapshot.venue_version)
+            if venue is None or not venue.contains(latitude, longitude):
+                continue
+        elif distance > min(MAX_SCAN_DISTANCE, snapshot.allowed_radius):
+            continue
+
+        found.append({
+            'session_id': session.session_id,
+            'class_name': session.class_name,
+            'course_code': session.course.code,
+            'venue': session.venue.name if session.venue else None,
+            'distance': round(distance, 1),
+            'closes_at': snapshot.closes_at.isoformat() if snapshot.closes_at else None,
+        })
+    return sorted(found, key=lambda item: item['distance'])
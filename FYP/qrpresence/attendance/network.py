@@ -0,0 +1,105 @@
+"""
+Campus network gate for check-ins.
+
+CAMPUS_NETWORKS lists the campus IPv4/IPv6 ranges in CIDR notation. They
+are compiled once per process into merged, sorted address intervals, so
+a lookup is a bisect over integers rather than string matching. With
+CAMPUS_NETWORK_REQUIRED set, scans from elsewhere are rejected before the
+check-in touches the database.
+
+The client address is REMOTE_ADDR unless that is one of TRUSTED_PROXIES,
+in which case X-Forwarded-For is read from the right, skipping further
+trusted proxies; entries a client put there itself are never reached.
+"""
+import ipaddress
+from bisect import bisect_right
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .checkin import CheckInError
+
+
+class CIDRMatcher:
+    """Membership test for a set of CIDR ranges, O(log n) per lookup."""
+
+    def __init__(self, networks=()):
+        intervals = {4: [], 6: []}
+        for network in networks:
+            network = ipaddress.ip_network(network, strict=False)
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        self._starts = {}
+        self._ends = {}
+        for version, ranges in intervals.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __bool__(self):
+        return any(self._starts.values())
+
+    def __contains__(self, address):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        index = bisect_right(self._starts[address.version], value) - 1
+        return index >= 0 and value <= self._ends[address.version][index]
+
+
+@lru_cache(maxsize=None)
+def campus_networks():
+    return CIDRMatcher(getattr(settings, 'CAMPUS_NETWORKS', ()))
+
+
+@lru_cache(maxsize=None)
+def trusted_proxies():
+    return CIDRMatcher(getattr(settings, 'TRUSTED_PROXIES', ()))
+
+
+@receiver(setting_changed)
+def _recompile(setting, **kwargs):
+    if setting == 'CAMPUS_NETWORKS':
+        campus_networks.cache_clear()
+    elif setting == 'TRUSTED_PROXIES':
+        trusted_proxies.cache_clear()
+
+
+def client_ip(meta):
+    """The client's address from a request's META, honouring TRUSTED_PROXIES."""
+    remote = meta.get('REMOTE_ADDR', '')
+    proxies = trusted_proxies()
+    if not proxies or remote not in proxies:
+        return remote
+
+    forwarded = [hop.strip() for hop in meta.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+    for hop in reversed(forwarded):
+        if hop not in proxies:
+            return hop
+    return forwarded[0] if forwarded else remote
+
+
+def is_campus_request(meta):
+    return client_ip(meta) in campus_networks()
+
+
+def check_campus_network(meta):
+    """
+    Raises CheckInError when CAMPUS_NETWORK_REQUIRED is set and the request
+    comes from outside CAMPUS_NETWORKS.
+    """
+    if getattr(settings, 'CAMPUS_NETWORK_REQUIRED', False) and not is_campus_request(meta):
+        raise CheckInError('You must be on campus Wi-Fi to mark attendance.', 403)
@@ -0,0 +1,88 @@
+"""
+Pre-generates static QR codes for many sessions at once, e.g. a whole
+semester before teaching starts, instead of lecturers rendering them one
+by one through generate_and_save_qr.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.db.models import Exists, OuterRef
+
+from .file_serving import content_addressed_name
+from .models import QRCode
+from .qr_render import encode_qr_png
+from .qr_tokens import QR_PAYLOAD_PREFIX
+from .session_cache import invalidate_open_session
+
+# Below this many sessions, starting a process pool costs more than it saves
+POOL_MIN_SESSIONS = 32
+
+
+def sessions_without_qr(sessions):
+    return sessions.filter(~Exists(QRCode.objects.filter(session=OuterRef('pk'))))
+
+
+def static_qr_payload(session):
+    """What the lecturer screen's generator encodes for a session."""
+    return f"{QR_PAYLOAD_PREFIX}{session.session_id}"
+
+
+def render_pngs(payloads, workers=None):
+    """
+    Yields the PNG for each payload, in order. Renders across `workers`
+    processes (default: all CPU cores) unless the job is too small to
+    benefit. Workers are spawned rather than forked, so threads in the
+    parent (e.g. the write-behind flusher) cannot deadlock them.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(payloads) < POOL_MIN_SESSIONS:
+        for payload in payloads:
+            yield encode_qr_png(payload)
+        return
+
+    chunksize = max(1, len(payloads) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        yield from pool.map(encode_qr_png, payloads, chunksize=chunksize)
+
+
+def pregenerate_qr_codes(sessions, workers=None, batch_size=200, progress=None):
+    """
+    Renders and stores a QR code for every session in the queryset and
+    writes the QRCode rows with bulk_create. Each code expires with its
+    session's attendance window. progress(done, total) is called after
+    each session. Returns the number of QR codes created.
+    """
+    sessions = list(sessions.only('pk', 'session_id', 'timestamp', 'attendance_window'))
+    total = len(sessions)
+    field = QRCode._meta.get_field('qr_image')
+
+    created = 0
+    batch = []
+    pngs = render_pngs([static_qr_payload(session) for session in sessions], workers)
+    for done, (session, png) in enumerate(zip(sessions, pngs), 1):
+        name = field.storage.save(
+            field.generate_filename(None, content_addressed_name(f"qr_{session.session_id}.png", png)),
+            ContentFile(png),
+        )
+        batch.append(QRCode(
+            session=session,
+            qr_image=name,
+            expires_at=session.timestamp + session.attendance_window if session.attendance_window else None,
+        ))
+        if len(batch) >= batch_size:
+            QRCode.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+        if progress:
+            progress(done, total)
+
+    if batch:
+        QRCode.objects.bulk_create(batch)
+        created += len(batch)
+
+    # bulk_create skips the QRCode signals that keep cached session metadata current
+    for session in sessions:
+        invalidate_open_session(session.session_id)
+    return created
@@ -0,0 +1,111 @@
+"""
+QR encoding with no Django imports, so it can run in worker processes
+started with the spawn method (see attendance.qr_pregeneration).
+
+Output modes:
+
+    png          the original 10px-per-module image
+    png-compact  1-bit PNG at 1px per module; scale it up on the client with
+                 `image-rendering: pixelated`
+    svg          one <path> in module units, sized by box_size
+    matrix       JSON {"size", "border", "rows"}, each row a string of 0/1
+                 modules, for drawing on a canvas
+"""
+import json
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+
+RENDER_MODES = ('png', 'png-compact', 'svg', 'matrix')
+
+MODE_CONTENT_TYPES = {
+    'png': 'image/png',
+    'png-compact': 'image/png',
+    'svg': 'image/svg+xml',
+    'matrix': 'application/json',
+}
+
+MODE_EXTENSIONS = {'png': 'png', 'png-compact': 'png', 'svg': 'svg', 'matrix': 'json'}
+
+
+def _make_qr(data, error_correction, box_size=10, border=4):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=error_correction,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr
+
+
+def encode_qr_png(data, box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L):
+    """Renders data as a QR code and returns the PNG bytes."""
+    qr = _make_qr(data, error_correction, box_size, border)
+
+    img = qr.make_image(fill='black', back_color='white')
+    img_io = BytesIO()
+    img.save(img_io, 'PNG')
+    return img_io.getvalue()
+
+
+def encode_qr_matrix(data, error_correction=qrcode.constants.ERROR_CORRECT_L):
+    """The QR code's modules, without the quiet zone, as rows of booleans."""
+    return _make_qr(data, error_correction, border=0).get_matrix()
+
+
+def _compact_png(matrix):
+    size = len(matrix)
+    # Mode '1': 1 is white, 0 is black
+    img = Image.new('1', (size, size))
+    img.putdata([0 if module else 1 for row in matrix for module in row])
+    img_io = BytesIO()
+    img.save(img_io, 'PNG', optimize=True)
+    return img_io.getvalue()
+
+
+def _svg(matrix, box_size):
+    size = len(matrix)
+    # One subpath per horizontal run of dark modules
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                run = x
+                while run < size and row[run]:
+                    run += 1
+                path.append(f'M{x} {y}h{run - x}v1h-{run - x}z')
+                x = run
+            else:
+                x += 1
+    pixels = size * box_size
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{pixels}" height="{pixels}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{"".join(path)}" fill="#000"/></svg>'
+    ).encode()
+
+
+def encode_qr(data, mode='png', box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L):
+    """Renders data in one of RENDER_MODES and returns the bytes."""
+    if mode == 'png':
+        return encode_qr_png(data, box_size, border, error_correction)
+    if mode not in RENDER_MODES:
+        raise ValueError(f'Unknown QR render mode {mode!r}')
+
+    if mode == 'png-compact':
+        # get_matrix() includes the quiet zone when border > 0
+        return _compact_png(_make_qr(data, error_correction, border=border).get_matrix())
+    if mode == 'svg':
+        return _svg(_make_qr(data, error_correction, border=border).get_matrix(), box_size)
+
+    matrix = encode_qr_matrix(data, error_correction)
+    return json.dumps({
+        'size': len(matrix),
+        'border': border,
+        'rows': [''.join('1' if module else '0' for module in row) for row in matrix],
+    }, separators=(',', ':')).encode()
@@ -0,0 +1,168 @@
+"""
+Garbage collection of QR code images.
+
+Files under the QR upload directory are listed from storage and checked
+against QRCode a chunk at a time (one indexed IN query per chunk). A file
+is removed when no row references it (e.g. its session was deleted) or when
+every row referencing it expired more than QR_SWEEP_EXPIRED_GRACE ago.
+Expired rows are kept for history with file_present cleared, so listings
+drop them. Files younger than QR_SWEEP_MIN_AGE are left alone, as their
+row may not be written yet.
+
+The same command bounds the QR render store (QR_RENDER_CACHE_DIR, see
+utils.render_qr): renders older than QR_RENDER_CACHE_MAX_AGE are removed,
+then the oldest until the store fits in QR_RENDER_CACHE_MAX_BYTES. Renders
+are content-addressed, so an evicted one is simply rendered again.
+
+Run it from cron or a scheduler with `manage.py sweep_qr_storage`, or keep
+it running with `--interval`.
+"""
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.timezone import now
+
+from .models import QRCode
+
+DEFAULT_MIN_AGE = timedelta(hours=1)
+DEFAULT_EXPIRED_GRACE = timedelta(days=1)
+DEFAULT_RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_RENDER_CACHE_MAX_AGE = timedelta(days=30)
+
+
+@dataclass
+class SweepResult:
+    scanned: int = 0
+    orphaned: int = 0
+    expired: int = 0
+    # Render store files removed to fit QR_RENDER_CACHE_MAX_BYTES
+    evicted: int = 0
+    deleted: int = 0
+    bytes_reclaimed: int = 0
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _delete_files(storage, names, result, dry_run):
+    for name in names:
+        try:
+            size = storage.size(name)
+            if not dry_run:
+                storage.delete(name)
+        except FileNotFoundError:
+            continue
+        result.deleted += 1
+        result.bytes_reclaimed += size
+
+
+def sweep_qr_storage(chunk_size=1000, min_age=None, expired_grace=None, dry_run=False, at=None):
+    """
+    Deletes orphaned and expired QR images; returns a SweepResult. With
+    dry_run, counts what would be deleted without touching anything.
+    """
+    at = at or now()
+    min_age = min_age if min_age is not None else getattr(settings, 'QR_SWEEP_MIN_AGE', DEFAULT_MIN_AGE)
+    expired_grace = (
+        expired_grace if expired_grace is not None
+        else getattr(settings, 'QR_SWEEP_EXPIRED_GRACE', DEFAULT_EXPIRED_GRACE)
+    )
+
+    field = QRCode._meta.get_field('qr_image')
+    storage = field.storage
+    directory = field.upload_to.rstrip('/')
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return SweepResult()
+
+    result = SweepResult()
+    for chunk in _chunks(sorted(files), chunk_size):
+        names = [f"{directory}/{filename}" for filename in chunk]
+        result.scanned += len(names)
+
+        referenced = set()
+        live = set()
+        for name, expired in (
+            QRCode.objects
+            .filter(qr_image__in=names)
+            .values_list('qr_image', Q(expires_at__lt=at - expired_grace))
+        ):
+            referenced.add(name)
+            if not expired:
+                live.add(name)
+
+        expired = sorted(referenced - live)
+        orphans = [
+            name for name in names
+            if name not in referenced and at - storage.get_modified_time(name) > min_age
+        ]
+        result.orphaned += len(orphans)
+        result.expired += len(expired)
+
+        _delete_files(storage, orphans + expired, result, dry_run)
+        if expired and not dry_run:
+            QRCode.objects.filter(qr_image__in=expired).update(file_present=False)
+    return result
+
+
+def prune_render_cache(max_bytes=None, max_age=None, dry_run=False, at=None):
+    """
+    Evicts renders from QR_RENDER_CACHE_DIR by age, then oldest first until
+    the store is within max_bytes; returns a SweepResult. Temporary files
+    older than QR_SWEEP_MIN_AGE, left by interrupted writes, count as expired.
+    """
+    cache_dir = getattr(settings, 'QR_RENDER_CACHE_DIR', None)
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return SweepResult()
+    max_bytes = (
+        max_bytes if max_bytes is not None
+        else getattr(settings, 'QR_RENDER_CACHE_MAX_BYTES', DEFAULT_RENDER_CACHE_MAX_BYTES)
+    )
+    max_age = max_age if max_age is not None else getattr(settings, 'QR_RENDER_CACHE_MAX_AGE', DEFAULT_RENDER_CACHE_MAX_AGE)
+    at = (at or now()).timestamp()
+    oldest_kept = at - max_age.total_seconds()
+    oldest_partial = at - getattr(settings, 'QR_SWEEP_MIN_AGE', DEFAULT_MIN_AGE).total_seconds()
+
+    result = SweepResult()
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, os.path.join(root, name), name.endswith('.tmp')))
+    result.scanned = len(files)
+
+    evict = []
+    total = 0
+    # Newest first, so whatever is kept is the most recently written
+    for mtime, size, path, partial in sorted(files, reverse=True):
+        if partial:
+            if mtime < oldest_partial:
+                result.expired += 1
+                evict.append((path, size))
+        elif mtime < oldest_kept:
+            result.expired += 1
+            evict.append((path, size))
+        elif total + size > max_bytes:
+            result.evicted += 1
+            evict.append((path, size))
+        else:
+            total += size
+
+    for path, size in evict:
+        try:
+            if not dry_run:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+        result.deleted += 1
+        result.bytes_reclaimed += size
+    return result
@@ -0,0 +1,149 @@
+"""
+Signed QR tokens: the QR payload carries the session ID, issue time and
+expiry, signed with SECRET_KEY, so scans can be checked for forgery and
+expiry without a database or file lookup.
+
+A token is Signer.sign_object() output over [session_id, issued, expires]
+(epoch seconds), e.g. "WyJDU0M0MDAxIiwxNzYwNzAwMDAwLDE3NjA3MDA5MDBd.<sig>".
+The expiry is in the signed payload, so no signing timestamp is added and
+the same inputs always give the same token. The separator is '.', so the
+"attendance:<token>" payload still splits into exactly two parts on ':' in
+the scanner. Clients may send it as `qr_token`, or in `session_id` as the
+scanner does with whatever follows the prefix.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core import signing
+from django.utils.timezone import now
+
+from .checkin import SCAN_CLOCK_SKEW, CheckInError
+from .session_cache import DEFAULT_CHECKIN_WINDOW
+
+QR_TOKEN_SALT = 'attendance.qr_token'
+
+# Must not be ':' (the payload prefix separator) or a base64url character
+QR_TOKEN_SEP = '.'
+
+# Prefix the scanner app expects in front of the session reference
+QR_PAYLOAD_PREFIX = 'attendance:'
+
+
+@dataclass(frozen=True)
+class QRToken:
+    session_id: str
+    issued_at: datetime
+    expires_at: datetime
+
+
+def _signer():
+    return signing.Signer(salt=QR_TOKEN_SALT, sep=QR_TOKEN_SEP)
+
+
+def _from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def issue_qr_token(session, lifetime=None, issued_at=None):
+    """
+    Signs a token for session, valid for `lifetime` (default
+    QR_TOKEN_LIFETIME) but never past the session's attendance window.
+    Returns (token, QRToken).
+    """
+    issued_at = (issued_at or now()).replace(microsecond=0)
+    lifetime = lifetime or getattr(settings, 'QR_TOKEN_LIFETIME', DEFAULT_CHECKIN_WINDOW)
+    expires_at = issued_at + lifetime
+    if session.attendance_window:
+        expires_at = min(expires_at, session.timestamp + session.attendance_window)
+
+    token = _signer().sign_object(
+        [session.session_id, int(issued_at.timestamp()), int(expires_at.timestamp())]
+    )
+    return token, QRToken(session.session_id, issued_at, _from_epoch(int(expires_at.timestamp())))
+
+
+def verify_qr_token(token, at=None):
+    """
+    Checks the signature and expiry of a token, in CPU only. Raises
+    CheckInError for forged, malformed or expired tokens.
+    """
+    qr_token = _unsign(token)
+    at = at or now()
+    if qr_token.issued_at > at + SCAN_CLOCK_SKEW:
+        raise CheckInError('Invalid QR code.', 400)
+    if at > qr_token.expires_at:
+        raise CheckInError('QR code has expired. Attendance window closed.', 403)
+    return qr_token
+
+
+def _unsign(token):
+    try:
+        session_id, issued, expires = _signer().unsign_object(token)
+        return QRToken(session_id, _from_epoch(issued), _from_epoch(expires))
+    except (signing.BadSignature, ValueError, TypeError, OverflowError):
+        raise CheckInError('Invalid QR code.', 400)
+
+
+def read_qr_token(data, at=None):
+    """
+    Returns the verified QRToken of a scan request body, or None for a
+    plain session_id scan. An explicit `qr_token` must be valid; a
+    `session_id` that fails verification is treated as a plain session ID.
+    With QR_TOKEN_REQUIRED set, plain session_id scans are rejected.
+    """
+    token = data.get('qr_token')
+    if token:
+        qr_token = verify_qr_token(str(token), at)
+    else:
+        qr_token = None
+        session_id = data.get('session_id')
+        # Signed values always contain the separator; a plain session ID may too
+        if isinstance(session_id, str) and QR_TOKEN_SEP in session_id:
+            try:
+                qr_token = verify_qr_token(session_id, at)
+            except CheckInError as e:
+                if e.status_code != 400:
+                    raise
+
+    if qr_token is None and getattr(settings, 'QR_TOKEN_REQUIRED', False):
+        raise CheckInError('Please scan the current QR code for this session.', 400)
+
+    if qr_token is not None and token and data.get('session_id') not in (None, '', qr_token.session_id):
+        raise CheckInError('QR code does not match the session.', 400)
+    return qr_token
+
+
+def read_queued_qr_token(data):
+    """
+    read_qr_token() for a scan replayed from the offline queue. Such a scan
+    is dated at the token's signed issue time, not at a time the client
+    supplies, so only the signature is checked here; the scan must still
+    fall inside the session's window at that time. With QR_TOKEN_REQUIRED
+    set, records without a token are rejected. As in read_qr_token(), a
+    `session_id` that does not unsign is treated as a plain session ID.
+    """
+    token = data.get('qr_token')
+    session_id = data.get('session_id')
+    if token:
+        qr_token = _unsign(str(token))
+    else:
+        qr_token = None
+        if isinstance(session_id, str) and QR_TOKEN_SEP in session_id:
+            try:
+                qr_token = _unsign(session_id)
+            except CheckInError:
+                pass
+    if qr_token is None:
+        if getattr(settings, 'QR_TOKEN_REQUIRED', False):
+            raise CheckInError('Please scan the current QR code for this session.', 400)
+        return None
+
+    if qr_token.issued_at > now() + SCAN_CLOCK_SKEW:
+        raise CheckInError('Invalid QR code.', 400)
+    # Issued after the attendance window had closed
+    if qr_token.issued_at > qr_token.expires_at:
+        raise CheckInError('QR code has expired. Attendance window closed.', 403)
+    if token and session_id not in (None, '', qr_token.session_id):
+        raise CheckInError('QR code does not match the session.', 400)
+    return qr_token
@@ -0,0 +1,126 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.utils.timezone import now
+
+from .models import Attendance, Session, SessionRoster, StudentCourseEnrollment
+
+ROSTER_CACHE_PREFIX = 'session_roster'
+# Rosters of closed sessions never change, so they can stay cached for a day
+ROSTER_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(session_pk):
+    return f"{ROSTER_CACHE_PREFIX}:{session_pk}"
+
+
+def _enrolled_student_ids(course_id):
+    return sorted(
+        StudentCourseEnrollment.objects
+        .filter(course_id=course_id)
+        .values_list('student_id', flat=True)
+    )
+
+
+def cache_roster(session_pk, student_ids):
+    roster = frozenset(student_ids)
+    cache.set(_cache_key(session_pk), roster, ROSTER_CACHE_TIMEOUT)
+    return roster
+
+
+async def acache_roster(session_pk, student_ids):
+    roster = frozenset(student_ids)
+    await cache.aset(_cache_key(session_pk), roster, ROSTER_CACHE_TIMEOUT)
+    return roster
+
+
+def snapshot_roster(session):
+    """Captures the current enrollment of the session's course and persists it."""
+    student_ids = _enrolled_student_ids(session.course_id)
+    SessionRoster.objects.update_or_create(session_id=session.pk, defaults={'student_ids': student_ids})
+    return cache_roster(session.pk, student_ids)
+
+
+def get_roster(session):
+    """
+    Returns the frozenset of student IDs on the session's roster, from the
+    cache, the persisted snapshot, or (for sessions created before rosters
+    existed) a snapshot taken now.
+    """
+    roster = cache.get(_cache_key(session.pk))
+    if roster is not None:
+        return roster
+
+    student_ids = (
+        SessionRoster.objects
+        .filter(session_id=session.pk)
+        .values_list('student_ids', flat=True)
+        .first()
+    )
+    if student_ids is None:
+        return snapshot_roster(session)
+    return cache_roster(session.pk, student_ids)
+
+
+def get_rosters(sessions):
+    """
+    Set-based variant of get_roster(): returns {session pk: frozenset} with at
+    most one query for all rosters missing from the cache.
+    """
+    sessions = {session.pk: session for session in sessions}
+    cached = cache.get_many([_cache_key(pk) for pk in sessions])
+    rosters = {pk: cached[_cache_key(pk)] for pk in sessions if _cache_key(pk) in cached}
+
+    missing = sessions.keys() - rosters.keys()
+    if missing:
+        stored = SessionRoster.objects.filter(session_id__in=missing).values_list('session_id', 'student_ids')
+        for session_pk, student_ids in stored:
+            rosters[session_pk] = cache_roster(session_pk, student_ids)
+        for session_pk in missing - rosters.keys():
+            rosters[session_pk] = snapshot_roster(sessions[session_pk])
+    return rosters
+
+
+async def aget_roster(session):
+    """Async variant of get_roster(); only the cache lookup is native async."""
+    roster = await cache.aget(_cache_key(session.pk))
+    if roster is not None:
+        return roster
+    return await sync_to_async(get_roster)(session)
+
+
+def open_sessions_for_course(course_id):
+    """Sessions of the course whose attendance window has not closed yet."""
+    return (
+        Session.objects
+        .filter(course_id=course_id)
+        .annotate(window_ends_at=ExpressionWrapper(
+            F('timestamp') + F('attendance_window'), output_field=DateTimeField()
+        ))
+        .filter(window_ends_at__gt=now())
+    )
+
+
+def refresh_open_rosters(course_id):
+    """
+    Re-snapshots the rosters of the course's open sessions after an enrollment
+    change, so students enrolled mid-window can still check in. Closed
+    sessions keep the roster they had when attendance was taken. Other
+    workers only see the change through a shared cache (CACHE_REDIS_URL).
+    """
+    session_pks = list(open_sessions_for_course(course_id).values_list('pk', flat=True))
+    if not session_pks:
+        return
+    student_ids = _enrolled_student_ids(course_id)
+    # update() rather than update_or_create(): the session may be mid cascade-delete
+    SessionRoster.objects.filter(session_id__in=session_pks).update(student_ids=student_ids, updated_at=now())
+    for session_pk in session_pks:
+        cache.delete(_cache_key(session_pk))
+
+
+def get_absent_student_ids(session):
+    """Roster minus the students marked present for the session."""
+    present = Attendance.objects.filter(
+        session_id=session.pk, status='Present'
+    ).values_list('student_id', flat=True)
+    return get_roster(session) - set(present)
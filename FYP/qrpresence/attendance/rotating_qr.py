@@ -0,0 +1,134 @@
+"""
+Rotating QR codes for the lecturer display.
+
+Time is cut into slots of QR_ROTATION_SECONDS. Each slot's frame encodes a
+signed QR token issued at the slot start and valid for two slots, so a
+photo forwarded to someone outside the room stops working within a
+rotation or two. Tokens are signed without a timestamp (see qr_tokens), so
+they are deterministic per (session, slot) and every worker renders the
+same frame. Frames are encoded in memory, bypassing the render store, and
+kept in the cache for their slot; nothing is written to disk or QRCode.
+
+Frames carry the image in the requested render mode (see qr_render): a
+data URI in `image`, or the module grid in `matrix` for client-side drawing.
+"""
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .qr_render import MODE_CONTENT_TYPES, encode_qr
+from .qr_tokens import QR_PAYLOAD_PREFIX, issue_qr_token
+
+QR_FRAME_CACHE_PREFIX = 'qr_frame'
+
+MIN_ROTATION_SECONDS = 10
+MAX_ROTATION_SECONDS = 30
+
+
+def rotation_period(requested=None):
+    """
+    The rotation period in seconds, clamped to the supported range. Raises
+    ValueError when `requested` is not an integer.
+    """
+    period = requested or getattr(settings, 'QR_ROTATION_SECONDS', 15)
+    return max(MIN_ROTATION_SECONDS, min(MAX_ROTATION_SECONDS, int(period)))
+
+
+def current_slot(period, at=None):
+    return int((at if at is not None else time.time()) // period)
+
+
+def _slot_start(slot, period):
+    return datetime.fromtimestamp(slot * period, tz=timezone.utc)
+
+
+def render_frame(session, slot, period, mode='png'):
+    """
+    Renders the frame for one slot, or returns None once the session's
+    attendance window has closed.
+    """
+    starts_at = _slot_start(slot, period)
+    window_ends_at = session.timestamp + session.attendance_window if session.attendance_window else None
+    if window_ends_at is not None and starts_at >= window_ends_at:
+        return None
+
+    token, qr_token = issue_qr_token(session, lifetime=timedelta(seconds=2 * period), issued_at=starts_at)
+    payload = f'{QR_PAYLOAD_PREFIX}{token}'
+    # Not through utils.render_qr: a slot's token is useless once the slot ends, so
+    # storing its render would only grow the render store
+    rendered = encode_qr(payload, mode)
+    frame = {
+        'session_id': session.session_id,
+        'slot': slot,
+        'qr_payload': payload,
+        'mode': mode,
+        'expires_at': qr_token.expires_at.isoformat(),
+        'rotates_at': _slot_start(slot + 1, period).isoformat(),
+    }
+    if mode == 'matrix':
+        frame['matrix'] = json.loads(rendered)
+    else:
+        frame['image'] = f'data:{MODE_CONTENT_TYPES[mode]};base64,' + base64.b64encode(rendered).decode('ascii')
+    return frame
+
+
+def frame_image(frame):
+    """The raw image bytes of a png or svg frame, decoded from its data URI."""
+    return base64.b64decode(frame['image'].split(',', 1)[1])
+
+
+def get_frame(session, slot, period, mode='png'):
+    """render_frame() through the cache, so each slot is rendered once per mode."""
+    key = f"{QR_FRAME_CACHE_PREFIX}:{session.session_id}:{period}:{mode}:{slot}"
+    frame = cache.get(key)
+    if frame is None:
+        frame = render_frame(session, slot, period, mode)
+        if frame is not None:
+            cache.set(key, frame, 2 * period)
+    return frame
+
+
+def seconds_until_slot(slot, period):
+    return max(0.0, slot * period - time.time())
+
+
+def wait_for_frame(session, period, after=None, timeout=None, mode='png'):
+    """
+    Long-poll: returns the current frame at once if it is newer than slot
+    `after`, otherwise waits for the next rotation (at most `timeout`
+    seconds) and returns that frame.
+    """
+    slot = current_slot(period)
+    if after is not None and slot <= after:
+        wait = seconds_until_slot(after + 1, period)
+        if timeout is not None and wait > timeout:
+            return get_frame(session, slot, period, mode)
+        time.sleep(wait)
+        slot = after + 1
+    return get_frame(session, slot, period, mode)
+
+
+def frame_events(session, period, max_duration, mode='png'):
+    """
+    Server-sent events for the lecturer display: a `frame` event at every
+    rotation, then `closed` when the attendance window ends or `timeout`
+    after max_duration seconds, at which point the client reconnects.
+    """
+    deadline = time.time() + max_duration
+    slot = current_slot(period)
+    while True:
+        frame = get_frame(session, slot, period, mode)
+        if frame is None:
+            yield 'event: closed\ndata: {}\n\n'
+            return
+        yield f'event: frame\nid: {slot}\ndata: {json.dumps(frame)}\n\n'
+
+        slot += 1
+        if slot * period > deadline:
+            yield 'event: timeout\ndata: {}\n\n'
+            return
+        time.sleep(seconds_until_slot(slot, period))
@@ -0,0 +1,180 @@
+"""
+Short-circuits repeated scans from the same student for the same session.
+
+Each (user, session_id) pair may scan SCAN_LIMIT_BURST times in every
+fixed window of SCAN_LIMIT_WINDOW_SECONDS. The window's count lives in the
+cache and is only changed with cache.add() and cache.incr(), which are
+atomic, so concurrent scans from one student cannot all pass the limit.
+Once a scan has been recorded, its response is kept for
+SCAN_LIMIT_RESULT_TTL seconds and replayed to repeats without running the
+check-in pipeline. A repeat that finds an empty bucket and no recorded
+result (e.g. the first scan was rejected or is still in flight) gets 429.
+
+The user is identified from the bearer token's signed claims, so a repeat
+is answered without touching the database. Requests without a valid bearer
+token are passed through untouched.
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from authentication.async_auth import AsyncJWTAuthentication
+
+from .checkin import CheckInError
+from .middleware import check_in_payload
+from .qr_tokens import read_qr_token
+
+SCAN_LIMIT_CACHE_PREFIX = 'scan_limit'
+
+THROTTLED_MESSAGE = 'Scan already received. Please wait a few seconds before scanning again.'
+
+
+class ScanLimiterMetrics:
+    """Counts of repeats answered by the limiter in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replayed = 0
+        self.throttled = 0
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {'replayed': self.replayed, 'throttled': self.throttled}
+
+    def reset(self):
+        with self._lock:
+            self.replayed = self.throttled = 0
+
+
+scan_limiter_metrics = ScanLimiterMetrics()
+
+
+def is_enabled():
+    return getattr(settings, 'SCAN_LIMIT_ENABLED', True)
+
+
+def _limits():
+    burst = getattr(settings, 'SCAN_LIMIT_BURST', 3)
+    window = getattr(settings, 'SCAN_LIMIT_WINDOW_SECONDS', 6)
+    return burst, window
+
+
+def _window_key(user_id, session_id, window):
+    return f"{SCAN_LIMIT_CACHE_PREFIX}:window:{user_id}:{session_id}:{int(time.time() // window)}"
+
+
+def _result_key(user_id, session_id):
+    return f"{SCAN_LIMIT_CACHE_PREFIX}:result:{user_id}:{session_id}"
+
+
+def _take_scan(user_id, session_id):
+    """Counts this scan in the current window. Returns whether it is allowed."""
+    burst, window = _limits()
+    key = _window_key(user_id, session_id, window)
+    cache.add(key, 0, window + 1)
+    try:
+        return cache.incr(key) <= burst
+    except ValueError:
+        # The window expired between add() and incr(); this is its first scan
+        return True
+
+
+async def _atake_scan(user_id, session_id):
+    burst, window = _limits()
+    key = _window_key(user_id, session_id, window)
+    await cache.aadd(key, 0, window + 1)
+    try:
+        return await cache.aincr(key) <= burst
+    except ValueError:
+        return True
+
+
+def check_repeat(user_id, session_id):
+    """
+    Returns (body, status) to answer this scan with without processing it,
+    or None if it should go through the check-in pipeline.
+    """
+    previous = cache.get(_result_key(user_id, session_id))
+    if previous is not None:
+        scan_limiter_metrics.increment('replayed')
+        return previous
+
+    if not _take_scan(user_id, session_id):
+        scan_limiter_metrics.increment('throttled')
+        return {'error': THROTTLED_MESSAGE}, 429
+    return None
+
+
+async def acheck_repeat(user_id, session_id):
+    previous = await cache.aget(_result_key(user_id, session_id))
+    if previous is not None:
+        scan_limiter_metrics.increment('replayed')
+        return previous
+
+    if not await _atake_scan(user_id, session_id):
+        scan_limiter_metrics.increment('throttled')
+        return {'error': THROTTLED_MESSAGE}, 429
+    return None
+
+
+def remember_result(user_id, session_id, body, status_code):
+    """Keeps a recorded check-in's response for replay to repeats."""
+    if body is not None and status_code in (200, 201):
+        cache.set(_result_key(user_id, session_id), (body, status_code), getattr(settings, 'SCAN_LIMIT_RESULT_TTL', 30))
+
+
+async def aremember_result(user_id, session_id, body, status_code):
+    if body is not None and status_code in (200, 201):
+        await cache.aset(
+            _result_key(user_id, session_id), (body, status_code), getattr(settings, 'SCAN_LIMIT_RESULT_TTL', 30)
+        )
+
+
+def _scan_session_id(request):
+    if request.content_type == 'application/json':
+        data = check_in_payload(request)
+        if data is None:
+            return None
+    else:
+        data = request.POST
+
+    try:
+        qr_token = read_qr_token(data)
+    except CheckInError:
+        # Left for the view to reject
+        return None
+    return qr_token.session_id if qr_token else data.get('session_id')
+
+
+def limit_repeat_scans(view):
+    """
+    Decorator for mark_attendance. Answers repeats from the limiter and
+    remembers recorded check-ins; everything else reaches the view as before.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not is_enabled() or request.method != 'POST':
+            return view(request, *args, **kwargs)
+
+        user_id = AsyncJWTAuthentication().get_token_user_id(request)
+        session_id = _scan_session_id(request) if user_id is not None else None
+        if not session_id:
+            return view(request, *args, **kwargs)
+
+        repeat = check_repeat(user_id, session_id)
+        if repeat is not None:
+            body, status_code = repeat
+            return JsonResponse(body, status=status_code)
+
+        response = view(request, *args, **kwargs)
+        remember_result(user_id, session_id, getattr(response, 'data', None), response.status_code)
+        return response
+    return wrapped
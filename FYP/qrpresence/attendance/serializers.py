@@ -5,10 +5,16 @@ from django.contrib.auth import get_user_model
 from authentication.serializers import UserSerializer
 from .models import Course, StudentCourseEnrollment
 from django.core.exceptions import ValidationError
-from .models import QRCode
+from .models import QRCode, Venue
 
 
 
+class VenueSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Venue
+        fields = ['id', 'name', 'polygon', 'updated_at']
+
+
 class SessionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Session
@@ -22,7 +28,8 @@ class SessionSerializer(serializers.ModelSerializer):
             'course',  # Using the actual field name from model
             'lecturer',
             'timestamp',
-            'attendance_window'
+            'attendance_window',
+            'venue',
         ]
         extra_kwargs = {
             'session_id': {'required': True},
@@ -32,7 +39,8 @@ class SessionSerializer(serializers.ModelSerializer):
             'course': {'required': True},
             'lecturer': {'read_only': True},  # Will be set in perform_create
             'timestamp': {'read_only': True},
-            'attendance_window': {'read_only': True}  # Uses default value
+            'attendance_window': {'read_only': True},  # Uses default value
+            'venue': {'required': False},
         }
 
     def validate(self, data):
@@ -109,6 +117,22 @@ class AttendanceMarkSerializer(serializers.Serializer):
         return data
     
 
+class BulkCheckInRecordSerializer(serializers.Serializer):
+    """One queued scan replayed through the bulk check-in endpoint."""
+    student_id = serializers.CharField(required=False)
+    session_id = serializers.CharField(required=False)
+    qr_token = serializers.CharField(required=False)
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
+    # Ignored when the record carries a signed QR token; its issue time is used
+    scanned_at = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('session_id') and not attrs.get('qr_token'):
+            raise serializers.ValidationError('Either session_id or qr_token is required.')
+        return attrs
+
+
 class SimpleUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = get_user_model()
@@ -0,0 +1,194 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, F, OuterRef, Subquery
+from django.utils.timezone import now
+
+from .models import Session, QRCode
+
+# Used when a session has no QR code row to take the expiry from
+DEFAULT_CHECKIN_WINDOW = timedelta(minutes=15)
+
+OPEN_SESSION_CACHE_PREFIX = 'open_session'
+CLOSED_SESSION_CACHE_PREFIX = 'closed_session'
+
+# How long a closed session's snapshot is remembered for CheckInGateMiddleware
+DEFAULT_CLOSED_SESSION_TTL = 300
+
+
+@dataclass(frozen=True)
+class OpenSession:
+    """
+    Snapshot of the Session metadata the check-in path needs. Attribute names
+    follow the Session model so it can be passed to is_qr_valid() directly.
+    """
+    pk: int
+    session_id: str
+    course_id: int
+    course_code: str
+    gps_latitude: float
+    gps_longitude: float
+    allowed_radius: int
+    timestamp: datetime
+    attendance_window: timedelta
+    has_qr: bool = False
+    qr_expires_at: datetime = None
+    venue_id: int = None
+    # The venue's updated_at, so workers know when their geofence copy is stale
+    venue_version: datetime = None
+
+    @property
+    def window_ends_at(self):
+        if self.attendance_window:
+            return self.timestamp + self.attendance_window
+        return None
+
+    @property
+    def closes_at(self):
+        """Earliest point after which no scan for this session can be accepted."""
+        if self.has_qr:
+            deadlines = [self.qr_expires_at, self.window_ends_at]
+        else:
+            deadlines = [self.timestamp + DEFAULT_CHECKIN_WINDOW, self.window_ends_at]
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
+
+
+def _cache_key(session_id):
+    return f"{OPEN_SESSION_CACHE_PREFIX}:{session_id}"
+
+
+def _closed_key(session_id):
+    return f"{CLOSED_SESSION_CACHE_PREFIX}:{session_id}"
+
+
+def with_qr_annotations(queryset):
+    """Annotates a Session queryset with the state of its latest QR code."""
+    latest_qr = QRCode.objects.filter(session=OuterRef('pk')).order_by('-created_at')
+    return queryset.annotate(
+        has_qr=Exists(latest_qr),
+        qr_expires_at=Subquery(latest_qr.values('expires_at')[:1]),
+    )
+
+
+def snapshot_queryset():
+    """Sessions with everything open_session_from_model() reads, in one query."""
+    return with_qr_annotations(Session.objects.select_related('course')).annotate(
+        venue_version=F('venue__updated_at')
+    )
+
+
+def open_session_from_model(session):
+    """Builds a snapshot from a Session loaded through snapshot_queryset()."""
+    return OpenSession(
+        pk=session.pk,
+        session_id=session.session_id,
+        course_id=session.course_id,
+        course_code=session.course.code,
+        gps_latitude=session.gps_latitude,
+        gps_longitude=session.gps_longitude,
+        allowed_radius=session.allowed_radius,
+        timestamp=session.timestamp,
+        attendance_window=session.attendance_window,
+        has_qr=session.has_qr,
+        qr_expires_at=session.qr_expires_at,
+        venue_id=session.venue_id,
+        venue_version=session.venue_version,
+    )
+
+
+def get_cached_open_session(session_id):
+    return cache.get(_cache_key(session_id))
+
+
+async def aget_cached_open_session(session_id):
+    return await cache.aget(_cache_key(session_id))
+
+
+def get_cached_closed_session(session_id):
+    """The snapshot of a recently loaded session whose window had closed, if any."""
+    return cache.get(_closed_key(session_id))
+
+
+async def aget_cached_closed_session(session_id):
+    return await cache.aget(_closed_key(session_id))
+
+
+def _closed_timeout():
+    return getattr(settings, 'CLOSED_SESSION_CACHE_TTL', DEFAULT_CLOSED_SESSION_TTL)
+
+
+def _cache_timeout(snapshot):
+    closes_at = snapshot.closes_at
+    if closes_at is None:
+        return 0
+    return math.ceil((closes_at - now()).total_seconds())
+
+
+def cache_open_session(snapshot):
+    """
+    Stores the snapshot until its attendance window closes. Sessions that are
+    already closed are not cached as open; they are remembered separately for
+    a few minutes so late scans can be turned away without a query.
+    """
+    ttl = _cache_timeout(snapshot)
+    if ttl > 0:
+        cache.set(_cache_key(snapshot.session_id), snapshot, ttl)
+    else:
+        cache.set(_closed_key(snapshot.session_id), snapshot, _closed_timeout())
+
+
+async def acache_open_session(snapshot):
+    ttl = _cache_timeout(snapshot)
+    if ttl > 0:
+        await cache.aset(_cache_key(snapshot.session_id), snapshot, ttl)
+    else:
+        await cache.aset(_closed_key(snapshot.session_id), snapshot, _closed_timeout())
+
+
+def get_open_session(session_id):
+    """
+    Returns the OpenSession for session_id, reading the database only on a
+    cache miss. Returns None if the session does not exist.
+    """
+    snapshot = get_cached_open_session(session_id)
+    if snapshot is not None:
+        return snapshot
+
+    session = (
+        snapshot_queryset()
+        .filter(session_id=session_id)
+        .first()
+    )
+    if session is None:
+        return None
+
+    snapshot = open_session_from_model(session)
+    cache_open_session(snapshot)
+    return snapshot
+
+
+def get_open_sessions(session_ids):
+    """
+    Set-based variant of get_open_session(): returns {session_id: OpenSession}
+    for the IDs that exist, with one query for all cache misses.
+    """
+    session_ids = set(session_ids)
+    cached = cache.get_many([_cache_key(session_id) for session_id in session_ids])
+    snapshots = {snapshot.session_id: snapshot for snapshot in cached.values()}
+
+    missing = session_ids - snapshots.keys()
+    if missing:
+        sessions = snapshot_queryset().filter(session_id__in=missing)
+        for session in sessions:
+            snapshot = open_session_from_model(session)
+            cache_open_session(snapshot)
+            snapshots[snapshot.session_id] = snapshot
+    return snapshots
+
+
+def invalidate_open_session(session_id):
+    cache.delete_many([_cache_key(session_id), _closed_key(session_id)])
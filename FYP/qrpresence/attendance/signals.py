@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import QRCode, Session, StudentCourseEnrollment, Venue
+from .roster import refresh_open_rosters, snapshot_roster
+from .session_cache import invalidate_open_session
+from .venues import forget_venue
+
+
+@receiver(pre_save, sender=Session)
+def remember_previous_session_state(sender, instance, **kwargs):
+    # Needed after the save to spot a renamed session or a changed course
+    instance._previous_state = None
+    if instance.pk is not None:
+        instance._previous_state = (
+            Session.objects.filter(pk=instance.pk).values('session_id', 'course_id').first()
+        )
+
+
+@receiver(post_save, sender=Session)
+def session_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if previous and previous['session_id'] != instance.session_id:
+        invalidate_open_session(previous['session_id'])
+    invalidate_open_session(instance.session_id)
+
+    # The roster is frozen when the session opens
+    if created or (previous and previous['course_id'] != instance.course_id):
+        snapshot_roster(instance)
+
+
+@receiver(post_delete, sender=Session)
+def session_deleted(sender, instance, **kwargs):
+    invalidate_open_session(instance.session_id)
+
+
+@receiver(post_save, sender=QRCode)
+@receiver(post_delete, sender=QRCode)
+def invalidate_session_cache_for_qr(sender, instance, **kwargs):
+    try:
+        session_id = instance.session.session_id
+    except Session.DoesNotExist:
+        return
+    invalidate_open_session(session_id)
+
+
+@receiver(post_save, sender=StudentCourseEnrollment)
+@receiver(post_delete, sender=StudentCourseEnrollment)
+def enrollment_changed(sender, instance, **kwargs):
+    refresh_open_rosters(instance.course_id)
+
+
+@receiver(post_save, sender=Venue)
+@receiver(pre_delete, sender=Venue)
+def venue_changed(sender, instance, **kwargs):
+    # Snapshots carry the venue version; deleting unlinks sessions without signals
+    forget_venue(instance.pk)
+    for session_id in Session.objects.filter(venue=instance).values_list('session_id', flat=True):
+        invalidate_open_session(session_id)
@@ -6,6 +6,23 @@ from rest_framework import status
 from .models import Attendance
 from django.contrib.auth.models import User
 from datetime import datetime
+import shutil
+import tempfile
+from django.test import override_settings
+
+
+def setUpModule():
+    # Keeps QR renders made by these tests out of the project's render store
+    global _render_dir, _render_settings
+    _render_dir = tempfile.mkdtemp(prefix='qr_render_cache')
+    _render_settings = override_settings(QR_RENDER_CACHE_DIR=_render_dir)
+    _render_settings.enable()
+
+
+def tearDownModule():
+    _render_settings.disable()
+    shutil.rmtree(_render_dir, ignore_errors=True)
+
 
 class AttendanceTests(TestCase):
 
@@ -234,3 +251,1348 @@ class AttendanceMarkSerializerTests(TestCase):
             serializer.is_valid(raise_exception=True)
         self.assertIn('session_id', context.exception.detail)
         self.assertTrue('location data is not configured' in str(context.exception.detail['session_id'][0]).lower())
+
+
+from django.core.cache import cache
+from rest_framework.test import APIClient
+from .models import Course, Student, StudentCourseEnrollment
+
+
+class CheckInFixtureMixin:
+    """
+    A lecturer, a course with one open session and an enrolled student
+    authenticated against the API client.
+    """
+
+    def setUp(self):
+        # Session snapshots, rosters and scan-limiter state are cache-backed
+        cache.clear()
+        self.lecturer_user = User.objects.create_user(
+            username='checkin_lecturer', password='password', email='lecturer@example.com', role='lecturer'
+        )
+        self.lecturer = Lecturer.objects.create(user=self.lecturer_user, name='Dr. Check-in')
+        self.course = Course.objects.create(
+            title='Distributed Systems', code='CSC4001', description='', credit_hours=3,
+            created_by=self.lecturer_user
+        )
+        self.session = Session.objects.create(
+            session_id='checkin_session_1',
+            class_name='Distributed Systems',
+            lecturer=self.lecturer,
+            course=self.course,
+            gps_latitude=10.0,
+            gps_longitude=20.0,
+            allowed_radius=100
+        )
+        self.student_user = User.objects.create_user(
+            username='checkin_student', password='password', email='student@example.com', role='student'
+        )
+        self.student = Student.objects.create(
+            student_id='S1001', user=self.student_user, name='Test Student', program='CS'
+        )
+        StudentCourseEnrollment.objects.create(
+            student=self.student, course=self.course, enrolled_by=self.lecturer_user
+        )
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student_user)
+        self.url = reverse('mark_attendance')
+        self.payload = {'session_id': self.session.session_id, 'latitude': 10.0001, 'longitude': 20.0001}
+
+
+class CheckInTestCase(CheckInFixtureMixin, TestCase):
+    pass
+
+
+class MarkAttendanceCheckInTests(CheckInTestCase):
+    # One annotated read for the check-in context, the insert and its keyed read-back
+    CHECK_IN_QUERY_BUDGET = 3
+
+    def test_check_in_stays_within_query_budget(self):
+        with self.assertNumQueries(self.CHECK_IN_QUERY_BUDGET):
+            response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Attendance.objects.filter(student=self.student, session=self.session).exists())
+
+    def test_repeat_check_in_is_a_single_query(self):
+        self.client.post(self.url, self.payload, format='json')
+        with self.assertNumQueries(1):
+            response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Attendance.objects.filter(student=self.student, session=self.session).count(), 1)
+
+    def test_unenrolled_student_is_rejected(self):
+        StudentCourseEnrollment.objects.all().delete()
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_unknown_session_returns_404(self):
+        response = self.client.post(self.url, dict(self.payload, session_id='missing'), format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from .models import QRCode
+from .session_cache import get_cached_open_session, get_open_session
+
+
+class OpenSessionCacheTests(CheckInTestCase):
+
+    def test_warm_cache_skips_session_query(self):
+        get_open_session(self.session.session_id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(any('"attendance_session"."gps_latitude"' in q['sql'] for q in queries))
+
+    def test_session_update_invalidates_cache(self):
+        get_open_session(self.session.session_id)
+        self.session.allowed_radius = 10
+        self.session.save()
+        self.assertIsNone(get_cached_open_session(self.session.session_id))
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_new_qr_code_invalidates_cache(self):
+        get_open_session(self.session.session_id)
+        QRCode.objects.create(
+            session=self.session, qr_image='qr_codes/expired.png',
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_closed_session_is_not_cached(self):
+        Session.objects.filter(pk=self.session.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        self.session.refresh_from_db()
+        snapshot = get_open_session(self.session.session_id)
+        self.assertEqual(snapshot.pk, self.session.pk)
+        self.assertIsNone(get_cached_open_session(self.session.session_id))
+
+
+from .models import SessionRoster
+from .roster import get_absent_student_ids, get_roster
+
+
+class SessionRosterTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            username='roster_student', password='password', email='roster@example.com', role='student'
+        )
+        self.other_student = Student.objects.create(
+            student_id='S1002', user=self.other_user, name='Other Student', program='CS'
+        )
+
+    def enroll(self, student):
+        StudentCourseEnrollment.objects.create(
+            student=student, course=self.course, enrolled_by=self.lecturer_user
+        )
+
+    def test_roster_is_persisted_when_session_opens(self):
+        roster = SessionRoster.objects.get(session=self.session)
+        self.assertEqual(roster.student_ids, ['S1001'])
+
+    def test_enrollment_during_open_window_updates_roster(self):
+        self.enroll(self.other_student)
+        self.assertEqual(get_roster(self.session), {'S1001', 'S1002'})
+
+        client = APIClient()
+        client.force_authenticate(user=self.other_user)
+        response = client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_roster_of_closed_session_stays_frozen(self):
+        Session.objects.filter(pk=self.session.pk).update(timestamp=timezone.now() - timedelta(hours=1))
+        self.enroll(self.other_student)
+        self.assertEqual(get_roster(self.session), {'S1001'})
+
+    def test_absentees_are_roster_minus_check_ins(self):
+        self.enroll(self.other_student)
+        self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(get_absent_student_ids(self.session), {'S1002'})
+
+        lecturer_client = APIClient()
+        lecturer_client.force_authenticate(user=self.lecturer_user)
+        response = lecturer_client.get(reverse('absent-students', args=[self.session.session_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([s['student_id'] for s in response.data], ['S1002'])
+
+
+import threading
+from django.test import TransactionTestCase
+from .checkin import insert_attendance_once
+
+
+class ConcurrentCheckInTests(CheckInFixtureMixin, TransactionTestCase):
+    SCANS = 8
+
+    def test_duplicate_insert_returns_existing_row(self):
+        first, created = insert_attendance_once(self.student.pk, self.session.pk, 10.0, 20.0)
+        self.assertTrue(created)
+        second, created = insert_attendance_once(self.student.pk, self.session.pk, 10.5, 20.5)
+        self.assertFalse(created)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.latitude, 10.0)
+
+    def test_concurrent_duplicate_scans_create_one_row(self):
+        barrier = threading.Barrier(self.SCANS)
+        responses = []
+        errors = []
+
+        def scan():
+            client = APIClient()
+            client.force_authenticate(user=self.student_user)
+            try:
+                barrier.wait()
+                responses.append(client.post(self.url, self.payload, format='json').status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=scan) for _ in range(self.SCANS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(responses), self.SCANS)
+        self.assertNotIn(status.HTTP_500_INTERNAL_SERVER_ERROR, responses)
+        self.assertEqual(responses.count(status.HTTP_201_CREATED), 1)
+        self.assertEqual(Attendance.objects.filter(student=self.student, session=self.session).count(), 1)
+
+
+from unittest import mock
+
+from django.test import override_settings
+
+from .qr_tokens import issue_qr_token
+
+
+class BulkCheckInTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.bulk_url = reverse('mark_attendance_bulk')
+        # The upload arrives an hour after the lecture, long after the window closed
+        self.started = timezone.now() - timedelta(hours=1)
+        Session.objects.filter(pk=self.session.pk).update(timestamp=self.started)
+
+    def record(self, minutes_after_start, **overrides):
+        record = dict(self.payload, scanned_at=(self.started + timedelta(minutes=minutes_after_start)).isoformat())
+        record.update(overrides)
+        return record
+
+    def test_late_upload_is_validated_at_scan_time(self):
+        response = self.client.post(self.bulk_url, {'records': [self.record(5)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['status'], 'created')
+        attendance = Attendance.objects.get(student=self.student, session=self.session)
+        self.assertEqual(attendance.check_in_time, self.started + timedelta(minutes=5))
+
+    def test_each_record_gets_its_own_result(self):
+        records = [
+            self.record(5),
+            self.record(6),
+            self.record(30),
+            self.record(5, session_id='missing'),
+            self.record(5, student_id='S9999'),
+            {'session_id': self.session.session_id},
+        ]
+        response = self.client.post(self.bulk_url, {'records': records}, format='json')
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], [
+            'created', 'already_marked', 'rejected', 'rejected', 'rejected', 'rejected'
+        ])
+        self.assertEqual([r['status_code'] for r in results], [201, 200, 400, 404, 403, 400])
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        other_session = Session.objects.create(
+            session_id='checkin_session_2', class_name='Distributed Systems', lecturer=self.lecturer,
+            course=self.course, gps_latitude=10.0, gps_longitude=20.0, allowed_radius=100
+        )
+        records = [self.record(5)] * 20 + [dict(self.payload, session_id=other_session.session_id)] * 20
+        # Student, sessions, rosters, existing attendance, the bulk insert and its re-read
+        with self.assertNumQueries(6):
+            response = self.client.post(self.bulk_url, {'records': records}, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['already_marked'], 38)
+
+    def test_dotted_plain_session_id_is_not_read_as_a_token(self):
+        Session.objects.create(
+            session_id='CS101.A', class_name='Distributed Systems', lecturer=self.lecturer,
+            course=self.course, gps_latitude=10.0, gps_longitude=20.0, allowed_radius=100
+        )
+        Session.objects.filter(session_id='CS101.A').update(timestamp=self.started)
+        response = self.client.post(
+            self.bulk_url, {'records': [self.record(5, session_id='CS101.A')]}, format='json'
+        )
+        self.assertEqual(response.data['results'][0]['status'], 'created')
+
+    def test_rows_dropped_by_a_concurrent_scan_are_duplicates(self):
+        real_bulk_create = Attendance.objects.bulk_create
+
+        def live_scan_first(objs, **kwargs):
+            # A live scan lands between the existing-rows query and the insert
+            Attendance.objects.create(student=self.student, session=self.session)
+            return real_bulk_create(objs, **kwargs)
+
+        with mock.patch.object(Attendance.objects, 'bulk_create', side_effect=live_scan_first):
+            response = self.client.post(self.bulk_url, {'records': [self.record(5)]}, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'duplicate')
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['duplicate'], 1)
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+
+    @override_settings(CAMPUS_NETWORK_REQUIRED=True, CAMPUS_NETWORKS=['10.0.0.0/8'])
+    def test_off_campus_uploads_are_gated(self):
+        response = self.client.post(
+            self.bulk_url, {'records': [self.record(5)]}, format='json', REMOTE_ADDR='203.0.113.7'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Attendance.objects.filter(student=self.student).exists())
+
+        response = self.client.post(
+            self.bulk_url, {'records': [self.record(5)]}, format='json', REMOTE_ADDR='10.1.2.3'
+        )
+        self.assertEqual(response.data['created'], 1)
+
+    @override_settings(QR_TOKEN_REQUIRED=True)
+    def test_required_tokens_date_the_scan(self):
+        self.session.refresh_from_db()
+        on_time, _ = issue_qr_token(self.session, issued_at=self.started + timedelta(minutes=5))
+        too_late, _ = issue_qr_token(self.session, issued_at=self.started + timedelta(minutes=30))
+        records = [
+            # A plain session_id with a backdated scanned_at no longer gets through
+            self.record(5),
+            self.record(5, qr_token=too_late),
+            self.record(30, qr_token=on_time),
+        ]
+        response = self.client.post(self.bulk_url, {'records': records}, format='json')
+        results = response.data['results']
+        self.assertEqual([r['status_code'] for r in results], [400, 403, 201])
+        attendance = Attendance.objects.get(student=self.student, session=self.session)
+        self.assertEqual(attendance.check_in_time, self.started.replace(microsecond=0) + timedelta(minutes=5))
+
+
+from django.test import AsyncClient, modify_settings, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class AsyncCheckInTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.async_url = reverse('mark_attendance_async')
+        token = RefreshToken.for_user(self.student_user).access_token
+        self.auth_headers = {'Authorization': f'Bearer {token}'}
+        self.async_client = AsyncClient()
+
+    async def test_async_check_in_marks_attendance_once(self):
+        response = await self.async_client.post(
+            self.async_url, self.payload, content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['course'], self.course.code)
+
+        # The repeat is answered by the scan limiter with the recorded result
+        repeat = await self.async_client.post(
+            self.async_url, self.payload, content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(repeat.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeat.json(), response.json())
+        self.assertEqual(await Attendance.objects.filter(student_id=self.student.pk).acount(), 1)
+
+    @override_settings(SCAN_LIMIT_ENABLED=False)
+    async def test_async_repeat_without_limiter_is_already_marked(self):
+        for expected in (status.HTTP_201_CREATED, status.HTTP_200_OK):
+            response = await self.async_client.post(
+                self.async_url, self.payload, content_type='application/json', headers=self.auth_headers
+            )
+            self.assertEqual(response.status_code, expected)
+
+    async def test_async_check_in_requires_a_token(self):
+        response = await AsyncClient().post(self.async_url, self.payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_check_in_applies_the_same_rules(self):
+        payload = dict(self.payload, latitude=10.01, longitude=20.01)
+        response = await self.async_client.post(
+            self.async_url, payload, content_type='application/json', headers=self.auth_headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+import json
+import os
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.utils.timezone import now
+
+from . import write_behind
+
+
+class WriteBehindCheckInTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        journal = tempfile.TemporaryDirectory()
+        self.addCleanup(journal.cleanup)
+        self.journal_dir = Path(journal.name)
+        # Interval 0: no background flusher, segments are loaded explicitly
+        settings_override = override_settings(
+            ATTENDANCE_WRITE_BEHIND=True,
+            ATTENDANCE_WRITE_BEHIND_DIR=self.journal_dir,
+            ATTENDANCE_WRITE_BEHIND_INTERVAL_MS=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_check_in_is_journaled_until_flushed(self):
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Attendance.objects.filter(student=self.student).exists())
+
+        # The read-through still sees the unflushed check-in
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(write_behind.get_buffer().flush(), 1)
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+        self.assertFalse(write_behind.is_pending(self.student.pk, self.session.pk))
+        self.assertEqual(list(self.journal_dir.iterdir()), [])
+
+    def test_check_in_appended_during_flush_stays_pending(self):
+        buffer = write_behind.get_buffer()
+        buffer.append(self.student.pk, self.session.pk, 10.0001, 20.0001, now())
+        real_rename = Path.rename
+
+        def append_while_sealing(path, target):
+            result = real_rename(path, target)
+            if str(target).endswith('.sealed') and not buffer.is_pending(self.student.pk, -1):
+                buffer.append(self.student.pk, -1, 10.0001, 20.0001, now())
+            return result
+
+        with mock.patch.object(Path, 'rename', autospec=True, side_effect=append_while_sealing):
+            buffer.flush()
+        self.assertTrue(buffer.is_pending(self.student.pk, -1))
+        self.assertFalse(buffer.is_pending(self.student.pk, self.session.pk))
+        buffer.seal()
+
+    def test_flush_command_loads_orphaned_segment(self):
+        segment = self.journal_dir / 'gone-host-1-1.active'
+        segment.write_text(json.dumps({
+            'student_id': self.student.pk,
+            'session_pk': self.session.pk,
+            'latitude': 10.0001,
+            'longitude': 20.0001,
+            'check_in_time': now().isoformat(),
+        }) + '\n{"torn')
+
+        call_command('flush_checkins', force=True, stdout=StringIO())
+        self.assertEqual(Attendance.objects.filter(student=self.student).count(), 1)
+        self.assertEqual(list(self.journal_dir.iterdir()), [])
+
+
+from .benchmark import Sample, build_scans, seed_benchmark_data, summarise
+
+
+class BenchmarkHarnessTests(TestCase):
+
+    def test_seeded_students_can_check_in(self):
+        sessions = seed_benchmark_data('t', courses=2, students=4, courses_per_student=1)
+        scans = build_scans('t')
+        self.assertEqual(len(sessions), 2)
+        self.assertEqual(len(scans), 4)
+
+        client = APIClient()
+        response = client.post(
+            reverse('mark_attendance'), scans[0].payload, format='json',
+            HTTP_AUTHORIZATION=f'Bearer {scans[0].token}'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_summarise_reports_percentiles(self):
+        samples = [Sample(latency=i / 1000, status=201, queries=2) for i in range(1, 101)]
+        summary = summarise(samples, elapsed=2.0)
+        self.assertEqual(summary['latency_ms']['p50'], 50)
+        self.assertEqual(summary['latency_ms']['p99'], 99)
+        self.assertEqual(summary['throughput_rps'], 50)
+        self.assertEqual(summary['queries_per_request'], 2)
+        self.assertEqual(summary['statuses'], {'201': 100})
+
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import QueryMetricsMiddleware, request_metrics
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_HEADERS=True)
+class QueryMetricsMiddlewareTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+        self.addCleanup(request_metrics.reset)
+
+    def test_records_queries_per_view(self):
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('X-DB-Time-Ms', response)
+
+        [row] = request_metrics.snapshot()
+        self.assertEqual(row['view'], 'mark_attendance')
+        self.assertEqual(row['requests'], 1)
+        self.assertEqual(row['avg_queries'], int(response['X-Query-Count']))
+
+    @override_settings(DEBUG=True)
+    async def test_counts_async_queries_without_adaptation(self):
+        token = await sync_to_async(lambda: str(RefreshToken.for_user(self.student_user).access_token))()
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('start')
+            response = await AsyncClient().post(
+                reverse('mark_attendance_async'), self.payload, content_type='application/json',
+                headers={'Authorization': f'Bearer {token}'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertFalse([line for line in logs.output if 'QueryMetricsMiddleware' in line])
+
+    def test_metrics_endpoint_is_admin_only(self):
+        url = reverse('request-metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = User.objects.create_user(
+            username='metrics_admin', email='metrics@example.com', role='admin', is_staff=True
+        )
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['views'][0]['view'], 'request-metrics')
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryMetricsMiddleware(lambda request: None)
+
+
+from .scan_limiter import scan_limiter_metrics
+
+
+class ScanLimiterTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        token = RefreshToken.for_user(self.student_user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        scan_limiter_metrics.reset()
+        self.addCleanup(scan_limiter_metrics.reset)
+
+    def test_repeat_replays_recorded_result_without_queries(self):
+        first = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(0):
+            repeat = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(repeat.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(repeat.json(), first.data)
+        self.assertEqual(scan_limiter_metrics.snapshot()['replayed'], 1)
+
+    @override_settings(SCAN_LIMIT_BURST=2, SCAN_LIMIT_WINDOW_SECONDS=60)
+    # Out-of-range scans would otherwise be turned away by the gate first
+    @modify_settings(MIDDLEWARE={'remove': 'attendance.middleware.CheckInGateMiddleware'})
+    def test_rejected_scans_are_throttled_after_burst(self):
+        too_far = dict(self.payload, latitude=10.01, longitude=20.01)
+        with mock.patch('attendance.scan_limiter.time.time', return_value=6000.0):
+            for _ in range(2):
+                self.assertEqual(self.client.post(self.url, too_far, format='json').status_code, 400)
+
+            with self.assertNumQueries(0):
+                response = self.client.post(self.url, too_far, format='json')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(scan_limiter_metrics.snapshot()['throttled'], 1)
+
+        # The next window starts with a fresh count
+        with mock.patch('attendance.scan_limiter.time.time', return_value=6060.0):
+            self.assertEqual(self.client.post(self.url, too_far, format='json').status_code, 400)
+
+    def test_requests_without_bearer_token_pass_through(self):
+        client = APIClient()
+        client.force_authenticate(user=self.student_user)
+        for expected in (status.HTTP_201_CREATED, status.HTTP_200_OK):
+            self.assertEqual(client.post(self.url, self.payload, format='json').status_code, expected)
+
+
+import re
+
+from django.conf import settings
+
+from .qr_tokens import QR_PAYLOAD_PREFIX, issue_qr_token
+
+
+class SignedQRTokenTests(CheckInTestCase):
+
+    def test_token_scan_needs_no_qr_code_row(self):
+        token, _ = issue_qr_token(self.session)
+        response = self.client.post(
+            self.url, {'qr_token': token, 'latitude': 10.0001, 'longitude': 20.0001}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(QRCode.objects.filter(session=self.session).exists())
+
+    def test_legacy_scanner_can_send_token_as_session_id(self):
+        token, _ = issue_qr_token(self.session)
+        response = self.client.post(self.url, dict(self.payload, session_id=token), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_forged_and_expired_tokens_are_rejected_without_queries(self):
+        token, _ = issue_qr_token(self.session)
+        forged = token[:-1] + ('A' if token[-1] != 'A' else 'B')
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, dict(self.payload, qr_token=forged), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        expired, _ = issue_qr_token(self.session, issued_at=now() - timedelta(hours=1))
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, dict(self.payload, qr_token=expired), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_issued_payload_passes_the_scanner_checks(self):
+        frontend = Path(settings.BASE_DIR).parent / 'qrpresence-frontend' / 'src'
+        if not frontend.exists():
+            self.skipTest('frontend sources not available')
+        scanner = (frontend / 'components' / 'QRScanner.tsx').read_text()
+        config = (frontend / 'utils' / 'config.ts').read_text()
+        session_pattern = re.search(r"if \(!/(.+?)/\.test\(sessionId\)\)", scanner).group(1)
+        payload_pattern = re.search(r"QR_CODE_PATTERN = /(.+?)/;", config).group(1)
+
+        token, _ = issue_qr_token(self.session)
+        payload = f'{QR_PAYLOAD_PREFIX}{token}'
+        # What QRScanner.handleAttendanceMarking does before posting the scan
+        parts = payload.split(':')
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[0], 'attendance')
+        self.assertRegex(parts[1], session_pattern)
+        self.assertRegex(payload, payload_pattern)
+
+    def test_tokens_are_deterministic(self):
+        issued_at = now()
+        self.assertEqual(
+            issue_qr_token(self.session, issued_at=issued_at)[0],
+            issue_qr_token(self.session, issued_at=issued_at)[0],
+        )
+
+    @override_settings(QR_TOKEN_REQUIRED=True)
+    def test_plain_session_id_rejected_when_tokens_required(self):
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lecturer_issues_token_for_own_session(self):
+        url = reverse('issue_qr_token')
+        self.assertEqual(
+            self.client.post(url, {'session_id': self.session.session_id}, format='json').status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+
+        self.client.force_authenticate(user=self.lecturer_user)
+        response = self.client.post(url, {'session_id': self.session.session_id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['qr_payload'].startswith('attendance:'))
+
+
+from unittest import mock
+
+from . import rotating_qr
+
+
+class RotatingQRTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lecturer_client = APIClient()
+        self.lecturer_client.force_authenticate(user=self.lecturer_user)
+        self.frame_url = reverse('rotating_qr_frame', args=[self.session.session_id])
+
+    def test_frame_is_rendered_once_per_slot_and_scannable(self):
+        render_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(QR_RENDER_CACHE_DIR=render_dir), \
+                mock.patch.object(rotating_qr, 'encode_qr', wraps=rotating_qr.encode_qr) as render:
+            first = self.lecturer_client.get(self.frame_url)
+            second = self.lecturer_client.get(self.frame_url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertTrue(first.data['image'].startswith('data:image/png;base64,'))
+        if first.data['slot'] == second.data['slot']:
+            self.assertEqual(render.call_count, 1)
+        self.assertFalse(QRCode.objects.exists())
+        # Frames never reach the render store
+        self.assertEqual(os.listdir(render_dir), [])
+
+        scanned = first.data['qr_payload'].split('attendance:', 1)[1]
+        response = self.client.post(self.url, dict(self.payload, session_id=scanned), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_students_cannot_fetch_frames(self):
+        self.assertEqual(self.client.get(self.frame_url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_closed_session_has_no_frame(self):
+        Session.objects.filter(pk=self.session.pk).update(timestamp=now() - timedelta(hours=1))
+        self.assertEqual(self.lecturer_client.get(self.frame_url).status_code, status.HTTP_410_GONE)
+
+    def test_malformed_period_is_rejected(self):
+        stream_url = reverse('rotating_qr_stream', args=[self.session.session_id])
+        for url in (self.frame_url, stream_url):
+            for period in ('abc', '12.5'):
+                response = self.lecturer_client.get(url, {'period': period}, HTTP_ACCEPT='application/json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(response.json()['error'], 'period must be an integer number of seconds')
+
+    def test_stream_sends_frame_events(self):
+        response = self.lecturer_client.get(
+            reverse('rotating_qr_stream', args=[self.session.session_id]), HTTP_ACCEPT='text/event-stream'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        first_event = next(iter(response.streaming_content)).decode()
+        self.assertTrue(first_event.startswith('event: frame\n'))
+        response.close()
+
+
+from .qr_render import encode_qr
+from .utils import generate_qr_code, qr_render_key, render_qr, render_qr_png
+
+
+class QRRenderCacheTests(TestCase):
+
+    def setUp(self):
+        render_qr.cache_clear()
+        self.addCleanup(render_qr.cache_clear)
+        render_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(render_dir.cleanup)
+        self.render_dir = Path(render_dir.name)
+        settings_override = override_settings(QR_RENDER_CACHE_DIR=self.render_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_repeat_render_is_served_from_memory(self):
+        with mock.patch('attendance.utils.encode_qr', wraps=encode_qr) as encode:
+            first = generate_qr_code('attendance:cache-test').read()
+            second = generate_qr_code('attendance:cache-test').read()
+        self.assertEqual(first, second)
+        self.assertEqual(encode.call_count, 1)
+        self.assertEqual(render_qr.cache_info().hits, 1)
+
+    def test_render_is_stored_by_content_hash(self):
+        png = render_qr_png('attendance:disk-test')
+        key = qr_render_key('attendance:disk-test')
+        self.assertEqual((self.render_dir / key[:2] / f'{key}.png').read_bytes(), png)
+
+        # A new process (empty LRU) reads the stored file instead of re-encoding
+        render_qr.cache_clear()
+        with mock.patch('attendance.utils.encode_qr') as encode:
+            self.assertEqual(render_qr_png('attendance:disk-test'), png)
+        encode.assert_not_called()
+
+    def test_render_options_change_the_key(self):
+        self.assertNotEqual(qr_render_key('x'), qr_render_key('x', box_size=5))
+
+
+from .qr_pregeneration import pregenerate_qr_codes
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QRPregenerationTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for n in range(2, 4):
+            Session.objects.create(
+                session_id=f'checkin_session_{n}', class_name='Distributed Systems', lecturer=self.lecturer,
+                course=self.course, gps_latitude=10.0, gps_longitude=20.0, allowed_radius=100
+            )
+
+    def test_command_creates_one_qr_per_session_without_one(self):
+        QRCode.objects.create(session=self.session, qr_image='qr_codes/existing.png')
+        out = StringIO()
+        call_command('pregenerate_qr_codes', course=self.course.code, workers=1, stdout=out)
+
+        self.assertIn('Created 2 QR code(s)', out.getvalue())
+        self.assertEqual(QRCode.objects.count(), 3)
+        qr = QRCode.objects.get(session__session_id='checkin_session_2')
+        self.assertTrue(qr.qr_image.storage.exists(qr.qr_image.name))
+        self.assertIsNotNone(qr.expires_at)
+
+    def test_renders_in_a_process_pool(self):
+        with mock.patch('attendance.qr_pregeneration.POOL_MIN_SESSIONS', 1):
+            created = pregenerate_qr_codes(Session.objects.filter(course=self.course), workers=2)
+        self.assertEqual(created, 3)
+
+
+class QRCodeListingTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        other_user = User.objects.create_user(
+            username='other_lecturer', password='password', email='other@example.com', role='lecturer'
+        )
+        other_session = Session.objects.create(
+            session_id='other_session', class_name='Compilers',
+            lecturer=Lecturer.objects.create(user=other_user, name='Dr. Other'), course=self.course,
+            gps_latitude=10.0, gps_longitude=20.0
+        )
+        self.own = [QRCode.objects.create(session=self.session, qr_image=f'qr_codes/own{n}.png') for n in range(3)]
+        self.missing = QRCode.objects.create(session=self.session, qr_image='qr_codes/gone.png', file_present=False)
+        QRCode.objects.create(session=other_session, qr_image='qr_codes/other.png')
+        self.client.force_authenticate(user=self.lecturer_user)
+        self.url = reverse('get_qr_codes')
+
+    def test_lists_own_codes_with_files_without_touching_storage(self):
+        with mock.patch('os.path.exists') as exists, self.assertNumQueries(1):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        exists.assert_not_called()
+        ids = [item['id'] for item in response.data['qr_codes']]
+        self.assertEqual(sorted(ids), sorted(qr.id for qr in self.own))
+        self.assertEqual(response.data['qr_codes'][0]['filename'], 'own2.png')
+
+    def test_cursor_pagination(self):
+        response = self.client.get(self.url, {'page_size': 2})
+        self.assertEqual(len(response.data['qr_codes']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['qr_codes']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_students_cannot_list(self):
+        self.client.force_authenticate(user=self.student_user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_download_of_missing_file_hides_it_from_listing(self):
+        response = self.client.get(reverse('download_qr_code', args=[self.own[0].id]))
+        self.assertEqual(response.status_code, 404)
+        self.own[0].refresh_from_db()
+        self.assertFalse(self.own[0].file_present)
+
+
+from django.core.files.base import ContentFile
+from .file_serving import content_addressed_name
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QRDownloadTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.lecturer_user)
+
+    def _qr(self, name, content=b'png-bytes'):
+        qr = QRCode(session=self.session)
+        qr.qr_image.save(name, ContentFile(content))
+        return qr
+
+    def test_revalidation_returns_304(self):
+        url = reverse('download_qr_code', args=[self._qr('plain.png').id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'png-bytes')
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_content_addressed_names_are_immutable(self):
+        qr = self._qr(content_addressed_name('hashed.png', b'png-bytes'))
+        response = self.client.get(reverse('download_qr_code', args=[qr.id]))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    @override_settings(FILE_SERVING_MODE='x-accel-redirect')
+    def test_x_accel_redirect(self):
+        qr = self._qr('offloaded.png')
+        response = self.client.get(reverse('download_qr_code', args=[qr.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{qr.qr_image.name}')
+        self.assertEqual(response.content, b'')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+
+import base64
+from django.core.files.uploadedfile import SimpleUploadedFile
+from .uploads import UploadError, decode_data_uri
+from .utils import render_qr_png
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class QRUploadTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.lecturer_user)
+        self.url = reverse('generate_and_save_qr')
+        self.png = render_qr_png('attendance:checkin_session_1')
+
+    def test_multipart_upload(self):
+        response = self.client.post(self.url, {
+            'session_id': self.session.session_id,
+            'qr_image': SimpleUploadedFile('qr.png', self.png, content_type='image/png'),
+        }, format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        qr = QRCode.objects.get(session=self.session)
+        self.assertTrue(qr.qr_image.name.endswith('.png'))
+        with qr.qr_image.open('rb') as f:
+            self.assertEqual(f.read(), self.png)
+
+    def test_base64_upload_still_accepted(self):
+        data_uri = 'data:image/png;base64,' + base64.b64encode(self.png).decode()
+        response = self.client.post(self.url, {'session_id': self.session.session_id, 'qr_image': data_uri}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_rejects_non_images(self):
+        response = self.client.post(self.url, {
+            'session_id': self.session.session_id,
+            'qr_image': SimpleUploadedFile('qr.png', b'<script>', content_type='image/png'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(QRCode.objects.exists())
+
+    def test_decoder_is_size_capped_and_chunk_safe(self):
+        encoded = base64.b64encode(self.png).decode()
+        # Whitespace that shifts the 4-character groups across decode chunks
+        spaced = '\n'.join(encoded[i:i + 7] for i in range(0, len(encoded), 7))
+        with mock.patch('attendance.uploads.DECODE_CHUNK_CHARS', 8):
+            f, ext = decode_data_uri('data:image/png;base64,' + spaced)
+        self.assertEqual((f.read(), ext), (self.png, 'png'))
+
+        with self.assertRaises(UploadError) as cm:
+            decode_data_uri('data:image/png;base64,' + encoded, max_bytes=len(self.png) // 2)
+        self.assertEqual(cm.exception.status_code, 413)
+        with self.assertRaises(UploadError):
+            decode_data_uri('data:image/png;base64,' + encoded[:-1] + '!')
+
+
+from .qr_sweeper import prune_render_cache, sweep_qr_storage
+
+
+class QRSweeperTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        media = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+
+    def _qr(self, name, **fields):
+        qr = QRCode(session=self.session, **fields)
+        qr.qr_image.save(name, ContentFile(b'x' * 100))
+        return qr
+
+    def test_deletes_orphaned_and_expired_files_only(self):
+        live = self._qr('live.png')
+        expired = self._qr('expired.png', expires_at=timezone.now() - timedelta(days=2))
+        orphan = self._qr('orphan.png')
+        QRCode.objects.filter(pk=orphan.pk).delete()
+        storage = live.qr_image.storage
+
+        with self.assertNumQueries(1):
+            result = sweep_qr_storage(min_age=timedelta(0), dry_run=True)
+        self.assertEqual((result.orphaned, result.expired, result.bytes_reclaimed), (1, 1, 200))
+        self.assertTrue(storage.exists(orphan.qr_image.name))
+
+        with self.assertNumQueries(2):
+            result = sweep_qr_storage(min_age=timedelta(0))
+        self.assertEqual((result.scanned, result.deleted), (3, 2))
+        self.assertTrue(storage.exists(live.qr_image.name))
+        self.assertFalse(storage.exists(orphan.qr_image.name))
+        self.assertFalse(storage.exists(expired.qr_image.name))
+        expired.refresh_from_db()
+        self.assertFalse(expired.file_present)
+
+    def test_leaves_recent_orphans(self):
+        orphan = self._qr('fresh.png')
+        QRCode.objects.filter(pk=orphan.pk).delete()
+        out = StringIO()
+        call_command('sweep_qr_storage', stdout=out)
+        self.assertIn('Deleted 0 of 1', out.getvalue())
+        self.assertTrue(orphan.qr_image.storage.exists(orphan.qr_image.name))
+
+    def test_render_store_is_trimmed_by_age_then_size(self):
+        render_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(QR_RENDER_CACHE_DIR=render_dir))
+        for name, age_days in [('old.png', 40), ('older.png', 3), ('newer.png', 2), ('newest.png', 1)]:
+            path = os.path.join(render_dir, 'ab', name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 100)
+            mtime = (timezone.now() - timedelta(days=age_days)).timestamp()
+            os.utime(path, (mtime, mtime))
+
+        result = prune_render_cache(max_bytes=250, max_age=timedelta(days=30))
+        self.assertEqual((result.scanned, result.expired, result.evicted, result.deleted), (4, 1, 1, 2))
+        self.assertEqual(sorted(os.listdir(os.path.join(render_dir, 'ab'))), ['newer.png', 'newest.png'])
+
+
+from io import BytesIO
+from PIL import Image
+from .benchmark import bench_qr_render_modes
+from .qr_render import RENDER_MODES, encode_qr_matrix
+
+
+class QRRenderModeTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.lecturer_user)
+        self.frame_url = reverse('rotating_qr_frame', args=[self.session.session_id])
+
+    def test_modes_encode_the_same_modules(self):
+        matrix = encode_qr_matrix('attendance:modes')
+        decoded = json.loads(encode_qr('attendance:modes', 'matrix'))
+        self.assertEqual(decoded['rows'], [''.join('1' if m else '0' for m in row) for row in matrix])
+
+        with Image.open(BytesIO(encode_qr('attendance:modes', 'png-compact'))) as img:
+            self.assertEqual(img.mode, '1')
+            self.assertEqual(img.size, (len(matrix) + 8,) * 2)
+            self.assertEqual(img.getpixel((4, 4)), 0)  # finder pattern corner is dark
+
+        svg = encode_qr('attendance:modes', 'svg', box_size=5).decode()
+        self.assertTrue(svg.startswith('<svg') and f'width="{(len(matrix) + 8) * 5}"' in svg)
+
+    def test_accept_header_selects_raw_image(self):
+        response = self.client.get(self.frame_url, HTTP_ACCEPT='image/svg+xml')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertTrue(response.content.startswith(b'<svg'))
+
+        response = self.client.get(self.frame_url, {'qr_mode': 'png-compact'}, HTTP_ACCEPT='image/png')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+
+    def test_image_long_poll_leaves_render_store_empty(self):
+        render_dir = self.enterContext(tempfile.TemporaryDirectory())
+        with override_settings(QR_RENDER_CACHE_DIR=render_dir):
+            response = self.client.get(self.frame_url, HTTP_ACCEPT='image/png')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertEqual(os.listdir(render_dir), [])
+
+    def test_json_frames_carry_the_requested_mode(self):
+        response = self.client.get(self.frame_url, HTTP_ACCEPT='application/vnd.qrpresence.qr-matrix+json')
+        self.assertEqual(response.data['mode'], 'matrix')
+        self.assertIn('rows', response.data['matrix'])
+
+        response = self.client.get(self.frame_url, {'qr_mode': 'svg'})
+        self.assertTrue(response.data['image'].startswith('data:image/svg+xml;base64,'))
+
+        self.assertEqual(self.client.get(self.frame_url, {'qr_mode': 'gif'}).status_code, 400)
+        response = self.client.get(self.frame_url, {'qr_mode': 'svg'}, HTTP_ACCEPT='image/png')
+        self.assertEqual(response.status_code, 406)
+
+    def test_benchmark_reports_every_mode(self):
+        results = bench_qr_render_modes('attendance:bench', repeats=2)
+        self.assertEqual(set(results), set(RENDER_MODES))
+        self.assertLess(results['png-compact']['bytes'], results['png']['bytes'])
+
+
+from . import geofence as geofence_module
+from .geofence import Geofence, haversine_many
+from .utils import AnalyticsAgent, haversine
+
+
+class GeofenceTests(CheckInTestCase):
+
+    points = [(10.0001, 20.0001), (10.0004, 20.0), (10.00045, 19.9998), (10.01, 20.01)]
+
+    def test_distance_matches_haversine(self):
+        fence = Geofence(10.0, 20.0)
+        for lat, lon in self.points:
+            exact = haversine(lat, lon, 10.0, 20.0)
+            self.assertAlmostEqual(fence.exact(lat, lon), exact, places=6)
+            self.assertAlmostEqual(fence.distance(lat, lon, within=50), exact, delta=exact * 1e-4)
+
+    def test_estimate_only_used_well_inside(self):
+        fence = Geofence(10.0, 20.0)
+        with mock.patch.object(Geofence, 'exact', wraps=fence.exact) as exact:
+            fence.distance(10.0001, 20.0001, within=50)  # ~16m
+            exact.assert_not_called()
+            fence.distance(10.00045, 20.0, within=50)  # ~50m, near the boundary
+            exact.assert_called_once()
+
+    def test_batch_matches_scalar_with_and_without_numpy(self):
+        lats, lons = [p[0] for p in self.points], [p[1] for p in self.points]
+        expected = [haversine(lat, lon, 10.0, 20.0) for lat, lon in self.points]
+        vectorised = haversine_many(lats, lons, 10.0, 20.0)
+        with mock.patch.object(geofence_module, 'np', None):
+            fallback = haversine_many(lats, lons, 10.0, 20.0)
+        for result in (vectorised, fallback):
+            for got, want in zip(result, expected):
+                self.assertAlmostEqual(float(got), want, places=6)
+
+    def test_too_far_scan_reports_exact_distance(self):
+        response = self.client.post(self.url, dict(self.payload, latitude=10.0006), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"{haversine(10.0006, 20.0001, 10.0, 20.0):.2f}m away", response.data['error'])
+
+    def test_analytics_distances(self):
+        Attendance.objects.create(student=self.student, session=self.session, latitude=10.0001, longitude=20.0001)
+        summary = AnalyticsAgent.get_check_in_distances(self.session)
+        self.assertEqual(summary['check_ins'], 1)
+        self.assertEqual(summary['outside_radius'], 0)
+        self.assertAlmostEqual(summary['mean_distance'], haversine(10.0001, 20.0001, 10.0, 20.0), places=1)
+
+
+from .geofence import PolygonGeofence
+from .models import Venue
+from . import venues
+
+
+class VenueGeofenceTests(CheckInTestCase):
+
+    # An L-shaped hall around the session location, ~200m across
+    outline = [[9.999, 19.999], [9.999, 20.001], [10.0, 20.001], [10.0, 20.0], [10.001, 20.0], [10.001, 19.999]]
+
+    def setUp(self):
+        super().setUp()
+        self.venue = Venue.objects.create(name='Great Hall', polygon=self.outline)
+        self.session.venue = self.venue
+        self.session.save()
+        self.addCleanup(venues.forget_venue, self.venue.pk)
+
+    def test_point_in_polygon(self):
+        fence = PolygonGeofence(self.outline, bands=4)
+        self.assertTrue(fence.contains(10.0005, 19.9995))
+        self.assertTrue(fence.contains(9.9995, 20.0005))
+        self.assertFalse(fence.contains(10.0005, 20.0005))  # the notch of the L
+        self.assertFalse(fence.contains(10.01, 20.0))  # outside the bounding box
+        with self.assertRaises(ValueError):
+            PolygonGeofence([[0, 0], [1, 1]])
+
+    def test_venue_replaces_radius(self):
+        # ~120m from the session point: beyond the 50m limit, inside the hall
+        response = self.client.post(self.url, dict(self.payload, latitude=9.9992, longitude=20.0008), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_outside_venue_is_rejected(self):
+        response = self.client.post(self.url, dict(self.payload, latitude=10.0005, longitude=20.0005), format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn('Great Hall', response.data['error'])
+
+    def test_geometry_is_parsed_once_and_reloaded_after_edits(self):
+        self.client.post(self.url, dict(self.payload, latitude=10.0005, longitude=20.0005), format='json')
+        with mock.patch.object(venues, 'PolygonGeofence', wraps=PolygonGeofence) as parse:
+            self.client.post(self.url, dict(self.payload, latitude=10.0005, longitude=20.0005), format='json')
+            parse.assert_not_called()
+
+            self.venue.polygon = [[9.99, 19.99], [9.99, 20.01], [10.01, 20.01], [10.01, 19.99]]
+            self.venue.save()
+            response = self.client.post(self.url, dict(self.payload, latitude=10.0005, longitude=20.0005), format='json')
+            self.assertEqual(parse.call_count, 1)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+from .geofence import geohash, geohash_cover
+
+
+class NearbySessionsTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('nearby_open_sessions')
+        self.far = Session.objects.create(
+            session_id='far_session', class_name='Far away', lecturer=self.lecturer, course=self.course,
+            gps_latitude=11.0, gps_longitude=21.0
+        )
+
+    def test_geohash_is_indexed_on_save(self):
+        self.assertEqual(self.session.geohash, geohash(10.0, 20.0))
+        self.session.gps_latitude = 10.5
+        self.session.save(update_fields=['gps_latitude'])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.geohash, geohash(10.5, 20.0))
+
+    def test_cover_contains_every_nearby_point(self):
+        cells = geohash_cover(10.0, 20.0, 1000)
+        self.assertLessEqual(len(cells), 9)
+        for lat, lon in [(10.009, 20.0), (9.991, 19.991), (10.0, 20.009)]:
+            self.assertTrue(any(geohash(lat, lon).startswith(cell) for cell in cells))
+
+    def test_lists_enrolled_open_sessions_in_range(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'latitude': 10.0001, 'longitude': 20.0001})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([s['session_id'] for s in response.data['sessions']], [self.session.session_id])
+        self.assertIn('geohash', queries.captured_queries[0]['sql'])
+
+        # Out of range, closed, or not enrolled
+        self.assertEqual(self.client.get(self.url, {'latitude': 10.002, 'longitude': 20.0}).data['sessions'], [])
+        Session.objects.filter(pk=self.session.pk).update(timestamp=now() - timedelta(hours=1))
+        self.assertEqual(self.client.get(self.url, {'latitude': 10.0001, 'longitude': 20.0001}).data['sessions'], [])
+
+    def test_requires_coordinates(self):
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'latitude': 'x', 'longitude': 1}).status_code, 400)
+
+
+import ipaddress
+
+from .network import CIDRMatcher, client_ip
+
+
+@override_settings(
+    CAMPUS_NETWORKS=['10.0.0.0/8', '192.168.1.0/24', '2001:db8::/32'],
+    TRUSTED_PROXIES=['127.0.0.1/32'],
+)
+class CampusNetworkTests(CheckInTestCase):
+
+    def test_matcher_merges_and_matches_ranges(self):
+        matcher = CIDRMatcher(['10.0.0.0/9', '10.128.0.0/9', '10.1.2.3', '2001:db8::/32'])
+        self.assertEqual(matcher._starts[4], [int(ipaddress.ip_address('10.0.0.0'))])
+        self.assertIn('10.255.255.255', matcher)
+        self.assertIn('::ffff:10.0.0.1', matcher)
+        self.assertIn('2001:db8::1', matcher)
+        for address in ['11.0.0.0', '9.255.255.255', '2001:db9::', 'not-an-ip', '']:
+            self.assertNotIn(address, matcher)
+        self.assertFalse(CIDRMatcher())
+
+    def test_forwarded_for_is_only_read_behind_a_trusted_proxy(self):
+        forwarded = {'HTTP_X_FORWARDED_FOR': '10.0.0.5, 203.0.113.9'}
+        self.assertEqual(client_ip(dict(forwarded, REMOTE_ADDR='198.51.100.1')), '198.51.100.1')
+        # A client-supplied left-hand entry is never trusted
+        self.assertEqual(client_ip(dict(forwarded, REMOTE_ADDR='127.0.0.1')), '203.0.113.9')
+        self.assertEqual(client_ip({'REMOTE_ADDR': '127.0.0.1', 'HTTP_X_FORWARDED_FOR': '10.0.0.5, 127.0.0.1'}), '10.0.0.5')
+
+    @override_settings(CAMPUS_NETWORK_REQUIRED=True)
+    def test_off_campus_check_in_is_rejected_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, self.payload, format='json', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.post(
+            self.url, self.payload, format='json',
+            REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='192.168.1.20',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_gate_is_off_unless_required(self):
+        response = self.client.post(self.url, self.payload, format='json', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+from .session_cache import invalidate_open_session
+
+
+class CheckInGateMiddlewareTests(CheckInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        get_open_session(self.session.session_id)
+        # The gate runs before authentication
+        self.anonymous = APIClient()
+
+    def test_out_of_range_scan_is_rejected_before_auth_and_queries(self):
+        far = dict(self.payload, latitude=10.01)
+        with self.assertNumQueries(0):
+            response = self.anonymous.post(self.url, far, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('away from class', response.json()['error'])
+
+        response = self.anonymous.post(reverse('mark_attendance_async'), far, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_closed_window_is_rejected(self):
+        Session.objects.filter(pk=self.session.pk).update(
+            timestamp=timezone.now() - timedelta(hours=2), attendance_window=timedelta(minutes=10)
+        )
+        invalidate_open_session(self.session.session_id)
+        get_open_session(self.session.session_id)
+        response = self.anonymous.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('window has closed', response.json()['error'])
+
+    def test_plausible_scans_reach_the_view(self):
+        self.assertEqual(self.anonymous.post(self.url, self.payload, format='json').status_code, 401)
+        # Unknown to the cache: left to the view
+        missing = dict(self.payload, session_id='missing', latitude=50.0)
+        self.assertEqual(self.client.post(self.url, missing, format='json').status_code, 404)
+        self.assertEqual(self.client.post(self.url, self.payload, format='json').status_code, 201)
+
+    # Django only logs middleware adaptation with DEBUG on
+    @override_settings(DEBUG=True)
+    async def test_async_stack_runs_the_gate_without_adaptation(self):
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('start')
+            response = await AsyncClient().post(
+                reverse('mark_attendance_async'), dict(self.payload, latitude=10.01), content_type='application/json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse([line for line in logs.output if 'CheckInGateMiddleware' in line])
+
+
+
+import logging
+
+from .log_events import BackgroundHandler, JSONFormatter
+
+
+class CheckInEventLogTests(CheckInTestCase):
+
+    @override_settings(EVENT_LOG_SAMPLE_RATES={'check_in': 1.0})
+    def test_one_event_per_check_in(self):
+        with self.assertLogs('attendance.events', 'INFO') as logs:
+            self.client.post(self.url, self.payload, format='json')
+        [record] = logs.records
+        self.assertEqual(record.event_fields['outcome'], 'created')
+        self.assertEqual(record.event_fields['session'], self.session.session_id)
+        self.assertEqual(record.event_fields['status'], 201)
+        self.assertEqual(record.event_fields['user_id'], self.student_user.id)
+        self.assertIn('"outcome": "created"', JSONFormatter().format(record))
+
+    @override_settings(EVENT_LOG_SAMPLE_RATES={'check_in': 1.0})
+    def test_async_event_logs_user_id_as_int(self):
+        token = RefreshToken.for_user(self.student_user).access_token
+        with self.assertLogs('attendance.events', 'INFO') as logs:
+            self.client.post(
+                reverse('mark_attendance_async'), self.payload, format='json', HTTP_AUTHORIZATION=f'Bearer {token}'
+            )
+        [record] = logs.records
+        self.assertEqual(record.event_fields['mode'], 'async')
+        self.assertEqual(record.event_fields['user_id'], self.student_user.id)
+
+    @override_settings(EVENT_LOG_SAMPLE_RATES={'check_in': 0.0})
+    def test_successes_are_sampled_but_failures_always_logged(self):
+        with self.assertLogs('attendance.events', 'INFO') as logs:
+            self.client.post(self.url, self.payload, format='json')
+            self.client.post(self.url, dict(self.payload, session_id='missing'), format='json')
+        [record] = logs.records
+        self.assertEqual(record.levelno, logging.WARNING)
+        self.assertEqual(record.event_fields['error'], 'Session not found')
+
+    def test_background_handler_writes_on_listener_thread(self):
+        threads = []
+
+        class Recorder(logging.Handler):
+            def emit(self, record):
+                threads.append(threading.get_ident())
+
+        handler = BackgroundHandler(Recorder())
+        test_logger = logging.getLogger('attendance.tests.background')
+        test_logger.addHandler(handler)
+        self.addCleanup(test_logger.removeHandler, handler)
+        test_logger.warning('queued')
+        handler.close()
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
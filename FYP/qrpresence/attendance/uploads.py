@@ -0,0 +1,141 @@
+"""
+Image uploads for QR codes and the site logo.
+
+Clients should send the image as a multipart file part: Django's upload
+handlers spool it to disk in chunks (in memory below
+FILE_UPLOAD_MAX_MEMORY_SIZE) and storage moves or copies it chunk by chunk.
+The older "data:image/png;base64,..." strings are still accepted, decoded
+in slices into a spooled temporary file rather than as one buffer, and cut
+off as soon as they pass the size limit.
+"""
+import base64
+import binascii
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import serializers
+
+DEFAULT_MAX_IMAGE_BYTES = 2 * 1024 * 1024
+
+# Characters of base64 decoded per step; a multiple of 4
+DECODE_CHUNK_CHARS = 64 * 1024
+
+# Leading bytes of the image types we accept, mapped to their extension
+IMAGE_SIGNATURES = {
+    b'\x89PNG\r\n\x1a\n': 'png',
+    b'\xff\xd8\xff': 'jpeg',
+    b'GIF87a': 'gif',
+    b'GIF89a': 'gif',
+}
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def max_image_bytes():
+    return getattr(settings, 'UPLOAD_IMAGE_MAX_BYTES', DEFAULT_MAX_IMAGE_BYTES)
+
+
+def _too_large(max_bytes):
+    return UploadError(f'Image is larger than {max_bytes // 1024} KB.', 413)
+
+
+def sniff_image_type(head):
+    """Extension for the image whose first bytes are `head`, or None."""
+    for signature, ext in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _checked_type(f):
+    f.seek(0)
+    ext = sniff_image_type(f.read(16))
+    f.seek(0)
+    if ext is None:
+        raise UploadError('Unsupported image type.')
+    return ext
+
+
+def decode_data_uri(value, max_bytes=None):
+    """
+    Decodes a "data:image/...;base64,..." string into a spooled temporary
+    file. Returns (file, ext). Raises UploadError for malformed data,
+    non-images, or images over max_bytes (checked before decoding from the
+    encoded length, and again while decoding).
+    """
+    max_bytes = max_bytes or max_image_bytes()
+    # Only look at the header; the payload is never split or copied whole
+    marker = value.find(';base64,', 0, 100)
+    if not value[:100].lstrip().startswith('data:') or marker == -1:
+        raise UploadError('Invalid image data')
+    start = marker + len(';base64,')
+    if (len(value) - start) * 3 // 4 > max_bytes + 3:
+        raise _too_large(max_bytes)
+
+    out = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    written = 0
+    carry = ''
+    try:
+        for pos in range(start, len(value), DECODE_CHUNK_CHARS):
+            chunk = carry + ''.join(value[pos:pos + DECODE_CHUNK_CHARS].split())
+            usable = len(chunk) - len(chunk) % 4
+            carry = chunk[usable:]
+            written += out.write(base64.b64decode(chunk[:usable], validate=True))
+            if written > max_bytes:
+                raise _too_large(max_bytes)
+        if carry:
+            raise UploadError('Invalid image data')
+    except binascii.Error:
+        out.close()
+        raise UploadError('Invalid image data')
+    except UploadError:
+        out.close()
+        raise
+
+    ext = _checked_type(out)
+    return out, ext
+
+
+def read_image_upload(value, name_stem, max_bytes=None):
+    """
+    A File named "<name_stem>.<ext>" for a multipart upload or a base64 data
+    URI, ready for FieldFile.save() / storage.save(). Raises UploadError.
+    """
+    max_bytes = max_bytes or max_image_bytes()
+    if isinstance(value, UploadedFile):
+        if value.size > max_bytes:
+            raise _too_large(max_bytes)
+        ext = _checked_type(value)
+        value.name = f"{name_stem}.{ext}"
+        return value
+    if isinstance(value, str):
+        f, ext = decode_data_uri(value, max_bytes)
+        return File(f, name=f"{name_stem}.{ext}")
+    raise UploadError('Invalid image data')
+
+
+class ImageUploadField(serializers.Field):
+    """
+    Write-only serializer field taking a multipart image or a base64 data
+    URI, validated to File by read_image_upload(). The stored name is set
+    by the serializer.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('write_only', True)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        try:
+            return read_image_upload(data, 'upload')
+        except UploadError as e:
+            raise serializers.ValidationError(e.message)
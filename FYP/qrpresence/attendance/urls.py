@@ -37,8 +37,15 @@ admin_router.register(r'stats', AdminStatsViewSet, basename='admin-stats')
 urlpatterns = [
     # Existing endpoints
     path('mark/', views.mark_attendance, name='mark_attendance'),  
+    path('mark/bulk/', views.mark_attendance_bulk, name='mark_attendance_bulk'),
+    path('mark/async/', views.mark_attendance_async, name='mark_attendance_async'),
     path('sessions/', SessionListCreateView.as_view(), name='create-session'),
+    path('sessions/nearby/', views.nearby_open_sessions, name='nearby_open_sessions'),
+    path('venues/', views.VenueListView.as_view(), name='venue-list'),
     path('generate-and-save-qr/', views.generate_and_save_qr, name='generate_and_save_qr'),
+    path('qr-token/', views.issue_session_qr_token, name='issue_qr_token'),
+    path('qr-rotation/<str:session_id>/stream/', views.rotating_qr_stream, name='rotating_qr_stream'),
+    path('qr-rotation/<str:session_id>/frame/', views.rotating_qr_frame, name='rotating_qr_frame'),
     path('validate-student/<str:student_id>/', views.validate_student, name='validate_student'),
     path('sessions/<int:pk>/', SessionDetailAPIView.as_view(), name='session-detail'),
     path('student/overview/', student_overview, name='student-overview'),
@@ -61,5 +68,6 @@ urlpatterns = [
     path('lecturer/enrollments/', LecturerEnrollmentView.as_view(), name='lecturer-enrollments'),
     
     # Admin endpoints - added at the end to avoid conflicts
+    path('admin/request-metrics/', views.request_metrics_report, name='request-metrics'),
     path('admin/', include(admin_router.urls)),
 ]
\ No newline at end of file
@@ -1,37 +1,74 @@
 import qrcode
+import hashlib
+import logging
+import os
+import tempfile
+from functools import lru_cache
 from io import BytesIO
 from django.core.files import File
 from django.conf import settings
 from PIL import Image
 import math
 
+from attendance.geofence import session_geofence
+from attendance.qr_render import MODE_EXTENSIONS, encode_qr
 
-def generate_qr_code(data):
+logger = logging.getLogger(__name__)
+
+
+def qr_render_key(data, box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L, mode='png'):
+    """Content address of a rendered QR code: a hash of everything that affects the output."""
+    # PNG keys predate render modes and stay unprefixed, so existing cache entries still hit
+    prefix = '' if mode == 'png' else f"{mode}:"
+    return hashlib.sha256(f"{prefix}{error_correction}:{box_size}:{border}:{data}".encode()).hexdigest()
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_RENDER_CACHE_SIZE', 256))
+def render_qr(data, mode='png', box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L):
     """
-    Generates a QR code image for the given data and returns it as a File object.
+    A QR code rendered in one of RENDER_MODES, as bytes. Renders are kept in
+    an in-process LRU and in a content-addressed store under
+    QR_RENDER_CACHE_DIR (<key[:2]>/<key>.<ext>), which survives restarts and
+    is shared by workers on the same host.
     """
-    # Create the QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
+    cache_dir = getattr(settings, 'QR_RENDER_CACHE_DIR', None)
+    if not cache_dir:
+        return encode_qr(data, mode, box_size, border, error_correction)
 
-    # Create an image from the QR code
-    img = qr.make_image(fill='black', back_color='white')
+    key = qr_render_key(data, box_size, border, error_correction, mode)
+    path = os.path.join(cache_dir, key[:2], f"{key}.{MODE_EXTENSIONS[mode]}")
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
 
-    # Save image to a BytesIO object (so it can be saved in the database)
-    img_io = BytesIO()
-    img.save(img_io, 'PNG')
-    img_io.seek(0)
+    rendered = encode_qr(data, mode, box_size, border, error_correction)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a concurrent reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(rendered)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Could not store QR render %s", path, exc_info=True)
+    return rendered
 
-    # Convert the image into a Django File object
-    qr_code_file = File(img_io, name=f"{data}.png")
-    
-    return qr_code_file
+
+def render_qr_png(data, box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L):
+    """PNG bytes for a QR code, through the render cache (see render_qr)."""
+    return render_qr(data, 'png', box_size, border, error_correction)
+
+
+def generate_qr_code(data, box_size=10, border=4, error_correction=qrcode.constants.ERROR_CORRECT_L, mode='png'):
+    """
+    Generates a QR code image for the given data and returns it as a File object.
+    mode is one of attendance.qr_render.RENDER_MODES. Identical requests are
+    served from the render cache (see render_qr).
+    """
+    rendered = render_qr(data, mode, box_size, border, error_correction)
+    return File(BytesIO(rendered), name=f"{data}.{MODE_EXTENSIONS[mode]}")
 
 
 
@@ -53,7 +90,11 @@ def haversine(lat1, lon1, lat2, lon2):
 
 
 
-def is_qr_valid(session, scan_time, latitude, longitude, max_distance=50):
+# Scans further than this from the session location are always rejected
+MAX_SCAN_DISTANCE = 50
+
+
+def is_qr_valid(session, scan_time, latitude, longitude, max_distance=MAX_SCAN_DISTANCE):
     """
     Validate QR code attendance with proper error handling.
     max_distance: 50 meters default (adjust as needed)
@@ -69,11 +110,8 @@ def is_qr_valid(session, scan_time, latitude, longitude, max_distance=50):
         if (session.gps_latitude is not None and session.gps_longitude is not None and
             latitude is not None and longitude is not None):
             
-            distance = haversine(
-                float(latitude), 
-                float(longitude),
-                float(session.gps_latitude), 
-                float(session.gps_longitude)
+            distance = session_geofence(session).distance(
+                float(latitude), float(longitude), within=max_distance
             )
             
             if distance > max_distance:
@@ -88,14 +126,9 @@ def is_qr_valid(session, scan_time, latitude, longitude, max_distance=50):
 
 # controlling attendance if only using campus wifi
 def is_on_campus(request):
-    ip = request.META.get('REMOTE_ADDR')
-    allowed_ips = ['192.168.', '10.0.', '123.45.67.89']  # add your internal/public ranges
-    return any(ip.startswith(prefix) for prefix in allowed_ips)
-#needs to be included in mark attendance logic
-   # def post(self, request):
-    #    if not is_on_campus(request):
-     #       return Response({"detail": "You must be on campus Wi-Fi to mark attendance."},
-      #                      status=status.HTTP_403_FORBIDDEN
+    """Whether the request comes from one of settings.CAMPUS_NETWORKS."""
+    from attendance.network import is_campus_request
+    return is_campus_request(request.META)
 
 from functools import wraps
 from django.http import JsonResponse
@@ -112,42 +145,19 @@ def admin_required(view_func):
     return _wrapped_view
 
 
-from attendance.models import Session,Attendance, Student
-
-def get_absent_students(session_id):
-    try:
-        session = Session.objects.get(id=session_id)
-    except Session.DoesNotExist:
-        return None  # or raise an exception if you want
-
-    enrolled_students = session.course.students.all()
-    present_students = Student.objects.filter(attendance__session=session)
-    absent_students = enrolled_students.exclude(id__in=present_students.values_list('id', flat=True))
-    return absent_students
-
-
 from attendance.models import Session, Attendance, Student
+from attendance.roster import get_absent_student_ids
 
 def get_absent_students(session_id):
     """
-    Returns a queryset of students who are enrolled but absent for the given session.
-    Assumes you add a way to link students to courses/sessions (or all students are enrolled).
+    Returns a queryset of students on the session's roster who have not been
+    marked present, or None if the session does not exist.
     """
-    try:
-        session = Session.objects.get(session_id=session_id)
-    except Session.DoesNotExist:
+    session = Session.objects.filter(session_id=session_id).only('pk', 'course_id').first()
+    if session is None:
         return None  # or raise an exception if preferred
 
-    # TODO: Replace this with your actual logic to get enrolled students for session/course
-    enrolled_students = Student.objects.all()  # placeholder for enrolled students for the session
-
-    # Students who have attendance marked as present in this session
-    present_student_ids = Attendance.objects.filter(session=session, status='Present').values_list('student__student_id', flat=True)
-
-    # Absent students = enrolled - present
-    absent_students = enrolled_students.exclude(student_id__in=present_student_ids)
-
-    return absent_students
+    return Student.objects.filter(student_id__in=get_absent_student_ids(session))
 
 
 
@@ -159,9 +169,7 @@ from django.utils import timezone
 class AnalyticsAgent:
     @staticmethod
     def get_absent_students(session):
-        enrolled = session.course.students.all()
-        present = Student.objects.filter(attendance__session=session)
-        return enrolled.exclude(id__in=present.values_list('id', flat=True))
+        return Student.objects.filter(student_id__in=get_absent_student_ids(session))
 
     @staticmethod
     def get_student_attendance_summary(student):
@@ -198,3 +206,23 @@ class AnalyticsAgent:
                     'percentage': round(percentage, 2)
                 })
         return flagged
+
+    @staticmethod
+    def get_check_in_distances(session):
+        """How far from the session location its check-ins were made, in metres."""
+        coordinates = list(
+            Attendance.objects
+            .filter(session=session, latitude__isnull=False, longitude__isnull=False)
+            .values_list('latitude', 'longitude')
+        )
+        if not coordinates:
+            return {'check_ins': 0, 'mean_distance': None, 'max_distance': None, 'outside_radius': 0}
+
+        latitudes, longitudes = zip(*coordinates)
+        distances = [float(d) for d in session_geofence(session).distances(list(latitudes), list(longitudes))]
+        return {
+            'check_ins': len(distances),
+            'mean_distance': round(sum(distances) / len(distances), 2),
+            'max_distance': round(max(distances), 2),
+            'outside_radius': sum(1 for d in distances if d > session.allowed_radius),
+        }
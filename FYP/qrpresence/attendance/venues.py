@@ -0,0 +1,55 @@
+"""
+In-process cache of venue geofences.
+
+Each worker parses a Venue's polygon into a PolygonGeofence once and keeps
+it by venue id. Session snapshots carry the venue's updated_at as its
+version, so an edited venue is re-read on the next scan in every worker,
+while the check-in path otherwise never touches geometry again.
+"""
+import threading
+
+from .geofence import PolygonGeofence
+from .models import Venue
+
+_fences = {}
+_lock = threading.Lock()
+
+
+def _store(venue):
+    fence = PolygonGeofence(venue.polygon, name=venue.name)
+    with _lock:
+        _fences[venue.pk] = (venue.updated_at, fence)
+    return fence
+
+
+def _cached(venue_id, version):
+    entry = _fences.get(venue_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    return None
+
+
+def venue_geofence(venue_id, version=None):
+    """
+    The PolygonGeofence for venue_id, read from the database only when this
+    process has no copy at `version` (a venue's updated_at). None if the
+    venue no longer exists.
+    """
+    fence = _cached(venue_id, version)
+    if fence is not None:
+        return fence
+    venue = Venue.objects.filter(pk=venue_id).first()
+    return _store(venue) if venue is not None else None
+
+
+async def avenue_geofence(venue_id, version=None):
+    fence = _cached(venue_id, version)
+    if fence is not None:
+        return fence
+    venue = await Venue.objects.filter(pk=venue_id).afirst()
+    return _store(venue) if venue is not None else None
+
+
+def forget_venue(venue_id):
+    with _lock:
+        _fences.pop(venue_id, None)
@@ -1,20 +1,39 @@
 from datetime import date
 from django.utils import timezone
 from datetime import timedelta
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend # type: ignore
 from authentication.permissions import IsLecturer,IsLecturerOrAdmin
 from django.utils.timezone import now
 from django.core.files.base import ContentFile
-import base64
-from .models import Session, Attendance, QRCode, Student, Lecturer
+from .models import Session, Attendance, QRCode, Student, Lecturer, Venue
 from .utils import haversine, is_qr_valid
-from .serializers import StudentSerializer, AttendanceMarkSerializer, SessionSerializer,AttendanceLecturerViewSerializer,LecturerSerializer,AttendanceSerializer
+from .qr_render import MODE_CONTENT_TYPES, RENDER_MODES
+from . import scan_limiter, write_behind
+from .scan_limiter import limit_repeat_scans, scan_limiter_metrics
+from .qr_tokens import QR_PAYLOAD_PREFIX, issue_qr_token, read_queued_qr_token, read_qr_token
+from .network import check_campus_network
+from .rotating_qr import frame_events, frame_image, rotation_period, wait_for_frame
+from .uploads import UploadError, read_image_upload
+from .nearby import find_open_sessions_near
+from .session_cache import get_open_session
+from .checkin import (
+    CheckInError, aload_checkin_context, ainsert_attendance_once, check_in_batch,
+    insert_attendance_once, load_checkin_context, validate_check_in,
+)
+from .serializers import StudentSerializer, AttendanceMarkSerializer, BulkCheckInRecordSerializer, SessionSerializer,AttendanceLecturerViewSerializer,LecturerSerializer,AttendanceSerializer,VenueSerializer
 from rest_framework import status, generics, serializers
+import json
 import logging
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from authentication.async_auth import AsyncJWTAuthentication
 from rest_framework.views import APIView
 from django.core.exceptions import PermissionDenied
 import csv
@@ -24,6 +43,9 @@ from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet, DateFromToRangeFilter, ChoiceFilter
 from .filters import AttendanceFilter
 from .utils import get_absent_students
+from .roster import get_absent_student_ids
+from .middleware import check_in_payload, request_metrics
+from .log_events import Event
 from .utils import AnalyticsAgent
 from attendance.ai_chat.llm_agent import answer_natural_language_query
 from .models import Course, Student, StudentCourseEnrollment
@@ -47,174 +69,323 @@ from authentication.permissions import IsAdminUser,IsLecturerOrAdmin
 
 # Configure logger
 logger = logging.getLogger(__name__)
+@limit_repeat_scans
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_attendance(request):
+    event = Event('check_in', mode='sync', user_id=request.user.id)
+    response = _mark_attendance(request, event)
+    event.emit(response.status_code, error=response.data.get('error'))
+    return response
+
+
+def _mark_attendance(request, event):
     try:
-        # Log the request for debugging
-        logger.info(f"Attendance request from user: {request.user.username}")
-        logger.info(f"Request data: {request.data}")
-        
-        session_id = request.data.get('session_id')
+        # The network gate and signed QR tokens are checked before anything touches the database
+        try:
+            check_campus_network(request.META)
+            qr_token = read_qr_token(request.data)
+        except CheckInError as e:
+            return Response({'error': e.message}, status=e.status_code)
+
+        session_id = qr_token.session_id if qr_token else request.data.get('session_id')
         latitude = request.data.get('latitude')
         longitude = request.data.get('longitude')
+        event.add(session=session_id, signed=qr_token is not None)
 
         # Validate required fields
         if not all([session_id, latitude, longitude]):
-            logger.warning("Missing required fields in attendance request")
             return Response(
                 {'error': 'Missing required fields: session_id, latitude, and longitude are required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validate session exists
         try:
-            session = Session.objects.get(session_id=session_id)
-            # FIXED: Changed course.course_code to course.code
-            logger.info(f"Session found: {session.session_id} for course: {session.course.code}")
-        except Session.DoesNotExist:
-            logger.warning(f"Session not found: {session_id}")
+            latitude = float(latitude)
+            longitude = float(longitude)
+        except (ValueError, TypeError):
             return Response(
-                {'error': 'Session not found'}, 
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'Invalid coordinates provided'}, 
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Validate student profile exists
-        try:
-            student = Student.objects.get(user=request.user)
-            logger.info(f"Student found: {student.student_id}")
-        except Student.DoesNotExist:
-            logger.warning(f"Student profile not found for user: {request.user.username}")
+        # Session, course, QR expiry, enrollment and prior attendance in one query
+        context = load_checkin_context(session_id, request.user)
+        if context is None:
             return Response(
-                {'error': 'Student profile not found. Please complete your student registration.'}, 
+                {'error': 'Session not found'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
+        session = context.session
+        event.add(course=session.course_code, student=context.student_id)
 
-        # Check if student is enrolled in the course
-        enrollment_exists = StudentCourseEnrollment.objects.filter(
-            student=student, 
-            course=session.course
-        ).exists()
-        
-        if not enrollment_exists:
-            # FIXED: Changed course.course_code to course.code
-            logger.warning(f"Student {student.student_id} not enrolled in course {session.course.code}")
-            return Response(
-                {'error': 'You are not enrolled in this course. Please contact your administrator.'}, 
-                status=status.HTTP_403_FORBIDDEN
-            )
-        logger.info("Enrollment check passed")
-
-        # QR scan + location + time validity check
         try:
-            is_valid, message = is_qr_valid(session, now(), float(latitude), float(longitude))
-            if not is_valid:
-                logger.warning(f"QR validation failed: {message}")
-                return Response(
-                    {'error': message}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            logger.info("QR validation passed")
-        except Exception as e:
-            logger.error(f"Error in QR validation: {str(e)}")
-            return Response(
-                {'error': 'QR validation error'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            distance = validate_check_in(context, now(), latitude, longitude, qr_token=qr_token)
+        except CheckInError as e:
+            return Response({'error': e.message}, status=e.status_code)
 
-        # Check if attendance already exists
-        if Attendance.objects.filter(student=student, session=session).exists():
-            logger.info(f"Attendance already marked for student {student.student_id} in session {session.session_id}")
+        if context.already_marked:
+            event.add(outcome='already_marked')
             return Response(
                 {'message': 'Attendance already marked for this session'}, 
                 status=status.HTTP_200_OK
             )
+        event.add(distance=round(distance, 2), allowed_radius=session.allowed_radius)
 
-        # Calculate distance from session location
-        try:
-            distance = haversine(
-                float(latitude),
-                float(longitude),
-                float(session.gps_latitude),
-                float(session.gps_longitude)
-            )
-            logger.info(f"Distance calculated: {distance:.2f} meters (Allowed: {session.allowed_radius}m)")
-        except (ValueError, TypeError) as e:
-            logger.error(f"Invalid coordinates: {str(e)}")
-            return Response(
-                {'error': 'Invalid coordinates provided'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        except Exception as e:
-            logger.error(f"Error calculating distance: {str(e)}")
-            return Response(
-                {'error': 'Error calculating distance'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-        # Check if within allowed radius
-        if distance > session.allowed_radius:
-            logger.warning(f"Student too far: {distance:.2f}m > allowed {session.allowed_radius}m")
-            return Response({
-                'error': f'You are too far from the session location ({distance:.2f} meters). Allowed radius: {session.allowed_radius}m. Please move closer to the classroom.'
-            }, status=status.HTTP_403_FORBIDDEN)
-
-        # Check QR code expiration or attendance window
+        # Create attendance record; a concurrent duplicate scan gets the existing row back
         try:
-            qr_code = QRCode.objects.filter(session=session).first()
-            if qr_code and qr_code.expires_at and now() > qr_code.expires_at:
-                logger.warning(f"QR code expired at {qr_code.expires_at}")
-                return Response(
-                    {'error': 'QR code has expired. Attendance window closed.'}, 
-                    status=status.HTTP_403_FORBIDDEN
-                )
-            elif not qr_code and now() > session.timestamp + timedelta(minutes=15):
-                logger.warning(f"Attendance window closed for session {session.session_id}")
-                return Response(
-                    {'error': 'Attendance window has closed.'}, 
-                    status=status.HTTP_403_FORBIDDEN
+            if write_behind.is_enabled():
+                # Acknowledged once journaled; the flusher loads it into Attendance
+                write_behind.enqueue(context.student_id, session.pk, latitude, longitude)
+                attendance, created = None, True
+            else:
+                attendance, created = insert_attendance_once(
+                    context.student_id, session.pk, latitude, longitude
                 )
-            logger.info("Time validation passed")
-        except Exception as e:
-            logger.error(f"Error checking time validity: {str(e)}")
+        except Exception:
+            event.fail()
             return Response(
-                {'error': 'Error checking attendance timing'}, 
+                {'error': 'Error saving attendance'}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-
-        # Create attendance record
-        try:
-            attendance = Attendance.objects.create(
-                student=student,
-                session=session,
-                latitude=latitude,
-                longitude=longitude
-            )
-            logger.info(f"Attendance created successfully: {attendance.id}")
-        except Exception as e:
-            logger.error(f"Error creating attendance record: {str(e)}")
+        if not created:
+            event.add(outcome='already_marked')
             return Response(
-                {'error': 'Error saving attendance'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'message': 'Attendance already marked for this session'}, 
+                status=status.HTTP_200_OK
             )
+        if attendance is None:
+            event.add(outcome='journaled')
+        else:
+            event.add(outcome='created', attendance=attendance.id)
 
         # Success response
-        # FIXED: Changed session.course.course_code to session.course.code
         return Response({
             'message': 'Attendance marked successfully!',
             'distance_from_class': f'{distance:.2f} meters',
             'session': session.session_id,
-            'course': session.course.code,  # FIXED: Changed course.course_code to course.code
+            'course': session.course_code,
             'timestamp': now().isoformat()
         }, status=status.HTTP_201_CREATED)
 
-    except Exception as e:
-        logger.exception("Unexpected error marking attendance")
+    except Exception:
+        event.fail()
         return Response(
             {'error': 'An unexpected error occurred. Please try again.'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+
+@csrf_exempt
+@require_POST
+async def mark_attendance_async(request):
+    """
+    Async twin of mark_attendance for deployments behind an ASGI server, so
+    a check-in storm does not hold a worker thread per request while waiting
+    on the database. Only bearer (JWT) authentication is accepted, which is
+    also why CSRF checks are not needed here.
+    """
+    event = Event('check_in', mode='async')
+    response = await _mark_attendance_async(request, event)
+    # Only failures carry an error worth decoding
+    error = json.loads(response.content).get('error') if response.status_code >= 400 else None
+    event.emit(response.status_code, error=error)
+    return response
+
+
+async def _mark_attendance_async(request, event):
+    authenticator = AsyncJWTAuthentication()
+    user_id = authenticator.get_token_user_id(request)
+    if user_id is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    try:
+        check_campus_network(request.META)
+    except CheckInError as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    # Usually already parsed by CheckInGateMiddleware
+    data = check_in_payload(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        qr_token = read_qr_token(data)
+    except CheckInError as e:
+        return JsonResponse({'error': e.message}, status=e.status_code)
+
+    session_id = qr_token.session_id if qr_token else data.get('session_id')
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    # The token's user ID claim may be a string; log it as the same int the sync view does
+    event.add(user_id=int(user_id), session=session_id, signed=qr_token is not None)
+    if not all([session_id, latitude, longitude]):
+        return JsonResponse(
+            {'error': 'Missing required fields: session_id, latitude, and longitude are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (ValueError, TypeError):
+        return JsonResponse({'error': 'Invalid coordinates provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Repeated taps are answered before the user is loaded
+    if scan_limiter.is_enabled():
+        repeat = await scan_limiter.acheck_repeat(user_id, session_id)
+        if repeat is not None:
+            body, status_code = repeat
+            event.add(outcome='replayed')
+            return JsonResponse(body, status=status_code)
+
+    user = await authenticator.aget_user(user_id)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided or are invalid.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    try:
+        context = await aload_checkin_context(session_id, user)
+        if context is None:
+            return JsonResponse({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
+        session = context.session
+        event.add(course=session.course_code, student=context.student_id)
+
+        try:
+            distance = validate_check_in(context, now(), latitude, longitude, qr_token=qr_token)
+        except CheckInError as e:
+            return JsonResponse({'error': e.message}, status=e.status_code)
+
+        created = False
+        if not context.already_marked:
+            if write_behind.is_enabled():
+                await sync_to_async(write_behind.enqueue)(context.student_id, session.pk, latitude, longitude)
+                created = True
+            else:
+                _, created = await ainsert_attendance_once(context.student_id, session.pk, latitude, longitude)
+        event.add(outcome='created' if created else 'already_marked')
+        if created:
+            event.add(distance=round(distance, 2), allowed_radius=session.allowed_radius)
+            body, status_code = {
+                'message': 'Attendance marked successfully!',
+                'distance_from_class': f'{distance:.2f} meters',
+                'session': session.session_id,
+                'course': session.course_code,
+                'timestamp': now().isoformat()
+            }, status.HTTP_201_CREATED
+        else:
+            body, status_code = {'message': 'Attendance already marked for this session'}, status.HTTP_200_OK
+
+        if scan_limiter.is_enabled():
+            await scan_limiter.aremember_result(user_id, session_id, body, status_code)
+    except Exception:
+        event.fail()
+        return JsonResponse(
+            {'error': 'An unexpected error occurred. Please try again.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return JsonResponse(body, status=status_code)
+
+
+# Upper bound on queued scans replayed in one request
+MAX_BULK_CHECKIN_RECORDS = 500
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_attendance_bulk(request):
+    """
+    Replays scans queued offline by the mobile client. Accepts
+    {"records": [{session_id | qr_token, latitude, longitude, scanned_at, student_id?}]}
+    and returns one result per record, in order. Each scan is validated at
+    its scan time, so late uploads of on-time scans are accepted. A record
+    with a signed QR token is dated at the token's issue time and any
+    scanned_at is ignored; with QR_TOKEN_REQUIRED set, every record needs one.
+    The campus network gate applies to the upload like any other check-in,
+    so queued scans are uploaded once the device is back on campus Wi-Fi.
+    """
+    try:
+        check_campus_network(request.META)
+    except CheckInError as e:
+        return Response({'error': e.message}, status=e.status_code)
+
+    records = request.data.get('records') if isinstance(request.data, dict) else request.data
+    if not isinstance(records, list) or not records:
+        return Response(
+            {'error': 'records must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(records) > MAX_BULK_CHECKIN_RECORDS:
+        return Response(
+            {'error': f'At most {MAX_BULK_CHECKIN_RECORDS} records can be uploaded at once'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    student_id = Student.objects.filter(user=request.user).values_list('student_id', flat=True).first()
+    if student_id is None:
+        return Response(
+            {'error': 'Student profile not found. Please complete your student registration.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    results = [None] * len(records)
+    valid = []
+    upload_time = now()
+    for index, record in enumerate(records):
+        serializer = BulkCheckInRecordSerializer(data=record)
+        if not serializer.is_valid():
+            results[index] = {'status': 'rejected', 'status_code': 400, 'error': serializer.errors}
+            continue
+        data = serializer.validated_data
+        try:
+            qr_token = read_queued_qr_token(data)
+        except CheckInError as e:
+            results[index] = {
+                'session_id': data.get('session_id'), 'status': 'rejected', 'status_code': e.status_code,
+                'error': e.message
+            }
+            continue
+        if qr_token is not None:
+            data.update(session_id=qr_token.session_id, scanned_at=qr_token.issued_at, qr_token=qr_token)
+        else:
+            data.pop('qr_token', None)
+        if data.get('student_id', student_id) != student_id:
+            results[index] = {
+                'session_id': data['session_id'], 'status': 'rejected', 'status_code': 403,
+                'error': 'Scans can only be uploaded for your own student profile.'
+            }
+            continue
+        data.setdefault('scanned_at', upload_time)
+        valid.append((index, data))
+
+    if valid:
+        try:
+            batch_results = check_in_batch(student_id, [data for _, data in valid])
+        except Exception:
+            logger.exception("Unexpected error in bulk attendance upload")
+            return Response(
+                {'error': 'An unexpected error occurred. Please try again.'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        for (index, _), result in zip(valid, batch_results):
+            results[index] = result
+
+    for index, result in enumerate(results):
+        result['index'] = index
+
+    return Response({
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'already_marked': sum(1 for r in results if r['status'] == 'already_marked'),
+        'duplicate': sum(1 for r in results if r['status'] == 'duplicate'),
+        'rejected': sum(1 for r in results if r['status'] == 'rejected'),
+        'results': results,
+    }, status=status.HTTP_200_OK)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def generate_and_save_qr(request):
@@ -222,6 +393,7 @@ def generate_and_save_qr(request):
         return Response({'error': 'Permission denied. Lecturer access only.'}, status=403)
 
     session_id = request.data.get('session_id')
+    # A multipart file part, or a "data:image/png;base64,..." string
     qr_image_data = request.data.get('qr_image')
 
     if not session_id or not qr_image_data:
@@ -229,22 +401,11 @@ def generate_and_save_qr(request):
 
     try:
         session = Session.objects.get(session_id=session_id)
-
-        # Remove potential whitespace
-        qr_image_data = qr_image_data.strip()
-
-        # Split base64 string
-        if ';base64,' not in qr_image_data:
-            return Response({'error': 'Invalid QR image data'}, status=400)
-
-        format, imgstr = qr_image_data.split(';base64,')
-        ext = format.split('/')[-1]
-        img_data = ContentFile(base64.b64decode(imgstr), name=f"qr_{session_id}.{ext}")
+        img_data = read_image_upload(qr_image_data, f"qr_{session_id}")
 
         # Save QRCode instance
         qr_code_instance = QRCode(session=session)
-        qr_code_instance.qr_image.save(f"qr_{session_id}.{ext}", img_data)
-        qr_code_instance.save()
+        qr_code_instance.qr_image.save(img_data.name, img_data)
 
         return Response({
             'success': True,
@@ -252,12 +413,226 @@ def generate_and_save_qr(request):
             'qr_url': qr_code_instance.qr_image.url
         })
 
+    except UploadError as e:
+        return Response({'error': e.message}, status=e.status_code)
     except Session.DoesNotExist:
         return Response({'error': 'Invalid session ID.'}, status=404)
     except Exception as e:
         logger.exception("QR generation failed")
         return Response({'error': f'Failed to save QR code: {str(e)}'}, status=500)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def issue_session_qr_token(request):
+    """
+    Issues a signed QR token for one of the lecturer's sessions. qr_payload
+    is what the QR code should encode; scans of it are validated without
+    QRCode rows.
+    """
+    if getattr(request.user, 'role', None) != 'lecturer':
+        return Response({'error': 'Permission denied. Lecturer access only.'}, status=403)
+
+    session_id = request.data.get('session_id')
+    if not session_id:
+        return Response({'error': 'Missing session_id'}, status=400)
+
+    lifetime = request.data.get('lifetime_seconds')
+    if lifetime is not None:
+        try:
+            lifetime = timedelta(seconds=int(lifetime))
+        except (ValueError, TypeError):
+            return Response({'error': 'lifetime_seconds must be a whole number of seconds'}, status=400)
+        if lifetime <= timedelta(0):
+            return Response({'error': 'lifetime_seconds must be positive'}, status=400)
+
+    session = Session.objects.filter(session_id=session_id, lecturer__user=request.user).first()
+    if session is None:
+        return Response({'error': 'Invalid session ID.'}, status=404)
+
+    token, qr_token = issue_qr_token(session, lifetime)
+    if qr_token.expires_at <= qr_token.issued_at:
+        return Response({'error': 'Attendance window has closed.'}, status=400)
+
+    return Response({
+        'session_id': session.session_id,
+        'token': token,
+        'qr_payload': f'{QR_PAYLOAD_PREFIX}{token}',
+        'issued_at': qr_token.issued_at.isoformat(),
+        'expires_at': qr_token.expires_at.isoformat(),
+    }, status=status.HTTP_201_CREATED)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets content negotiation accept text/event-stream; only error bodies go through render()."""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class QRImageRenderer(BaseRenderer):
+    """Raw QR images for the rotating QR endpoints; error bodies are sent as JSON."""
+    charset = None
+    qr_mode = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode()
+
+
+class QRPNGRenderer(QRImageRenderer):
+    media_type = 'image/png'
+    format = 'png'
+    qr_mode = 'png'
+
+
+class QRSVGRenderer(QRImageRenderer):
+    media_type = 'image/svg+xml'
+    format = 'svg'
+    qr_mode = 'svg'
+
+
+class QRMatrixRenderer(JSONRenderer):
+    """Frames carrying the module matrix instead of an image."""
+    media_type = 'application/vnd.qrpresence.qr-matrix+json'
+    format = 'matrix'
+    qr_mode = 'matrix'
+
+
+def _qr_render_mode(request):
+    """
+    The render mode for a QR response: ?qr_mode= if given, otherwise what
+    the Accept header negotiated (PNG for plain JSON). Returns (mode, error).
+    """
+    mode = request.query_params.get('qr_mode')
+    if mode is None:
+        return getattr(request.accepted_renderer, 'qr_mode', None) or 'png', None
+    if mode not in RENDER_MODES:
+        return None, Response({'error': f"qr_mode must be one of {', '.join(RENDER_MODES)}"}, status=400)
+    accepted = request.accepted_renderer
+    if isinstance(accepted, QRImageRenderer) and MODE_CONTENT_TYPES[mode] != accepted.media_type:
+        return None, Response({'error': f'qr_mode {mode} cannot be sent as {accepted.media_type}'}, status=406)
+    return mode, None
+
+
+def _rotating_qr_session(request, session_id):
+    """The lecturer's own session as an OpenSession, or an error Response."""
+    if getattr(request.user, 'role', None) != 'lecturer':
+        return None, Response({'error': 'Permission denied. Lecturer access only.'}, status=403)
+    if not Session.objects.filter(session_id=session_id, lecturer__user=request.user).exists():
+        return None, Response({'error': 'Invalid session ID.'}, status=404)
+    return get_open_session(session_id), None
+
+
+def _rotation_period(request):
+    """The clamped ?period= rotation period, or an error Response."""
+    try:
+        return rotation_period(request.query_params.get('period')), None
+    except ValueError:
+        return None, Response({'error': 'period must be an integer number of seconds'}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def rotating_qr_stream(request, session_id):
+    """
+    Server-sent events with a new QR frame every rotation period
+    (?period=10-30 seconds, ?qr_mode=png|png-compact|svg|matrix). The stream
+    ends after QR_STREAM_MAX_SECONDS and the client reconnects; browsers
+    need a fetch()-based reader since EventSource cannot send the
+    Authorization header.
+    """
+    session, error = _rotating_qr_session(request, session_id)
+    if error:
+        return error
+    mode, error = _qr_render_mode(request)
+    if error:
+        return error
+
+    period, error = _rotation_period(request)
+    if error:
+        return error
+    response = StreamingHttpResponse(
+        frame_events(session, period, getattr(settings, 'QR_STREAM_MAX_SECONDS', 300), mode),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, QRMatrixRenderer, QRSVGRenderer, QRPNGRenderer])
+def rotating_qr_frame(request, session_id):
+    """
+    Long-poll alternative to rotating_qr_stream: returns the current frame,
+    or with ?after=<slot> waits for the first frame after that slot.
+
+    The frame's render mode is negotiated: Accept image/png or image/svg+xml
+    returns the bare image, application/vnd.qrpresence.qr-matrix+json a
+    frame with the module matrix, and ?qr_mode= picks one explicitly.
+    """
+    session, error = _rotating_qr_session(request, session_id)
+    if error:
+        return error
+    mode, error = _qr_render_mode(request)
+    if error:
+        return error
+
+    period, error = _rotation_period(request)
+    if error:
+        return error
+    after = request.query_params.get('after')
+    try:
+        after = int(after) if after is not None else None
+    except ValueError:
+        return Response({'error': 'after must be a slot number'}, status=400)
+
+    frame = wait_for_frame(session, period, after=after, timeout=period, mode=mode)
+    if frame is None:
+        return Response({'error': 'Attendance window has closed.'}, status=status.HTTP_410_GONE)
+    if isinstance(request.accepted_renderer, QRImageRenderer):
+        # The frame already carries the image; re-rendering would persist it per frame
+        response = Response(frame_image(frame))
+        response['X-QR-Slot'] = frame['slot']
+        response['X-QR-Rotates-At'] = frame['rotates_at']
+        response['Cache-Control'] = 'no-store'
+        return response
+    return Response(frame)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def nearby_open_sessions(request):
+    """
+    Open sessions the student is enrolled in and within check-in range of
+    ?latitude=&longitude=, nearest first.
+    """
+    try:
+        latitude = float(request.query_params['latitude'])
+        longitude = float(request.query_params['longitude'])
+    except KeyError:
+        return Response({'error': 'latitude and longitude are required'}, status=status.HTTP_400_BAD_REQUEST)
+    except ValueError:
+        return Response({'error': 'Invalid coordinates provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return Response({'error': 'Invalid coordinates provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({'sessions': find_open_sessions_near(request.user, latitude, longitude)})
+
+
+class VenueListView(generics.ListAPIView):
+    """Campus venues a session can be held at; managed in the admin."""
+    queryset = Venue.objects.all()
+    serializer_class = VenueSerializer
+    permission_classes = [IsAuthenticated, IsLecturerOrAdmin]
+
+
 class SessionListCreateView(generics.ListCreateAPIView):
     serializer_class = SessionSerializer
     permission_classes = [IsAuthenticated]
@@ -719,7 +1094,9 @@ class AbsentStudentsView(APIView):
         except Session.DoesNotExist:
             return Response({"error": "Session not found."}, status=404)
 
-        absent_students = get_absent_students(session.id)
+        absent_students = Student.objects.filter(
+            student_id__in=get_absent_student_ids(session)
+        ).select_related('user')
         serializer = StudentSerializer(absent_students, many=True)
         return Response(serializer.data)
     
@@ -1174,29 +1551,52 @@ from .serializers import QRCodeSerializer
 from django.db import models
 
 
+class QRCodeCursorPagination(CursorPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'qr_codes': data,
+        })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsLecturerOrAdmin])
 def get_qr_codes(request):
-    # 1. Fetch all QR codes from the database (sorted newest first)
-    qr_codes = QRCode.objects.select_related("session").order_by("-created_at")
-    
-    qr_data = []
-    for qr in qr_codes:
-        # 2. Check if the image exists in the filesystem
-        image_path = os.path.join(settings.MEDIA_ROOT, qr.qr_image.name)
-        if not os.path.exists(image_path):
-            continue  # Skip if file is missing
-        
-        # 3. Build the response data
-        qr_data.append({
+    """
+    QR codes whose image is in storage, newest first, cursor-paginated.
+    Lecturers see their own sessions' codes; admins see all of them.
+    """
+    qr_codes = (
+        QRCode.objects
+        .filter(file_present=True)
+        .select_related('session')
+        .only('id', 'qr_image', 'created_at', 'expires_at', 'session__class_name',
+              'session__session_id', 'session__timestamp')
+    )
+    if request.user.role != 'admin':
+        qr_codes = qr_codes.filter(session__lecturer__user=request.user)
+
+    paginator = QRCodeCursorPagination()
+    page = paginator.paginate_queryset(qr_codes, request)
+    qr_data = [
+        {
             "id": qr.id,
             "url": request.build_absolute_uri(qr.qr_image.url),
             "filename": os.path.basename(qr.qr_image.name),  # e.g., "csc3003.png"
             "name": os.path.splitext(qr.qr_image.name)[0],  # e.g., "csc3003"
-            "session": str(qr.session),  # or qr.session.title
+            "session": str(qr.session),
             "created_at": qr.created_at.strftime("%Y-%m-%d %H:%M"),
             "expires_at": qr.expires_at.strftime("%Y-%m-%d %H:%M") if qr.expires_at else None,
-        })
-    
-    return JsonResponse({"qr_codes": qr_data})
+        }
+        for qr in page
+    ]
+    return paginator.get_paginated_response(qr_data)
 
 from django.shortcuts import get_object_or_404
 from django.http import JsonResponse
@@ -1210,14 +1610,16 @@ def delete_qr_code(request, qr_id):
     qr.delete()
     return JsonResponse({"message": "QR code deleted successfully"})
 
-from django.http import FileResponse
+from attendance.file_serving import serve_stored_file
 def download_qr_code(request, qr_id):
     qr = get_object_or_404(QRCode, id=qr_id)
-    file_path = qr.qr_image.path
 
     try:
-        return FileResponse(open(file_path, 'rb'), as_attachment=True, filename=qr.qr_image.name)
+        return serve_stored_file(request, qr.qr_image, as_attachment=True,
+                                 filename=os.path.basename(qr.qr_image.name))
     except FileNotFoundError:
+        # Drop it from listings until the file is restored
+        QRCode.objects.filter(pk=qr.pk).update(file_present=False)
         return JsonResponse({"error": "QR code file not found"}, status=404)
 class LecturerEnrollmentView(APIView):
     permission_classes = [IsAuthenticated,IsLecturerOrAdmin]
@@ -2099,3 +2501,24 @@ class AdminDashboardViewSet(viewsets.ViewSet):
         })
 
 
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def request_metrics_report(request):
+    """
+    Per-view query counts, duplicate queries and timings collected by
+    QueryMetricsMiddleware in this server process, plus the repeats answered
+    by the scan limiter. DELETE clears them.
+    """
+    if request.method == 'DELETE':
+        request_metrics.reset()
+        scan_limiter_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response({
+        'enabled': getattr(settings, 'REQUEST_METRICS_ENABLED', False),
+        'pid': os.getpid(),
+        'views': request_metrics.snapshot(),
+        'scan_limiter': scan_limiter_metrics.snapshot(),
+    })
@@ -0,0 +1,329 @@
+"""
+Optional write-behind mode for check-ins (settings.ATTENDANCE_WRITE_BEHIND).
+
+Validated scans are appended to an append-only journal segment on local disk
+and acknowledged straight away. A background thread seals the active segment
+every ATTENDANCE_WRITE_BEHIND_INTERVAL_MS (or once it holds
+ATTENDANCE_WRITE_BEHIND_BATCH_SIZE records) and loads sealed segments into
+Attendance with bulk_create(), deleting each segment once it is committed.
+
+Segment files move through three states, named after the process that owns
+them so a crashed worker's journal can be recovered on the same host:
+
+    <host>-<pid>-<seq>.active               being appended to
+    <host>-<pid>-<seq>.sealed               ready to load
+    <host>-<pid>-<seq>.<claimer>.claimed    being loaded by process <claimer>
+"""
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import now
+
+from .models import Attendance
+
+logger = logging.getLogger(__name__)
+
+PENDING_CACHE_PREFIX = 'pending_checkin'
+# Upper bound only; keys are deleted as soon as their segment is loaded
+PENDING_CACHE_TIMEOUT = 60 * 60
+
+
+def is_enabled():
+    return getattr(settings, 'ATTENDANCE_WRITE_BEHIND', False)
+
+
+def journal_dir():
+    return Path(getattr(
+        settings, 'ATTENDANCE_WRITE_BEHIND_DIR', Path(settings.BASE_DIR) / 'checkin_journal'
+    ))
+
+
+def _pending_key(student_id, session_pk):
+    return f"{PENDING_CACHE_PREFIX}:{session_pk}:{student_id}"
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill() terminates the process on Windows; never treat a segment as orphaned there
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_segment(path):
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Torn final line from a crash mid-write; it was never acknowledged
+                logger.warning("Skipping unreadable line in check-in journal %s", path)
+    return records
+
+
+def load_segment(path, batch_size=500):
+    """Loads one claimed segment into Attendance and deletes it. Returns the record count."""
+    records = _read_segment(path)
+    Attendance.objects.bulk_create(
+        [
+            Attendance(
+                student_id=record['student_id'],
+                session_id=record['session_pk'],
+                latitude=record['latitude'],
+                longitude=record['longitude'],
+                check_in_time=parse_datetime(record['check_in_time']),
+            )
+            for record in records
+        ],
+        batch_size=batch_size,
+        # Duplicate scans racing across workers, or a replay of a segment whose
+        # rows were committed before the process died
+        ignore_conflicts=True,
+    )
+    path.unlink()
+    cache.delete_many([_pending_key(r['student_id'], r['session_pk']) for r in records])
+    return len(records)
+
+
+def _claim(path):
+    claimed = path.with_name(f"{path.stem}.{os.getpid()}.claimed")
+    try:
+        path.rename(claimed)
+    except FileNotFoundError:
+        # Another process claimed it first
+        return None
+    return claimed
+
+
+def recover_orphans(directory, force=False):
+    """
+    Seals segments left behind by processes on this host that are no longer
+    running, so the next flush loads them. With force=True every active or
+    claimed segment is sealed; only use that when no workers are running.
+    Returns the number of segments recovered.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+
+    host = socket.gethostname()
+    recovered = 0
+    for path in directory.iterdir():
+        try:
+            if path.suffix == '.active':
+                stem = path.stem
+                owner_host, owner_pid, _ = stem.rsplit('-', 2)
+            elif path.suffix == '.claimed':
+                stem, owner_pid, _ = path.name.rsplit('.', 2)
+                owner_host = stem.rsplit('-', 2)[0]
+            else:
+                continue
+            owner_pid = int(owner_pid)
+        except ValueError:
+            continue
+        if not force and (owner_host != host or _pid_alive(owner_pid)):
+            continue
+        try:
+            path.rename(path.with_name(f"{stem}.sealed"))
+            recovered += 1
+        except FileNotFoundError:
+            pass
+    return recovered
+
+
+def flush_journal(directory=None, batch_size=500):
+    """Loads every sealed segment in the journal directory. Returns the record count."""
+    directory = Path(directory or journal_dir())
+    if not directory.is_dir():
+        return 0
+
+    loaded = 0
+    for path in sorted(directory.glob('*.sealed')):
+        claimed = _claim(path)
+        if claimed is None:
+            continue
+        try:
+            loaded += load_segment(claimed, batch_size)
+        except Exception:
+            # Hand the segment back so the next flush retries it
+            claimed.rename(path)
+            raise
+    return loaded
+
+
+class WriteBehindBuffer:
+    """
+    The journal writer and flusher for one process. Use get_buffer() rather
+    than instantiating this directly.
+    """
+
+    def __init__(self, directory, interval, batch_size):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._segment = None
+        self._segment_count = 0
+        self._seq = 0
+        self._pending = set()
+        self._thread = None
+
+    def _open_segment(self):
+        self._seq += 1
+        path = self.directory / f"{socket.gethostname()}-{self.pid}-{self._seq}.active"
+        self._segment = open(path, 'a', encoding='utf-8')
+        self._segment_count = 0
+
+    def append(self, student_id, session_pk, latitude, longitude, check_in_time):
+        """Durably records a validated check-in. Returns once it is on disk."""
+        line = json.dumps({
+            'student_id': student_id,
+            'session_pk': session_pk,
+            'latitude': latitude,
+            'longitude': longitude,
+            'check_in_time': check_in_time.isoformat(),
+        }) + '\n'
+
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(line)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._segment_count += 1
+            self._pending.add((student_id, session_pk))
+            full = self._segment_count >= self.batch_size
+
+        cache.set(_pending_key(student_id, session_pk), True, PENDING_CACHE_TIMEOUT)
+        self._start_flusher()
+        if full:
+            self._wake.set()
+
+    def is_pending(self, student_id, session_pk):
+        return (student_id, session_pk) in self._pending
+
+    def _close_segment(self):
+        """Closes the active segment; returns its path, or None. Call with the lock held."""
+        if self._segment is None:
+            return None
+        self._segment.close()
+        path = Path(self._segment.name)
+        self._segment = None
+        return path
+
+    def seal(self):
+        """Closes the active segment so the next flush loads it."""
+        with self._lock:
+            path = self._close_segment()
+        if path is not None:
+            path.rename(path.with_suffix('.sealed'))
+
+    def flush(self):
+        """Seals the active segment and loads all sealed segments. Returns the record count."""
+        with self._lock:
+            # Snapshot under the same lock as the seal, so every pair in it is
+            # in a sealed segment and nothing appended after the seal is dropped
+            path = self._close_segment()
+            pending = set(self._pending)
+        if path is not None:
+            path.rename(path.with_suffix('.sealed'))
+        loaded = flush_journal(self.directory, self.batch_size)
+        with self._lock:
+            # Anything appended since the seal stays pending
+            self._pending -= pending
+        return loaded
+
+    def _start_flusher(self):
+        if self._thread is not None or not self.interval:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='checkin-write-behind', daemon=True)
+            self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def _run(self):
+        try:
+            recover_orphans(self.directory)
+        except OSError:
+            logger.exception("Could not recover orphaned check-in journal segments")
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Check-in write-behind flush failed; segments are kept for the next attempt")
+            finally:
+                close_old_connections()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Check-in write-behind flush at exit failed; run flush_checkins to load the journal")
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """The buffer for this process, recreated after a fork or a settings change."""
+    global _buffer
+    directory = journal_dir()
+    with _buffer_lock:
+        if _buffer is None or _buffer.pid != os.getpid() or _buffer.directory != directory:
+            _buffer = WriteBehindBuffer(
+                directory,
+                interval=getattr(settings, 'ATTENDANCE_WRITE_BEHIND_INTERVAL_MS', 200) / 1000,
+                batch_size=getattr(settings, 'ATTENDANCE_WRITE_BEHIND_BATCH_SIZE', 500),
+            )
+        return _buffer
+
+
+def enqueue(student_id, session_pk, latitude, longitude, check_in_time=None):
+    get_buffer().append(student_id, session_pk, latitude, longitude, check_in_time or now())
+
+
+def is_pending(student_id, session_pk):
+    """True if a check-in for this student and session is journaled but not yet loaded."""
+    if get_buffer().is_pending(student_id, session_pk):
+        return True
+    # Journaled by another worker sharing the cache
+    return cache.get(_pending_key(student_id, session_pk)) is not None
+
+
+async def ais_pending(student_id, session_pk):
+    if get_buffer().is_pending(student_id, session_pk):
+        return True
+    return await cache.aget(_pending_key(student_id, session_pk)) is not None
+
+
+def pending_session_pks(student_id, session_pks):
+    """Set-based is_pending() for one student across several sessions."""
+    buffer = get_buffer()
+    pending = {pk for pk in session_pks if buffer.is_pending(student_id, pk)}
+    keys = {_pending_key(student_id, pk): pk for pk in session_pks if pk not in pending}
+    pending.update(keys[key] for key in cache.get_many(list(keys)))
+    return pending
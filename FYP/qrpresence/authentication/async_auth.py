@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication for plain Django async views, where DRF's sync
+    authentication classes cannot run. Token parsing and signature checks
+    are pure CPU; only the user lookup touches the database, through the
+    async ORM.
+    """
+
+    def get_token_user_id(self, request):
+        """
+        The user ID claim of a valid bearer token, or None. Checks only the
+        token itself; the user may since have been deleted or deactivated.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        try:
+            validated_token = self.get_validated_token(raw_token)
+        except (InvalidToken, TokenError):
+            return None
+        return validated_token.get(api_settings.USER_ID_CLAIM)
+
+    async def aget_user(self, user_id):
+        """The active user for a token's user ID claim, or None."""
+        user = await get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None or not user.is_active:
+            return None
+        return user
+
+    async def aauthenticate(self, request):
+        """Returns the authenticated user, or None if no valid token was sent."""
+        user_id = self.get_token_user_id(request)
+        if user_id is None:
+            return None
+        return await self.aget_user(user_id)
@@ -68,10 +68,12 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'attendance.middleware.QueryMetricsMiddleware',  # First, so total time covers the rest of the stack
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # Ensure this is before CommonMiddleware
     'django.middleware.common.CommonMiddleware',
+    'attendance.middleware.CheckInGateMiddleware',  # Before auth, so hopeless scans cost no queries
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -143,6 +145,27 @@ DATABASES = {
     }
 }
 
+# Cache
+# Open-session snapshots, rosters, the scan limiter and rotating QR frames
+# are kept in the cache and invalidated through it, so every worker must
+# share one cache. Set CACHE_REDIS_URL (needs the redis package) whenever
+# more than one process serves requests; without it each process keeps its
+# own in-memory cache, which is only correct for a single process.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 LOGGING = {
     'version': 1,
     'handlers': {
@@ -244,24 +267,130 @@ if not OPENAI_API_KEY:
 
 
 
+# Write-behind check-ins: acknowledge validated scans once they are journaled
+# on local disk and load them into Attendance in batches. An interval of 0
+# disables the background flusher; run `manage.py flush_checkins` instead.
+ATTENDANCE_WRITE_BEHIND = os.environ.get("ATTENDANCE_WRITE_BEHIND", "") == "1"
+ATTENDANCE_WRITE_BEHIND_DIR = BASE_DIR / "checkin_journal"
+ATTENDANCE_WRITE_BEHIND_INTERVAL_MS = 200
+ATTENDANCE_WRITE_BEHIND_BATCH_SIZE = 500
+
+
+# Per-view query/latency metrics (attendance.middleware.QueryMetricsMiddleware),
+# readable at /api/admin/request-metrics/. The headers flag adds each
+# request's own numbers to its response.
+REQUEST_METRICS_ENABLED = DEBUG
+REQUEST_METRICS_HEADERS = DEBUG
+
+
+# Repeated scans of the same session by the same student: at most
+# SCAN_LIMIT_BURST scans per fixed SCAN_LIMIT_WINDOW_SECONDS window, and the
+# recorded result replayed for SCAN_LIMIT_RESULT_TTL seconds.
+SCAN_LIMIT_ENABLED = True
+SCAN_LIMIT_BURST = 3
+SCAN_LIMIT_WINDOW_SECONDS = 6
+SCAN_LIMIT_RESULT_TTL = 30
+
+
+# Signed QR tokens (attendance.qr_tokens). With QR_TOKEN_REQUIRED, scans that
+# only carry a plain session_id are rejected.
+QR_TOKEN_LIFETIME = timedelta(minutes=15)
+QR_TOKEN_REQUIRED = False
+
+# Rotating QR display: seconds per frame (10-30) and how long one SSE
+# connection is held before the client reconnects.
+QR_ROTATION_SECONDS = 15
+QR_STREAM_MAX_SECONDS = 300
+
+# QR render cache (attendance.utils.render_qr_png): renders kept in memory per
+# process and on disk by content hash. Set the directory to None to disable
+# the disk tier. manage.py sweep_qr_storage keeps the disk tier within the
+# age and size limits below.
+QR_RENDER_CACHE_SIZE = 256
+QR_RENDER_CACHE_DIR = BASE_DIR / "qr_render_cache"
+QR_RENDER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+QR_RENDER_CACHE_MAX_AGE = timedelta(days=30)
+
+
 #media files settings
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# QR downloads (attendance.file_serving): None serves files from Django;
+# 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache) hands them to the
+# front server. The nginx prefix must be an internal alias of MEDIA_ROOT.
+FILE_SERVING_MODE = None
+FILE_SERVING_ACCEL_PREFIX = '/protected-media/'
+
+# Largest QR code / logo image accepted (attendance.uploads), multipart or base64
+UPLOAD_IMAGE_MAX_BYTES = 2 * 1024 * 1024
+
+# QR image sweeper (manage.py sweep_qr_storage): files are only removed once
+# older than the minimum age, and expired QR codes only after the grace period.
+QR_SWEEP_MIN_AGE = timedelta(hours=1)
+QR_SWEEP_EXPIRED_GRACE = timedelta(days=1)
+
+# "Sessions open near me" (attendance.nearby): how far, in metres, to look
+# for session locations around the student.
+NEARBY_SESSIONS_RADIUS = 1000
+
+# Campus network gate (attendance.network). With CAMPUS_NETWORK_REQUIRED,
+# check-ins, including bulk uploads of offline queues, are only accepted
+# from the CIDR ranges in CAMPUS_NETWORKS.
+# X-Forwarded-For is only read when REMOTE_ADDR is in TRUSTED_PROXIES.
+CAMPUS_NETWORKS = [
+    # '10.0.0.0/8',
+    # '192.168.0.0/16',
+    # '2001:db8::/32',
+]
+CAMPUS_NETWORK_REQUIRED = False
+TRUSTED_PROXIES = [
+    # '127.0.0.1/32',
+]
+
+# attendance.middleware.CheckInGateMiddleware rejects off-campus, expired and
+# out-of-range scans from the open-session cache before authentication runs.
+CHECK_IN_GATE_ENABLED = True
+# How long, in seconds, a closed session is remembered so late scans are
+# rejected without a query.
+CLOSED_SESSION_CACHE_TTL = 300
+
+
+# Check-in events (attendance.log_events): the share of successful check-ins
+# that are logged. Failures are always logged.
+EVENT_LOG_SAMPLE_RATES = {
+    'check_in': 0.1,
+}
+
 
 # Ensure the logs directory exists
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
+# File handlers are wrapped in a BackgroundHandler so writes happen on a
+# listener thread instead of the request thread.
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'attendance.log_events.JSONFormatter',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'ERROR',
-            'class': 'logging.FileHandler',
+            '()': 'attendance.log_events.background_handler',
+            'handler_class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs/django_error.log'),
         },
+        'events': {
+            'level': 'INFO',
+            '()': 'attendance.log_events.background_handler',
+            'handler_class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs/attendance_events.log'),
+            'formatter': 'json',
+        },
     },
     'loggers': {
         'django': {
@@ -269,5 +398,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'attendance.events': {
+            'handlers': ['events', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
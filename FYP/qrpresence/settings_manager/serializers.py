@@ -1,11 +1,11 @@
 from rest_framework import serializers
 from .models import SiteSettings
-from django.core.files.base import ContentFile
-import base64
+from attendance.uploads import ImageUploadField, max_image_bytes
 import uuid
 
 class SiteSettingsSerializer(serializers.ModelSerializer):
-    site_logo_data = serializers.CharField(write_only=True, required=False)
+    # Base64 data URI kept for older clients; multipart clients send site_logo
+    site_logo_data = ImageUploadField(required=False)
     
     class Meta:
         model = SiteSettings
@@ -30,31 +30,24 @@ class SiteSettingsSerializer(serializers.ModelSerializer):
             representation['site_logo'] = None
         return representation
     
+    def validate_site_logo(self, value):
+        if value and value.size > max_image_bytes():
+            raise serializers.ValidationError(f'Image is larger than {max_image_bytes() // 1024} KB.')
+        return value
+
+    def _take_logo(self, validated_data):
+        logo = validated_data.pop('site_logo_data', None)
+        if logo:
+            ext = logo.name.rsplit('.', 1)[-1]
+            logo.name = f"site_logo_{uuid.uuid4()}.{ext}"
+            validated_data['site_logo'] = logo
+        return validated_data
+
     def create(self, validated_data):
-        site_logo_data = validated_data.pop('site_logo_data', None)
-        
-        if site_logo_data:
-            # Handle base64 image data
-            format, imgstr = site_logo_data.split(';base64,')
-            ext = format.split('/')[-1]
-            file_name = f"site_logo_{uuid.uuid4()}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=file_name)
-            validated_data['site_logo'] = data
-        
-        return super().create(validated_data)
+        return super().create(self._take_logo(validated_data))
     
     def update(self, instance, validated_data):
-        site_logo_data = validated_data.pop('site_logo_data', None)
-        
-        if site_logo_data:
-            # Handle base64 image data
-            format, imgstr = site_logo_data.split(';base64,')
-            ext = format.split('/')[-1]
-            file_name = f"site_logo_{uuid.uuid4()}.{ext}"
-            data = ContentFile(base64.b64decode(imgstr), name=file_name)
-            validated_data['site_logo'] = data
-        
-        return super().update(instance, validated_data)
+        return super().update(instance, self._take_logo(validated_data))
 
 class SystemStatsSerializer(serializers.Serializer):
     total_students = serializers.IntegerField()